@@ -0,0 +1,198 @@
+"""In memory model of the database objects used for auto-completion."""
+
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+class SchemaObject(object):
+    """A function or a datatype.
+
+    `schema` and `name` are escaped, `raw_name` is the name as it's stored
+    in the database.
+    """
+
+    __slots__ = ('kind', 'schema', 'name', 'raw_name')
+
+    def __init__(self, kind, schema, name, raw_name):
+        self.kind = kind
+        self.schema = schema
+        self.name = name
+        self.raw_name = raw_name
+
+    def __repr__(self):
+        return '%s(%r, %r)' % (self.kind, self.schema, self.name)
+
+
+class Relation(SchemaObject):
+    """A table or a view, with the names of its columns."""
+
+    __slots__ = ('columns',)
+
+    def __init__(self, kind, schema, name, raw_name):
+        super(Relation, self).__init__(kind, schema, name, raw_name)
+        self.columns = []
+
+
+class VisibleObjects(object):
+    """The objects that can be referred to without a schema, through a
+    search path.
+
+    An object hides the objects of the same kind and name in the schemas
+    that come after it in the search path. Tables and views hide each
+    other.
+    """
+
+    __slots__ = ('search_path', 'version', 'names', 'relations')
+
+    def __init__(self, catalog, search_path):
+        self.search_path = search_path
+        self.version = catalog.version
+        # kind -> tuple of names, in search path order
+        self.names = {}
+        # name -> table or view
+        self.relations = {}
+
+        for kind in catalog.kinds:
+            names, seen = [], set()
+            for schema in search_path:
+                for name in catalog._objects.get((kind, schema), ()):
+                    if name not in seen:
+                        seen.add(name)
+                        names.append(name)
+            self.names[kind] = tuple(names)
+
+        relations = self.relations
+        for schema in reversed(search_path):
+            for kind in reversed(catalog.relation_kinds):
+                relations.update(catalog._objects.get((kind, schema), {}))
+
+
+class Catalog(object):
+    """The schemata, relations, columns, functions and datatypes of a
+    database.
+
+    Names are added as they're stored in the database and escaped with the
+    `escape` function. Each distinct name is escaped only once, and both
+    forms are interned, so a column name shared by a thousand tables is
+    stored once.
+
+    Objects are looked up by (kind, escaped schema, escaped name) in
+    constant time. Two reverse indexes are maintained: column name to the
+    relations that have it, and lowercased name to the objects with that
+    name.
+    """
+
+    kinds = ('tables', 'views', 'functions', 'datatypes')
+    relation_kinds = ('tables', 'views')
+
+    def __init__(self, escape=None):
+        self._escape = escape or (lambda name: name)
+        # raw name -> escaped name, and the other way around.
+        self.escaped = {}
+        self.raw = {}
+        self.schemata = []
+        # (kind, schema) -> {name: object}, names in the order they're added.
+        self._objects = {}
+        self._by_column = {}
+        self._by_lower_name = {}
+        # Incremented when schemata or objects are added.
+        self.version = 0
+        self._visible = None
+
+    def escape(self, name):
+        """Return the one shared copy of the escaped form of a name."""
+        try:
+            return self.escaped[name]
+        except KeyError:
+            pass
+        escaped = self._escape(name)
+        if escaped == name:
+            escaped = name
+        self.escaped[name] = escaped
+        self.raw[escaped] = name
+        return escaped
+
+    def unescape(self, name):
+        """Return the raw form of an escaped name of the catalog."""
+        return self.raw.get(name, name)
+
+    def add_schema(self, schema):
+        """Add a schema and return its escaped name."""
+        schema = self.escape(schema)
+        if (self.kinds[0], schema) in self._objects:
+            return schema
+        self.schemata.append(schema)
+        self.version += 1
+        for kind in self.kinds:
+            self._objects[kind, schema] = {}
+        return schema
+
+    def add_object(self, kind, schema, name):
+        """Add a relation, function or datatype.
+
+        :return: the new object, or None if the schema is unknown.
+        """
+        schema, escaped = self.escape(schema), self.escape(name)
+        try:
+            objects = self._objects[kind, schema]
+        except KeyError:
+            _logger.error('%r %r listed in unrecognized schema %r',
+                          kind, name, schema)
+            return None
+
+        name, raw_name = escaped, self.raw[escaped]
+        if kind in self.relation_kinds:
+            obj = Relation(kind, schema, name, raw_name)
+        else:
+            obj = SchemaObject(kind, schema, name, raw_name)
+        objects[name] = obj
+        self.version += 1
+        self._by_lower_name.setdefault(raw_name.lower(), []).append(obj)
+        return obj
+
+    def add_column(self, kind, schema, relname, column):
+        """Add a column to a relation and return its escaped name. Raises
+        KeyError if the relation is unknown."""
+        relation = self._objects[kind, self.escape(schema)][self.escape(relname)]
+        column = self.escape(column)
+        relation.columns.append(column)
+        self._by_column.setdefault(column, []).append(relation)
+        return column
+
+    def get(self, kind, schema, name):
+        """Return the object, or None."""
+        objects = self._objects.get((kind, schema))
+        return objects.get(name) if objects else None
+
+    def relation(self, schema, name):
+        """Return the table or view schema.name, or None.
+
+        Tables and views share a namespace, so there's at most one.
+        """
+        return (self.get('tables', schema, name) or
+                self.get('views', schema, name))
+
+    def names(self, kind, schema):
+        """The names of the objects of a kind in a schema."""
+        return list(self._objects.get((kind, schema), ()))
+
+    def visible(self, search_path):
+        """Return the VisibleObjects of a search path.
+
+        It's cached until the search path is replaced (it's compared by
+        identity) or objects are added.
+        """
+        visible = self._visible
+        if (visible is None or visible.search_path is not search_path or
+                visible.version != self.version):
+            visible = self._visible = VisibleObjects(self, search_path)
+        return visible
+
+    def relations_with_column(self, column):
+        """The tables and views that have a column with this name."""
+        return self._by_column.get(column, [])
+
+    def find(self, name):
+        """The objects whose lowercased raw name is `name.lower()`."""
+        return self._by_lower_name.get(name.lower(), [])
@@ -0,0 +1,105 @@
+"""On demand loading of the column names used for auto-completion."""
+
+import logging
+import threading
+try:
+    from collections import OrderedDict
+except ImportError:
+    # python 2.6
+    from ordereddict import OrderedDict
+
+try:
+    from queue import Queue
+except ImportError:
+    # python 2
+    from Queue import Queue
+
+_logger = logging.getLogger(__name__)
+
+
+class ColumnLoader(object):
+    """Fetches the columns of a relation the first time they're needed.
+
+    The columns are queried in a background thread, on a connection of its
+    own, so completion never waits for the database. The columns of the most
+    recently used `max_relations` relations are kept in an LRU cache.
+
+    :param connect: callable returning a PGExecute. Called in the background
+        thread, the first time columns are fetched.
+    :param on_loaded: optional callable, called from the background thread
+        after the columns of a relation have been loaded.
+    """
+
+    def __init__(self, connect, max_relations=1000, on_loaded=None):
+        self.connect = connect
+        self.max_relations = max_relations
+        self.on_loaded = on_loaded
+        self.executor = None
+        self.cache = OrderedDict()
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.queue = Queue()
+        self.thread = None
+
+    def get(self, schema, relname):
+        """Return the column names of schema.relname, or None if they aren't
+        loaded yet. In that case they're loaded in the background."""
+        key = (schema, relname)
+        with self.lock:
+            try:
+                columns = self.cache.pop(key)
+            except KeyError:
+                self._request(key)
+                return None
+            # Move to the most recently used end.
+            self.cache[key] = columns
+            return columns
+
+    def _request(self, key):
+        if key in self.pending:
+            return
+        self.pending.add(key)
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run,
+                                           name='column-loader')
+            self.thread.daemon = True
+            self.thread.start()
+        self.queue.put(key)
+
+    def _run(self):
+        while True:
+            key = self.queue.get()
+            if key is None:
+                break
+            columns = self._fetch(*key)
+            with self.lock:
+                self.pending.discard(key)
+                if columns is None:
+                    continue
+                self.cache[key] = columns
+                while len(self.cache) > self.max_relations:
+                    self.cache.popitem(last=False)
+            if self.on_loaded:
+                self.on_loaded()
+
+        if self.executor:
+            self.executor.conn.close()
+
+    def _fetch(self, schema, relname):
+        try:
+            if self.executor is None:
+                self.executor = self.connect()
+            return self.executor.relation_columns(schema, relname)
+        except Exception as e:
+            _logger.error('Loading the columns of %s.%s failed: %r',
+                          schema, relname, e)
+            # Reconnect the next time.
+            if self.executor is not None:
+                self.executor.conn.close()
+                self.executor = None
+            return None
+
+    def close(self):
+        """Stop the background thread and close its connection."""
+        if self.thread is not None:
+            self.queue.put(None)
@@ -0,0 +1,104 @@
+"""Loading of the auto-completion metadata in the background."""
+
+import logging
+import threading
+
+from .packages.tracing import tracer
+
+_logger = logging.getLogger(__name__)
+
+
+class CompletionRefresher(object):
+    """Loads the database metadata into a new completer in a background
+    thread, step by step, so the prompt doesn't wait for it.
+
+    Requesting a refresh while one is in progress starts it over, with the
+    latest request.
+
+    :param steps: list of (name, function) pairs. Each function is called
+        with the completer and a PGExecute, and loads part of the metadata.
+    :param on_progress: optional callable, called from the background thread
+        when a step starts and when the refresh ends.
+    """
+
+    def __init__(self, steps, on_progress=None):
+        self.steps = steps
+        self.on_progress = on_progress
+        self.lock = threading.Lock()
+        self.thread = None
+        self.request = None
+        self.restart = False
+        # Index of the step in progress.
+        self.step = None
+
+    def refresh(self, connect, completer, on_done):
+        """Start loading the metadata into `completer`.
+
+        :param connect: callable returning a PGExecute, called in the
+            background thread. Its connection is closed when done.
+        :param on_done: callable, called from the background thread with
+            the completer once all the steps succeeded.
+        """
+        with self.lock:
+            self.request = (connect, completer, on_done)
+            if self.thread is not None:
+                self.restart = True
+                return
+            self.thread = threading.Thread(target=self._run,
+                                           name='completion-refresher')
+            self.thread.daemon = True
+            self.thread.start()
+
+    def is_refreshing(self):
+        return self.thread is not None
+
+    def progress(self):
+        """A short description of the refresh in progress, e.g.
+        "tables (3/8)", or None."""
+        step = self.step
+        if step is None:
+            return None
+        return '%s (%d/%d)' % (self.steps[step][0], step + 1, len(self.steps))
+
+    def _run(self):
+        while True:
+            with self.lock:
+                connect, completer, on_done = self.request
+                self.restart = False
+            completer = self._load(connect, completer)
+            with self.lock:
+                if self.restart:
+                    continue
+                # Called with the lock held, so a newer refresh can't finish
+                # first and be replaced by this one.
+                if completer is not None:
+                    on_done(completer)
+                self.thread = None
+                self.step = None
+            break
+        self._progress()
+
+    def _load(self, connect, completer):
+        """Run the steps. Returns the completer, or None if the refresh was
+        restarted or failed."""
+        executor = None
+        try:
+            executor = connect()
+            for i, (name, step) in enumerate(self.steps):
+                if self.restart:
+                    return None
+                self.step = i
+                self._progress()
+                with tracer.span('refresh', step=name):
+                    step(completer, executor)
+            return completer
+        except Exception as e:
+            _logger.error('Refreshing the completions failed: %r', e)
+            return None
+        finally:
+            if executor is not None:
+                executor.conn.close()
+
+    def _progress(self):
+        if self.on_progress:
+            self.on_progress()
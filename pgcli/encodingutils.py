@@ -22,3 +22,16 @@ def utf8tounicode(arg):
     if PY2 and isinstance(arg, str):
         return arg.decode('utf-8')
     return arg
+
+def utf8_length(text):
+    """
+    The number of bytes of text in UTF-8. ASCII text isn't encoded, where
+    str.isascii() tells without looking at it (Python 3.7+).
+    """
+
+    if isinstance(text, bytes):
+        return len(text)
+    isascii = getattr(text, 'isascii', None)
+    if isascii is not None and isascii():
+        return len(text)
+    return len(text.encode('utf-8'))
@@ -0,0 +1,173 @@
+"""Query history kept in a SQLite database, with execution metrics."""
+
+import re
+import time
+import logging
+import sqlite3
+
+_logger = logging.getLogger(__name__)
+
+COLUMNS = ('executed_at', 'database', 'query', 'duration', 'rows', 'bytes',
+           'successful', 'mutating')
+
+_schema = '''
+    CREATE TABLE IF NOT EXISTS history (
+        id          INTEGER PRIMARY KEY,
+        executed_at REAL NOT NULL,
+        database    TEXT,
+        query       TEXT NOT NULL COLLATE NOCASE,
+        duration    REAL,
+        rows        INTEGER,
+        bytes       INTEGER,
+        successful  INTEGER NOT NULL,
+        mutating    INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS history_executed_at ON history (executed_at);
+    CREATE INDEX IF NOT EXISTS history_query ON history (query);
+    CREATE INDEX IF NOT EXISTS history_duration ON history (duration);
+'''
+
+# Full-text index of the queries, kept up to date by a trigger. The first
+# module this build of SQLite has is used.
+_fts_schemas = {
+    'fts5': '''
+        CREATE VIRTUAL TABLE history_fts USING fts5(
+            query, content='history', content_rowid='id');
+        CREATE TRIGGER history_fts_insert AFTER INSERT ON history BEGIN
+            INSERT INTO history_fts (rowid, query)
+            VALUES (new.id, new.query);
+        END;
+    ''',
+    'fts4': '''
+        CREATE VIRTUAL TABLE history_fts USING fts4(content='history', query);
+        CREATE TRIGGER history_fts_insert AFTER INSERT ON history BEGIN
+            INSERT INTO history_fts (docid, query) VALUES (new.id, new.query);
+        END;
+    ''',
+}
+
+_fts_rowid = {'fts5': 'rowid', 'fts4': 'docid'}
+
+_word = re.compile(r'\w+\*?', re.UNICODE)
+
+
+class HistoryStore(object):
+    """One row per executed query, with when and where it ran, how long it
+    took, how many rows and bytes it produced and whether it succeeded.
+
+    The database is opened the first time the history is used, and is in
+    WAL mode, so writing the history doesn't block other pgcli processes
+    reading it. If it can't be opened, nothing is recorded.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.fts = None
+        self.conn = None
+        self.opened = False
+
+    def _connection(self):
+        """The connection to the database, or None if it can't be opened."""
+        if not self.opened:
+            self.opened = True
+            try:
+                self.conn = self._open(self.filename)
+            except sqlite3.Error as e:
+                _logger.error('Error opening history database %r: %r',
+                              self.filename, e)
+        return self.conn
+
+    def _open(self, filename):
+        conn = sqlite3.connect(filename)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.executescript(_schema)
+
+        row = conn.execute("SELECT sql FROM sqlite_master "
+                           "WHERE name = 'history_fts'").fetchone()
+        if row:
+            self.fts = 'fts5' if 'fts5' in row[0].lower() else 'fts4'
+        else:
+            for module in ('fts5', 'fts4'):
+                try:
+                    conn.executescript(_fts_schemas[module])
+                except sqlite3.OperationalError:
+                    # Not compiled in.
+                    continue
+                self.fts = module
+                break
+        conn.commit()
+        return conn
+
+    def add(self, query, database, duration, rows, nbytes, successful,
+            mutating, executed_at=None):
+        conn = self._connection()
+        if conn is None:
+            return
+        if executed_at is None:
+            executed_at = time.time()
+        try:
+            with conn:
+                conn.execute(
+                    'INSERT INTO history (%s) VALUES (?, ?, ?, ?, ?, ?, ?, ?)'
+                    % ', '.join(COLUMNS),
+                    (executed_at, database, query, duration, rows, nbytes,
+                     successful, mutating))
+        except sqlite3.Error as e:
+            _logger.error('Error writing history database %r: %r',
+                          self.filename, e)
+
+    def search(self, text=None, prefix=None, since=None, slowest=False,
+               limit=20):
+        """Return the most recent matching executions as tuples of COLUMNS.
+
+        :param text: words the query contains. A word ending with '*' is a
+            prefix.
+        :param prefix: text the query starts with.
+        :param since: only the executions after this unix time.
+        :param slowest: order by duration instead of time.
+        """
+        conn = self._connection()
+        if conn is None:
+            return []
+
+        tables, conditions, params = ['history h'], [], []
+        if text:
+            words = _word.findall(text)
+            if self.fts and words:
+                tables.append('history_fts f')
+                conditions.append('h.id = f.%s AND history_fts MATCH ?'
+                                  % _fts_rowid[self.fts])
+                params.append(' '.join(words))
+            else:
+                for word in words or [text]:
+                    conditions.append('h.query LIKE ?')
+                    params.append('%' + word.rstrip('*') + '%')
+        if prefix:
+            # A (case insensitive) range, so the index on query is used.
+            conditions.append('h.query >= ? AND h.query < ?')
+            params.extend([prefix, prefix + u'\U0010ffff'])
+        if since is not None:
+            conditions.append('h.executed_at >= ?')
+            params.append(since)
+
+        sql = 'SELECT %s FROM %s' % (
+            ', '.join('h.' + c for c in COLUMNS), ', '.join(tables))
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY h.%s DESC LIMIT ?' % (
+            'duration' if slowest else 'executed_at')
+        params.append(limit)
+        try:
+            return conn.execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            _logger.error('Error searching history database %r: %r',
+                          self.filename, e)
+            return []
+
+    def close(self):
+        """Close the database. It's opened again if the history is used."""
+        self.opened = False
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
@@ -5,6 +5,14 @@ from prompt_toolkit.filters import Condition
 
 _logger = logging.getLogger(__name__)
 
+def start_completion(cli, select_first):
+    """Start completing at the cursor, without the debounce delay of the
+    completions while typing."""
+    completer = cli.current_buffer.completer
+    if completer is not None:
+        completer.requested = True
+    cli.start_completion(select_first=select_first)
+
 def pgcli_bindings(get_vi_mode_enabled, set_vi_mode_enabled):
     """
     Custom key bindings for pgcli.
@@ -53,7 +61,7 @@ def pgcli_bindings(get_vi_mode_enabled, set_vi_mode_enabled):
         if b.complete_state:
             b.complete_next()
         else:
-            event.cli.start_completion(select_first=True)
+            start_completion(event.cli, select_first=True)
 
     @key_binding_manager.registry.add_binding(Keys.ControlSpace)
     def _(event):
@@ -71,6 +79,6 @@ def pgcli_bindings(get_vi_mode_enabled, set_vi_mode_enabled):
         if b.complete_state:
             b.complete_next()
         else:
-            event.cli.start_completion(select_first=False)
+            start_completion(event.cli, select_first=False)
 
     return key_binding_manager
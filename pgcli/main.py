@@ -6,33 +6,39 @@ import os
 import sys
 import traceback
 import logging
-from time import time
+import time
+import threading
+import importlib
+
+from .packages.timing import PhaseTimer, null_timer, perf_counter
+
+# Measured for --profile-startup.
+_import_start = perf_counter()
 
 import click
 import sqlparse
-from prompt_toolkit import CommandLineInterface, Application, AbortAction
-from prompt_toolkit.enums import DEFAULT_BUFFER
-from prompt_toolkit.shortcuts import create_default_layout, create_eventloop
-from prompt_toolkit.document import Document
-from prompt_toolkit.filters import Always, HasFocus, IsDone
-from prompt_toolkit.layout.processors import (ConditionalProcessor,
-                                        HighlightMatchingBracketProcessor)
-from prompt_toolkit.history import FileHistory
-from pygments.lexers.sql import PostgresLexer
-from pygments.token import Token
-
-from .packages.tabulate import tabulate
+
+from .packages.tabulate import tabulate_lines
 from .packages.expanded import expanded_table
-from .packages.pgspecial.main import (PGSpecial, NO_QUERY)
+from .packages.unaligned import unaligned_table
+from .packages.resultcache import ResultCache, CachedResult
+from .packages.columnar import ColumnarData
+from .packages.tabulate import tabulate_formats
+from .packages.profile import profile_report
+from .packages.sessionstats import (SessionStats, statement_type,
+                                    formatting_time)
+from .packages.tracing import tracer
+from .packages.pgspecial.main import (PGSpecial, NO_QUERY, unescape_separator)
+from .packages.pgspecial.namedqueries import namedqueries
 import pgcli.packages.pgspecial as special
-from .pgcompleter import PGCompleter
-from .pgtoolbar import create_toolbar_tokens_func
-from .pgstyle import style_factory
+from .columnloader import ColumnLoader
+from .completionrefresher import CompletionRefresher
+from .historystore import HistoryStore
+from .slowlog import SlowQueryLog
 from .pgexecute import PGExecute
-from .pgbuffer import PGBuffer
+from .pager import write_output
 from .config import write_default_config, load_config
-from .key_bindings import pgcli_bindings
-from .encodingutils import utf8tounicode
+from .encodingutils import utf8tounicode, utf8_length
 from .__init__ import __version__
 
 
@@ -41,9 +47,27 @@ try:
 except ImportError:
     from urllib.parse import urlparse
 from getpass import getuser
-from psycopg2 import OperationalError
+from psycopg2 import OperationalError, InterfaceError
+
+from collections import namedtuple, deque
 
-from collections import namedtuple
+_import_time = perf_counter() - _import_start
+
+# The modules of the interactive interface: prompt_toolkit, the pygments
+# lexer and styles. They're only imported when they're needed, or in the
+# background by preload_interface().
+INTERFACE_MODULES = (
+    'prompt_toolkit.shortcuts',
+    'pygments.lexers.sql',
+    'pgcli.pgcompleter',
+    'pgcli.pgbuffer',
+    'pgcli.pgstyle',
+    'pgcli.pgtoolbar',
+    'pgcli.key_bindings',
+)
+
+# Number of characters of the queries written to the trace file.
+TRACED_QUERY_LENGTH = 200
 
 # Query tuples are used for maintaining history
 Query = namedtuple('Query', ['query', 'successful', 'mutating'])
@@ -71,21 +95,74 @@ class PGCli(object):
         self.multi_line = c['main'].as_bool('multi_line')
         self.vi_mode = c['main'].as_bool('vi')
         self.pgspecial.timing_enabled = c['main'].as_bool('timing')
+        self.pgspecial.unaligned_output = c['main'].as_bool('unaligned_output')
+        self.pgspecial.field_separator = unescape_separator(
+            c['main']['field_separator'])
+        self.pgspecial.record_separator = unescape_separator(
+            c['main']['record_separator'])
         self.table_format = c['main']['table_format']
         self.syntax_style = c['main']['syntax_style']
         self.cli_style = c['colors']
         self.wider_completion_menu = c['main'].as_bool('wider_completion_menu')
+        self.compact_history = c['main'].as_bool('compact_history')
 
         self.logger = logging.getLogger(__name__)
         self.initialize_logging()
+        self.initialize_tracing()
+
+        self.query_history = deque(maxlen=c['main'].as_int('query_history_size'))
+        self.session_stats = SessionStats()
+        self.history = HistoryStore(os.path.expanduser(c['main']['history_db']))
+        self.slow_query_log = SlowQueryLog(
+            os.path.expanduser(c['main']['slow_query_log']),
+            c['main'].as_int('slow_query_threshold') / 1000.0,
+            c['main'].as_bool('slow_query_plan'))
+
+        self.result_cache = ResultCache(
+            c['main'].as_int('result_cache_size'),
+            c['main'].as_int('result_cache_memory') * 1024 * 1024)
+
+        # The named queries are stored in the same config file.
+        namedqueries.config = c
+
+        # The completer is created the first time it's used, so
+        # prompt_toolkit isn't imported before it's needed.
+        self._completer = None
+        # The search path of the session as last read. The completers
+        # swapped in by a refresh get it, even if it changed meanwhile.
+        self.search_path = None
+        PGExecute.oid_cache.load(os.path.expanduser(c['main']['oid_cache_file']))
+        self.usage_file = os.path.expanduser(c['main']['usage_file'])
+        self.usage_from_table_stats = c['main'].as_bool('usage_from_table_stats')
+        self.retry_read_only = c['main'].as_bool('retry_read_only')
+        self.lazy_columns = c['main'].as_bool('lazy_columns')
+        self.column_cache_size = c['main'].as_int('column_cache_size')
+        self.cli = None
+        self.completion_refresher = CompletionRefresher(
+            self.completion_steps(), self.completion_progress)
+        self.register_special_commands()
 
-        self.query_history = []
+    @property
+    def completer(self):
+        if self._completer is None:
+            self._completer = self.create_completer()
+        return self._completer
 
-        # Initialize completer
+    @completer.setter
+    def completer(self, completer):
+        self._completer = completer
+
+    def create_completer(self):
+        from .pgcompleter import PGCompleter
+
+        c = self.config
         smart_completion = c['main'].as_bool('smart_completion')
         completer = PGCompleter(smart_completion, pgspecial=self.pgspecial)
-        self.completer = completer
-        self.register_special_commands()
+        completer.usage.load(self.usage_file)
+        completer.debounce = c['main'].as_int('completion_debounce') / 1000.0
+        completer.latency_budget = (
+            c['main'].as_int('completion_latency_budget') / 1000.0)
+        return completer
 
     def register_special_commands(self):
 
@@ -98,6 +175,103 @@ class PGCli(object):
         self.pgspecial.register(self.refresh_completions, '\\refresh', '\\refresh',
                               'Refresh auto-completions.', arg_type=NO_QUERY)
 
+        self.pgspecial.register(self.redisplay, '\\redisplay',
+                              '\\redisplay [n]',
+                              'Show the n-th most recent result again.')
+        self.pgspecial.register(self.show_history, '\\history',
+                              '\\history [slow [days] | ^prefix | words]',
+                              'Search the history of the executed queries.')
+        self.pgspecial.register(self.profile, '\\profile', '\\profile query',
+                              'Show where the time of a query goes.')
+        self.pgspecial.register(self.show_stats, '\\stats', '\\stats [reset]',
+                              'Show the latency statistics of the session.')
+        self.pgspecial.register(self.change_table_format, '\\T',
+                              '\\T [format]',
+                              'Change the table format used to output results.')
+
+    def redisplay(self, pattern, **_):
+        try:
+            n = int(pattern) if pattern else 1
+        except ValueError:
+            n = 0
+        result = self.result_cache.get(n)
+        if result is None:
+            return [(None, None, None, 'No cached result to redisplay.')]
+        return [(result.title, result, result.headers, result.status)]
+
+    def show_history(self, pattern, **_):
+        """The most recent queries, or the ones that start with ^prefix,
+        contain some words, or were the slowest in the last few days."""
+        words = pattern.split()
+        if words and words[0] == 'slow':
+            try:
+                days = float(words[1]) if len(words) > 1 else 7
+            except ValueError:
+                return [(None, None, None,
+                         'Syntax: \\history slow [days]')]
+            rows = self.history.search(since=time.time() - days * 86400,
+                                       slowest=True)
+        elif pattern.startswith('^'):
+            rows = self.history.search(prefix=pattern[1:])
+        else:
+            rows = self.history.search(text=pattern)
+
+        headers = ['Executed', 'Database', 'Duration', 'Rows', 'Bytes', 'OK',
+                   'Query']
+        table = [(time.strftime('%Y-%m-%d %H:%M:%S',
+                                time.localtime(executed_at)),
+                  database,
+                  '%0.03fs' % duration if duration is not None else None,
+                  rows, nbytes, 'yes' if successful else 'no',
+                  ' '.join(query.split()))
+                 for (executed_at, database, query, duration, rows, nbytes,
+                      successful, _) in rows]
+        if not table:
+            return [(None, None, None, 'No matching queries in the history.')]
+        return [(None, table, headers, None)]
+
+    def profile(self, pattern, **_):
+        """Run a statement with EXPLAIN ANALYZE, rolled back, then normally,
+        timing the execution, the typecasting and the rendering, and report
+        where the time went on the server and in pgcli.
+
+        The result isn't shown, but it can be with \\redisplay.
+        """
+        if not pattern:
+            return [(None, None, None, 'Syntax: \\profile query')]
+        plan = self.pgexecute.explain_analyze(pattern)
+
+        timer = PhaseTimer()
+        with timer.phase('execute'):
+            result = self.pgexecute.execute_and_track(pattern)
+        cur = result[1]
+        rows = cur.rowcount if cur else 0
+        rendered = 0
+        for chunk in self.format_result(result, timer):
+            rendered += utf8_length(chunk)
+        return profile_report(plan, timer, rows, rendered)
+
+    def show_stats(self, pattern, **_):
+        """Latency percentiles by statement type, and the time spent
+        formatting and writing the output, since the start of the session or
+        the last \\stats reset."""
+        if pattern == 'reset':
+            self.session_stats.reset()
+            return [(None, None, None, 'Statistics reset.')]
+        rows, headers, status = self.session_stats.report()
+        return [(None, rows, headers, status)]
+
+    def change_table_format(self, pattern, **_):
+        if not pattern:
+            return [(None, None, None,
+                     'Table format is %s.' % self.table_format)]
+        if pattern not in tabulate_formats:
+            return [(None, None, None,
+                     'Table format must be one of: %s.' %
+                     ', '.join(tabulate_formats))]
+        self.table_format = pattern
+        return [(None, None, None, 'Changed table format to %s.' % pattern)]
+
     def change_db(self, pattern, **_):
         if pattern:
             db = pattern[1:-1] if pattern[0] == pattern[-1] == '"' else pattern
@@ -135,6 +309,14 @@ class PGCli(object):
         root_logger.debug('Initializing pgcli logging.')
         root_logger.debug('Log file %r.', log_file)
 
+    def initialize_tracing(self):
+        trace_file = self.config['main']['trace_file']
+        if not trace_file:
+            return
+        tracer.start(os.path.expanduser(trace_file),
+                     self.config['main'].as_int('trace_file_size') * 1024 * 1024,
+                     self.config['main'].as_int('trace_file_count'))
+
     def connect_uri(self, uri):
         uri = urlparse(uri)
         database = uri.path[1:]  # ignore the leading fwd slash
@@ -190,6 +372,7 @@ class PGCli(object):
             click.secho(str(e), err=True, fg='red')
             exit(1)
 
+        pgexecute.retry_read_only = self.retry_read_only
         self.pgexecute = pgexecute
 
     def handle_editor_command(self, cli, document):
@@ -205,6 +388,8 @@ class PGCli(object):
         :param document: Document
         :return: Document
         """
+        from prompt_toolkit.document import Document
+
         while special.editor_command(document.text):
             filename = special.get_filename(document.text)
             sql, message = special.open_external_editor(filename,
@@ -217,54 +402,29 @@ class PGCli(object):
             continue
         return document
 
-    def run_cli(self):
+    def run_cli(self, startup_timer=None):
+        """Run the interactive loop. If a PhaseTimer is given, the time spent
+        starting up is printed before the first prompt."""
+        timer = startup_timer or null_timer
         pgexecute = self.pgexecute
         logger = self.logger
         original_less_opts = self.adjust_less_opts()
 
-        completer = self.completer
-        self.refresh_completions()
+        with timer.phase('interface'):
+            cli = self.create_interface()
+        self.cli = cli
 
-        def set_vi_mode(value):
-            self.vi_mode = value
-
-        key_binding_manager = pgcli_bindings(
-            get_vi_mode_enabled=lambda: self.vi_mode,
-            set_vi_mode_enabled=set_vi_mode)
+        # Keywords complete right away, the rest once it's loaded.
+        with timer.phase('completions'):
+            self.refresh_completions()
 
         print('Version:', __version__)
         print('Chat: https://gitter.im/dbcli/pgcli')
         print('Mail: https://groups.google.com/forum/#!forum/pgcli')
         print('Home: http://pgcli.com')
-
-        def prompt_tokens(cli):
-            return [(Token.Prompt,  '%s> ' % pgexecute.dbname)]
-
-        get_toolbar_tokens = create_toolbar_tokens_func(lambda: self.vi_mode)
-        layout = create_default_layout(lexer=PostgresLexer,
-                                       reserve_space_for_menu=True,
-                                       get_prompt_tokens=prompt_tokens,
-                                       get_bottom_toolbar_tokens=get_toolbar_tokens,
-                                       display_completions_in_columns=self.wider_completion_menu,
-                                       multiline=True,
-                                       extra_input_processors=[
-                                           # Highlight matching brackets while editing.
-                                           ConditionalProcessor(
-                                               processor=HighlightMatchingBracketProcessor(chars='[](){}'),
-                                               filter=HasFocus(DEFAULT_BUFFER) & ~IsDone()),
-                                       ])
-        history_file = self.config['main']['history_file']
-        buf = PGBuffer(always_multiline=self.multi_line, completer=completer,
-                history=FileHistory(os.path.expanduser(history_file)),
-                complete_while_typing=Always())
-
-        application = Application(style=style_factory(self.syntax_style, self.cli_style),
-                                  layout=layout, buffer=buf,
-                                  key_bindings_registry=key_binding_manager.registry,
-                                  on_exit=AbortAction.RAISE_EXCEPTION,
-                                  ignore_case=True)
-        cli = CommandLineInterface(application=application,
-                                   eventloop=create_eventloop())
+        if startup_timer:
+            print('Startup: %s, total %0.03fms' % (
+                startup_timer, startup_timer.total() * 1000))
 
         try:
             while True:
@@ -289,26 +449,31 @@ class PGCli(object):
                 # of a multi-statement query, the overall query is considered
                 # mutating if any one of the component statements is mutating
                 mutating = False
+                executed_at = time.time()
+                duration = 0
+                output_bytes = [0]
+                if tracer.enabled:
+                    tracer.new_trace()
+                # Timing each line of the output costs a couple of clock
+                # reads per line, only done when someone looks at it.
+                timed = self.pgspecial.timing_enabled or tracer.enabled
 
                 try:
-                    logger.debug('sql: %r', document.text)
                     successful = False
                     # Initialized to [] because res might never get initialized
                     # if an exception occurs in pgexecute.run(). Which causes
                     # finally clause to fail.
                     res = []
-                    start = time()
-                    # Run the query.
+                    # Run the query. The statements are executed one at a
+                    # time as the results are consumed.
                     res = pgexecute.run(document.text, self.pgspecial)
-                    duration = time() - start
-                    successful = True
-                    output = []
-                    total = 0
+                    results = []
+                    timers = []
+                    start = perf_counter()
                     for title, cur, headers, status in res:
-                        logger.debug("headers: %r", headers)
-                        logger.debug("rows: %r", cur)
-                        logger.debug("status: %r", status)
-                        start = time()
+                        timer = PhaseTimer(per_line=timed)
+                        timer.add('execute', perf_counter() - start)
+                        duration += timer.get('execute')
                         threshold = 1000
                         if (is_select(status) and
                                 cur and cur.rowcount > threshold):
@@ -318,32 +483,40 @@ class PGCli(object):
                                 click.secho("Aborted!", err=True, fg='red')
                                 break
 
-                        formatted = format_output(title, cur, headers, status,
-                                                  self.table_format,
-                                                  self.pgspecial.expanded_output)
-                        output.extend(formatted)
-                        end = time()
-                        total += end - start
+                        results.append((title, cur, headers, status))
+                        timers.append(timer)
                         mutating = mutating or is_mutating(status)
+                        start = perf_counter()
+                    # The statements run as they're consumed, so it only
+                    # succeeded once they all did.
+                    successful = True
 
                 except KeyboardInterrupt:
-                    # Restart connection to the database
-                    pgexecute.connect()
+                    # Restart connection to the database. Only once, without
+                    # waiting between attempts: the user is at the keyboard.
+                    # If it fails, the next command reconnects.
+                    try:
+                        pgexecute.reconnect(retry=False)
+                    except (OperationalError, KeyboardInterrupt) as e:
+                        logger.error("reconnecting failed: %r", e)
                     logger.debug("cancelled query, sql: %r", document.text)
                     click.secho("cancelled query", err=True, fg='red')
                 except NotImplementedError:
                     click.secho('Not Yet Implemented.', fg="yellow")
-                except OperationalError as e:
-                    reconnect = True
-                    if ('server closed the connection' in utf8tounicode(e.args[0])):
-                        reconnect = click.prompt('Connection reset. Reconnect (Y/n)',
-                                show_default=False, type=bool, default=True)
-                        if reconnect:
-                            try:
-                                pgexecute.connect()
-                                click.secho('Reconnected!\nTry the command again.', fg='green')
-                            except OperationalError as e:
-                                click.secho(str(e), err=True, fg='red')
+                except (OperationalError, InterfaceError) as e:
+                    # InterfaceError: the connection was already closed, e.g.
+                    # because reconnecting failed before.
+                    if pgexecute.connection_lost():
+                        logger.error("sql: %r, error: %r", document.text, e)
+                        click.secho(str(e), err=True, fg='red')
+                        try:
+                            pgexecute.reconnect()
+                            click.secho('Reconnected!\nTry the command again.', fg='green')
+                        except OperationalError as e:
+                            click.secho(str(e), err=True, fg='red')
+                        except KeyboardInterrupt:
+                            click.secho('Reconnecting cancelled.', err=True,
+                                        fg='red')
                     else:
                         logger.error("sql: %r, error: %r", document.text, e)
                         logger.error("traceback: %r", traceback.format_exc())
@@ -353,13 +526,61 @@ class PGCli(object):
                     logger.error("traceback: %r", traceback.format_exc())
                     click.secho(str(e), err=True, fg='red')
                 else:
+                    # Results are formatted lazily while they are written,
+                    # so time spent in the pager doesn't count as Format Time.
+                    format_time = [0]
+
+                    def output():
+                        for result, timer in zip(results, timers):
+                            chunks = self.format_result(result, timer)
+                            if not timed:
+                                for chunk in chunks:
+                                    output_bytes[0] += utf8_length(chunk)
+                                    yield chunk
+                                continue
+                            while True:
+                                start = perf_counter()
+                                chunk = next(chunks, None)
+                                format_time[0] += perf_counter() - start
+                                if chunk is None:
+                                    break
+                                output_bytes[0] += utf8_length(chunk)
+                                start = perf_counter()
+                                yield chunk
+                                timer.add('output', perf_counter() - start)
+
+                    start = perf_counter()
                     try:
-                        click.echo_via_pager('\n'.join(output))
+                        completed = write_output(output())
                     except KeyboardInterrupt:
-                        pass
+                        completed = False
+                    written = perf_counter() - start
+                    if not completed:
+                        # The pager quit early. Release the rows that were
+                        # never rendered.
+                        close_cursors(results)
+                    total = format_time[0]
                     if self.pgspecial.timing_enabled:
                         print('Command Time: %0.03fs' % duration)
                         print('Format Time: %0.03fs' % total)
+                        if self.pgspecial.timing_verbose:
+                            for i, timer in enumerate(timers, 1):
+                                print('Statement %d: %s' % (i, timer))
+                    for i, ((_, _, _, status), timer) in enumerate(
+                            zip(results, timers)):
+                        self.session_stats.add(status, timer)
+                        if tracer.enabled:
+                            tracer.emit_timer(timer, statement=i,
+                                              type=statement_type(status))
+                    if timed:
+                        output_time = sum(t.get('output') for t in timers)
+                    else:
+                        # Writing the output was timed as a whole, along
+                        # with the formatting that happened meanwhile.
+                        output_time = written - sum(
+                            formatting_time(t) for t in timers)
+                    self.session_stats.add_output(max(output_time, 0))
+                    self.session_stats.add_bytes(output_bytes[0])
 
                 # Refresh the table names and column names if necessary.
                 if need_completion_refresh(document.text):
@@ -368,55 +589,252 @@ class PGCli(object):
                 # Refresh search_path to set default schema.
                 if need_search_path_refresh(document.text):
                     logger.debug('Refreshing search path')
-                    completer.set_search_path(pgexecute.search_path())
-                    logger.debug('Search path: %r', completer.search_path)
+                    self.search_path = pgexecute.search_path()
+                    self.completer.set_search_path(self.search_path)
+                    logger.debug('Search path: %r', self.completer.search_path)
 
                 query = Query(document.text, successful, mutating)
                 self.query_history.append(query)
+                rows = count_rows(results) if successful else None
+                if tracer.enabled:
+                    tracer.emit('input', time.time() - executed_at,
+                                statements=len(results), rows=rows,
+                                successful=successful,
+                                query=document.text[:TRACED_QUERY_LENGTH])
+                if not successful:
+                    self.session_stats.add_failure()
+                self.history.add(document.text, pgexecute.dbname, duration,
+                                 rows, output_bytes[0], successful, mutating,
+                                 executed_at)
+                self.slow_query_log.record(document.text, duration, rows,
+                                           successful, pgexecute, executed_at)
+                if successful:
+                    self.completer.record_usage(document.text)
 
         except EOFError:
             print ('Goodbye!')
-        finally:  # Reset the less opts back to original.
+        finally:
+            self.completer.usage.save(self.usage_file)
+            self.history.close()
+            self.slow_query_log.close()
+            if self.compact_history:
+                self.input_history.compact()
+            else:
+                self.input_history.close()
+            # Reset the less opts back to original.
             logger.debug('Restoring env var LESS to %r.', original_less_opts)
             os.environ['LESS'] = original_less_opts
 
-    def adjust_less_opts(self):
-        less_opts = os.environ.get('LESS', '')
-        self.logger.debug('Original value for LESS env var: %r', less_opts)
-        os.environ['LESS'] = '-SRXF'
-
-        return less_opts
+    def create_interface(self):
+        """Build the prompt_toolkit CommandLineInterface. The modules of the
+        interface are imported here, unless preload_interface() already
+        did."""
+        from prompt_toolkit import (CommandLineInterface, Application,
+                                    AbortAction)
+        from prompt_toolkit.enums import DEFAULT_BUFFER
+        from prompt_toolkit.shortcuts import (create_default_layout,
+                                              create_eventloop)
+        from prompt_toolkit.filters import Always, HasFocus, IsDone
+        from prompt_toolkit.layout.processors import (
+            ConditionalProcessor, HighlightMatchingBracketProcessor)
+        from pygments.lexers.sql import PostgresLexer
+        from pygments.token import Token
+
+        from .pgtoolbar import create_toolbar_tokens_func
+        from .pgstyle import style_factory
+        from .pgbuffer import PGBuffer
+        from .mmaphistory import MmapHistory
+        from .key_bindings import pgcli_bindings
 
-    def refresh_completions(self):
-        completer = self.completer
-        completer.reset_completions()
-
-        pgexecute = self.pgexecute
+        def set_vi_mode(value):
+            self.vi_mode = value
 
-        # schemata
-        completer.set_search_path(pgexecute.search_path())
-        completer.extend_schemata(pgexecute.schemata())
+        key_binding_manager = pgcli_bindings(
+            get_vi_mode_enabled=lambda: self.vi_mode,
+            set_vi_mode_enabled=set_vi_mode)
 
-        # tables
-        completer.extend_relations(pgexecute.tables(), kind='tables')
-        completer.extend_columns(pgexecute.table_columns(), kind='tables')
+        def prompt_tokens(cli):
+            return [(Token.Prompt,  '%s> ' % self.pgexecute.dbname)]
 
-        # views
-        completer.extend_relations(pgexecute.views(), kind='views')
-        completer.extend_columns(pgexecute.view_columns(), kind='views')
+        get_toolbar_tokens = create_toolbar_tokens_func(
+            lambda: self.vi_mode,
+            get_refresh_progress=self.completion_refresher.progress)
+        layout = create_default_layout(lexer=PostgresLexer,
+                                       reserve_space_for_menu=True,
+                                       get_prompt_tokens=prompt_tokens,
+                                       get_bottom_toolbar_tokens=get_toolbar_tokens,
+                                       display_completions_in_columns=self.wider_completion_menu,
+                                       multiline=True,
+                                       extra_input_processors=[
+                                           # Highlight matching brackets while editing.
+                                           ConditionalProcessor(
+                                               processor=HighlightMatchingBracketProcessor(chars='[](){}'),
+                                               filter=HasFocus(DEFAULT_BUFFER) & ~IsDone()),
+                                       ])
+        history_file = self.config['main']['history_file']
+        self.input_history = MmapHistory(os.path.expanduser(history_file))
+        buf = PGBuffer(always_multiline=self.multi_line, completer=self.completer,
+                history=self.input_history,
+                complete_while_typing=Always())
+        # Abort the completions computed for text that was changed since.
+        cancel_completion = lambda: buf.completer.cancel()
+        buf.on_text_changed += cancel_completion
+        buf.on_cursor_position_changed += cancel_completion
 
-        # functions
-        completer.extend_functions(pgexecute.functions())
+        application = Application(style=style_factory(self.syntax_style, self.cli_style),
+                                  layout=layout, buffer=buf,
+                                  key_bindings_registry=key_binding_manager.registry,
+                                  on_exit=AbortAction.RAISE_EXCEPTION,
+                                  ignore_case=True)
+        return CommandLineInterface(application=application,
+                                    eventloop=create_eventloop())
+
+    def format_result(self, result, timer):
+        """Yields the output of a (title, cur, headers, status) result as
+        newline terminated text, rendered lazily."""
+        title, cur, headers, status = result
+        pgspecial = self.pgspecial
+
+        if pgspecial.unaligned_output:
+            # Rows are typecast and rendered together, one at a time.
+            chunks = format_unaligned_output(title, cur, headers, status,
+                                             pgspecial.field_separator,
+                                             pgspecial.record_separator)
+            with timer.phase('render'):
+                for chunk in chunks:
+                    yield chunk
+            return
+
+        if isinstance(cur, CachedResult):
+            self.result_cache.touch(cur)
+        elif cur:
+            with timer.phase('typecast'):
+                rows = cur if isinstance(cur, list) else list(cur)
+            # Transposed once here, the columns are shared by the table
+            # renderer and the result cache.
+            with timer.phase('transpose'):
+                cur = ColumnarData.from_rows(rows)
+                del rows
+            # Keep the result around, so it can be redisplayed without
+            # running the query again.
+            with timer.phase('cache'):
+                self.result_cache.add(title, cur, headers, status)
+
+        for chunk in format_output_chunks(title, cur, headers, status,
+                                          self.table_format,
+                                          pgspecial.expanded_output, timer):
+            yield chunk
 
-        # types
-        completer.extend_datatypes(pgexecute.datatypes())
+    def adjust_less_opts(self):
+        less_opts = os.environ.get('LESS', '')
+        self.logger.debug('Original value for LESS env var: %r', less_opts)
+        os.environ['LESS'] = '-SRXF'
 
-        # databases
-        completer.extend_database_names(pgexecute.databases())
+        return less_opts
 
-        return [(None, None, None, 'Auto-completions refreshed.')]
+    def refresh_completions(self):
+        """Reload the database metadata used for auto-completion, in the
+        background. The current completer is used until it's done."""
+        # The search path of this session, which may have been SET, rather
+        # than the default one the background connection would get.
+        completer = self.completer.empty_copy()
+        self.search_path = self.pgexecute.search_path()
+        completer.set_search_path(self.search_path)
+        self.completion_refresher.refresh(self.pgexecute.copy, completer,
+                                          self.completions_loaded)
+        return [(None, None, None,
+                 'Auto-completion refresh started in the background.')]
+
+    def completion_steps(self):
+        """The steps of the completion refresh, as (name, function) pairs."""
+        def columns(completer, executor):
+            if self.lazy_columns:
+                completer.set_column_loader(ColumnLoader(
+                    self.pgexecute.copy, self.column_cache_size,
+                    self.columns_loaded))
+            else:
+                completer.extend_columns(executor.table_columns(),
+                                         kind='tables')
+                completer.extend_columns(executor.view_columns(),
+                                         kind='views')
+
+        def usage(completer, executor):
+            if self.usage_from_table_stats:
+                completer.seed_usage(executor.table_scans())
+
+        def type_oids(completer, executor):
+            # The connections were set up with the cached type OIDs.
+            if executor.check_type_oids():
+                self.pgexecute.register_typecasters()
+
+        return [
+            ('schemata', lambda completer, executor:
+                completer.extend_schemata(executor.schemata())),
+            ('tables', lambda completer, executor:
+                completer.extend_relations(executor.tables(), kind='tables')),
+            ('views', lambda completer, executor:
+                completer.extend_relations(executor.views(), kind='views')),
+            ('columns', columns),
+            ('functions', lambda completer, executor:
+                completer.extend_functions(executor.functions())),
+            ('datatypes', lambda completer, executor:
+                completer.extend_datatypes(executor.datatypes())),
+            ('databases', lambda completer, executor:
+                completer.extend_database_names(executor.databases())),
+            ('usage', usage),
+            ('type oids', type_oids),
+        ]
+
+    def completions_loaded(self, completer):
+        """Called from the completion refresher thread with the new
+        completer."""
+        cli = self.cli
+        if cli is None:
+            self.set_completer(completer)
+            return
+
+        def swap():
+            self.set_completer(completer)
+            self.restart_completion()
+
+        cli.eventloop.call_from_executor(swap)
+
+    def completion_progress(self):
+        """Called from the completion refresher thread when it's making
+        progress, to update the toolbar."""
+        if self.cli is not None:
+            self.cli.request_redraw()
+
+    def set_completer(self, completer):
+        """Swap in a new completer, in one step."""
+        if self.search_path is not None:
+            completer.set_search_path(self.search_path)
+        old_completer, self._completer = self._completer, completer
+        if self.cli:
+            from prompt_toolkit.enums import DEFAULT_BUFFER
+            self.cli.buffers[DEFAULT_BUFFER].completer = completer
+        if old_completer is not None and old_completer is not completer:
+            old_completer.set_column_loader(None)
+
+    def columns_loaded(self):
+        """Called from the column loader thread when columns have been loaded
+        in the background. Updates the completion menu if it's showing."""
+        cli = self.cli
+        if cli is not None:
+            cli.eventloop.call_from_executor(self.restart_completion)
+
+    def restart_completion(self):
+        """Compute the completions again, with the latest metadata, if the
+        completion menu is showing."""
+        cli = self.cli
+        buf = cli.current_buffer
+        # Don't get in the way if a completion is being selected.
+        if buf.complete_state and buf.complete_state.complete_index is None:
+            buf.complete_state = None
+            cli.start_completion()
 
     def get_completions(self, text, cursor_positition):
+        from prompt_toolkit.document import Document
         return self.completer.get_completions(
             Document(text=text, cursor_position=cursor_positition), None)
 
@@ -438,25 +856,46 @@ class PGCli(object):
         help='database name to connect to.')
 @click.option('--pgclirc', default='~/.pgclirc', envvar='PGCLIRC',
         help='Location of .pgclirc file.')
+@click.option('-A', '--no-align', 'no_align', is_flag=True, default=False,
+        help='Unaligned table output mode.')
+@click.option('-F', '--field-separator', default=None,
+        help='Field separator for unaligned output.')
+@click.option('--profile-startup', is_flag=True, default=False,
+        help='Print the time spent starting up.')
 @click.argument('database', default=lambda: None, envvar='PGDATABASE', nargs=1)
 @click.argument('username', default=lambda: None, envvar='PGUSER', nargs=1)
 def cli(database, user, host, port, prompt_passwd, never_prompt, dbname,
-        username, version, pgclirc):
+        username, version, pgclirc, no_align, field_separator,
+        profile_startup):
 
     if version:
         print('Version:', __version__)
         sys.exit(0)
 
-    pgcli = PGCli(prompt_passwd, never_prompt, pgclirc_file=pgclirc)
+    timer = PhaseTimer() if profile_startup else null_timer
+    timer.add('imports', _import_time)
+
+    # Load the interface while the config is read and the connection is
+    # made, or the password is typed.
+    preload_interface()
+
+    with timer.phase('config'):
+        pgcli = PGCli(prompt_passwd, never_prompt, pgclirc_file=pgclirc)
+
+    if no_align:
+        pgcli.pgspecial.unaligned_output = True
+    if field_separator is not None:
+        pgcli.pgspecial.field_separator = unescape_separator(field_separator)
 
     # Choose which ever one has a valid value.
     database = database or dbname
     user = username or user
 
-    if '://' in database:
-        pgcli.connect_uri(database)
-    else:
-        pgcli.connect(database, host, user, port)
+    with timer.phase('connect'):
+        if '://' in database:
+            pgcli.connect_uri(database)
+        else:
+            pgcli.connect(database, host, user, port)
 
     pgcli.logger.debug('Launch Params: \n'
             '\tdatabase: %r'
@@ -464,23 +903,93 @@ def cli(database, user, host, port, prompt_passwd, never_prompt, dbname,
             '\thost: %r'
             '\tport: %r', database, user, host, port)
 
-    pgcli.run_cli()
+    pgcli.run_cli(timer if profile_startup else None)
 
-def format_output(title, cur, headers, status, table_format, expanded=False):
+def preload_interface():
+    """Import the INTERFACE_MODULES in a background thread."""
+    def preload():
+        for name in INTERFACE_MODULES:
+            try:
+                importlib.import_module(name)
+            except Exception as e:
+                # It's imported again, and fails for real, when it's used.
+                logging.getLogger(__name__).debug(
+                    'Preloading %s failed: %r', name, e)
+                return
+
+    thread = threading.Thread(target=preload, name='preload-interface')
+    thread.daemon = True
+    thread.start()
+    return thread
+
+def format_output(title, cur, headers, status, table_format, expanded=False,
+                  timer=None):
     output = []
     if title:  # Only print the title if it's not None.
         output.append(title)
     if cur:
-        headers = [utf8tounicode(x) for x in headers]
-        if expanded:
-            output.append(expanded_table(cur, headers))
-        else:
-            output.append(tabulate(cur, headers, tablefmt=table_format,
-                missingval='<null>'))
+        output.append('\n'.join(format_table_lines(cur, headers, table_format,
+                                                   expanded, timer)))
     if status:  # Only print the status if it's not None.
         output.append(status)
     return output
 
+def format_output_chunks(title, cur, headers, status, table_format,
+                         expanded=False, timer=None):
+    """Lazy version of format_output() that yields newline terminated text.
+
+    The table is produced line by line, so the first screenful can be shown
+    before the rest of the table is put together.
+    """
+    if title:  # Only print the title if it's not None.
+        yield title + '\n'
+    if cur:
+        for line in format_table_lines(cur, headers, table_format, expanded,
+                                       timer):
+            yield line + '\n'
+    if status:  # Only print the status if it's not None.
+        yield status + '\n'
+
+def format_table_lines(cur, headers, table_format, expanded=False,
+                       timer=None):
+    """Yields the lines of the table for the rows of a result."""
+    timer = timer or null_timer
+    headers = [utf8tounicode(x) for x in headers]
+    # psycopg2 converts the values to python objects while the rows are
+    # read from the cursor.
+    with timer.phase('typecast'):
+        rows = cur if isinstance(cur, (list, ColumnarData)) else list(cur)
+    if expanded:
+        with timer.phase('build'):
+            table = expanded_table(rows, headers)
+        yield table
+        return
+    if not isinstance(rows, ColumnarData):
+        with timer.phase('transpose'):
+            rows = ColumnarData.from_rows(rows)
+    for line in tabulate_lines(rows, headers, tablefmt=table_format,
+                               missingval='<null>', timer=timer):
+        yield line
+
+def format_unaligned_output(title, cur, headers, status, field_separator='|',
+                            record_separator='\n'):
+    """Yields the output of a result in unaligned mode, record by record."""
+    if title:  # Only print the title if it's not None.
+        yield title + '\n'
+    if cur:
+        headers = [utf8tounicode(x) for x in headers]
+        for record in unaligned_table(cur, headers, field_separator,
+                                      record_separator):
+            yield record
+    if status:  # Only print the status if it's not None.
+        yield status + '\n'
+
+def close_cursors(results):
+    """Close the cursors of (title, cur, headers, status) results."""
+    for _, cur, _, _ in results:
+        if hasattr(cur, 'close'):
+            cur.close()
+
 def need_completion_refresh(queries):
     """Determines if the completion needs a refresh by checking if the sql
     statement is an alter, create, drop or change db."""
@@ -505,6 +1014,16 @@ def is_mutating(status):
     mutating = set(['insert', 'update', 'delete', 'alter', 'create', 'drop'])
     return status.split(None, 1)[0].lower() in mutating
 
+def count_rows(results):
+    """The number of rows the statements of (title, cur, headers, status)
+    results returned or changed, according to their status."""
+    rows = 0
+    for _, _, _, status in results:
+        count = status.rsplit(None, 1)[-1] if status else ''
+        if count.isdigit():
+            rows += int(count)
+    return rows
+
 def is_select(status):
     """Returns true if the first word in status is 'select'."""
     if not status:
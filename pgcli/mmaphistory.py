@@ -0,0 +1,353 @@
+"""Input history over a memory-mapped history file.
+
+The file has the format of prompt_toolkit's FileHistory: each entry is a
+"# <timestamp>" line followed by the lines of the entry, each prefixed with
+"+".
+"""
+
+import os
+import re
+import mmap
+import hashlib
+import logging
+import datetime
+from array import array
+from bisect import bisect_left
+try:
+    from collections import OrderedDict
+except ImportError:
+    # python 2.6
+    from ordereddict import OrderedDict
+
+from prompt_toolkit.history import History
+
+_logger = logging.getLogger(__name__)
+
+# The number of decoded entries kept around.
+CACHE_SIZE = 1000
+
+# How much of the file is searched at a time, from the end.
+SEARCH_WINDOW = 1 << 20
+
+# Typecode of the array of offsets.
+try:
+    array('q')
+    OFFSET_TYPECODE = 'q'
+except ValueError:
+    # python 2
+    OFFSET_TYPECODE = 'l'
+
+
+def _matcher(text, ignore_case):
+    """A function telling if a string contains text."""
+    if ignore_case:
+        text = text.lower()
+        return lambda string: text in string.lower()
+    return lambda string: text in string
+
+
+def _is_ascii(text):
+    try:
+        text.encode('ascii')
+    except UnicodeError:
+        return False
+    return True
+
+
+class HistoryEntries(object):
+    """The entries of a history file, as a read only sequence.
+
+    The file is memory-mapped and nothing is parsed up front, except for
+    counting the entries. The offsets of the entries are found from the end
+    of the file, as far back as the entries are accessed, and kept in an
+    array. Entries are decoded when they're accessed.
+
+    Entries appended in this session are kept in a list.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.mm = None
+        self.size = 0
+        self.count = 0
+        self.added = []
+        # Offsets of the "#" of the entry headers, negated, found so far from
+        # the end of the file, so they're in ascending order for bisect.
+        self.starts = array(OFFSET_TYPECODE)
+        # Offsets of the headers of other entries, found by searching.
+        self.located = {}
+        self.cache = OrderedDict()
+        self._open()
+
+    def _open(self):
+        if not os.path.exists(self.filename):
+            return
+        with open(self.filename, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if not size:
+                return
+            self.mm = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+        self.size = size
+        self.count = self._count_headers()
+
+    def _count_headers(self):
+        mm, count = self.mm, 0
+        chunk_size = 1 << 24
+        for start in range(0, self.size, chunk_size):
+            # One byte more, for a header split between two chunks.
+            count += mm[start:start + chunk_size + 1].count(b'\n#')
+        if mm[:1] == b'#':
+            count += 1
+        return count
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+
+    def __len__(self):
+        return self.count + len(self.added)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            if index == slice(None):
+                # Buffer takes a copy of the history on each reset.
+                return WorkingLines(self)
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        if index >= self.count:
+            return self.added[index - self.count]
+        return self._entry(index)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def append(self, string):
+        self.added.append(string)
+
+    def _header(self, index):
+        """The offset of the header of a stored entry."""
+        if index in self.located:
+            return self.located[index]
+        k = self.count - 1 - index
+        starts, mm = self.starts, self.mm
+        while len(starts) <= k:
+            end = -starts[-1] if starts else self.size
+            pos = mm.rfind(b'\n#', 0, end)
+            starts.append(-(pos + 1))
+        return -starts[k]
+
+    def _bounds(self, index):
+        """The offsets of the first and last byte of a stored entry, from
+        the newline before its header to the newline before the next
+        one."""
+        start = self._header(index)
+        end = self.mm.find(b'\n#', start)
+        return max(start - 1, 0), end if end != -1 else self.size
+
+    def _entry(self, index):
+        try:
+            string = self.cache.pop(index)
+        except KeyError:
+            start, end = self._bounds(index)
+            lines = self.mm[start:end].split(b'\n')
+            string = b'\n'.join(line[1:] for line in lines
+                                if line.startswith(b'+'))
+            string = string.decode('utf-8', 'replace')
+            while len(self.cache) >= CACHE_SIZE:
+                self.cache.popitem(last=False)
+        self.cache[index] = string
+        return string
+
+    def _index_at(self, offset):
+        """The index of the stored entry the byte at offset belongs to, or
+        None if it's before the first header."""
+        mm, starts = self.mm, self.starts
+        header = mm.rfind(b'\n#', 0, offset + 1) + 1
+        if not header and mm[:1] != b'#':
+            return None
+        if starts and header >= -starts[-1]:
+            return self.count - 1 - bisect_left(starts, -header)
+
+        # Count the headers from there to the closest entry whose index is
+        # known, rather than finding the offsets of all the entries between.
+        index, end = self.count, self.size
+        if starts:
+            index, end = self.count - len(starts), -starts[-1]
+        for i, pos in self.located.items():
+            if header < pos < end:
+                index, end = i, pos
+        index -= mm[max(header - 1, 0):end - 1].count(b'\n#')
+        if not header:
+            index -= 1
+        self.located[index] = header
+        return index
+
+    def search_backwards(self, text, before, ignore_case=False, skip=()):
+        """The index of the newest stored entry before `before` that contains
+        text, or None.
+
+        The file is searched with a regular expression, from the end, so the
+        entries that don't match are never decoded. The entries in `skip`
+        are ignored.
+        """
+        before = min(before, self.count)
+        if self.mm is None or before <= 0 or not text:
+            return None
+        if ignore_case and not _is_ascii(text):
+            # re.IGNORECASE only folds ASCII letters in bytes, so the
+            # entries are decoded and compared instead.
+            match = _matcher(text, ignore_case)
+            for index in range(before - 1, -1, -1):
+                if index not in skip and match(self._entry(index)):
+                    return index
+            return None
+        needle = text.encode('utf-8').replace(b'\n', b'\n+')
+        pattern = re.compile(re.escape(needle),
+                             re.IGNORECASE if ignore_case else 0)
+        match = _matcher(text, ignore_case)
+
+        end = self._bounds(before - 1)[1]
+        while end > 0:
+            start = max(end - SEARCH_WINDOW, 0)
+            found = None
+            for found in pattern.finditer(self.mm, start, end):
+                pass
+            if found is None:
+                # Overlap, for a match across the window boundary.
+                end = start + len(needle) - 1 if start else 0
+                continue
+            index = self._index_at(found.start())
+            if index is None:
+                return None
+            # The match may be in a header, or in the prefixes of the lines.
+            if index not in skip and match(self._entry(index)):
+                return index
+            end = self._bounds(index)[0]
+        return None
+
+
+class WorkingLines(object):
+    """The copy of the history that Buffer edits. Only the lines that are
+    changed or added are stored."""
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.count = len(entries)
+        self.changed = {}
+        self.added = []
+
+    def __len__(self):
+        return self.count + len(self.added)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if index >= self.count:
+            return self.added[index - self.count]
+        if index in self.changed:
+            return self.changed[index]
+        return self.entries[index]
+
+    def __setitem__(self, index, value):
+        if index < 0:
+            index += len(self)
+        if index >= self.count:
+            self.added[index - self.count] = value
+        else:
+            self.changed[index] = value
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def append(self, value):
+        self.added.append(value)
+
+    def find_backwards(self, text, before, ignore_case=False):
+        """The index of the last line before `before` that contains text, or
+        None."""
+        match = _matcher(text, ignore_case)
+        stored = self.entries.count
+        # The lines added in this session aren't in the file.
+        for i in range(before - 1, stored - 1, -1):
+            if match(self[i]):
+                return i
+
+        before = min(before, stored)
+        found = [i for i in self.changed
+                 if i < before and match(self.changed[i])]
+        index = self.entries.search_backwards(text, before, ignore_case,
+                                              skip=self.changed)
+        if index is not None:
+            found.append(index)
+        return max(found) if found else None
+
+
+class MmapHistory(History):
+    """A drop-in replacement for prompt_toolkit's FileHistory that doesn't
+    read the file at startup, and searches it without decoding it."""
+
+    def __init__(self, filename):
+        super(MmapHistory, self).__init__()
+        self.filename = filename
+        self.strings = HistoryEntries(filename)
+
+    def append(self, string):
+        self.strings.append(string)
+
+        # Save to file.
+        with open(self.filename, 'ab') as f:
+            write = lambda t: f.write(t.encode('utf-8'))
+
+            write(u'\n# %s\n' % datetime.datetime.now())
+            for line in string.split('\n'):
+                write(u'+%s\n' % line)
+
+    def close(self):
+        self.strings.close()
+
+    def compact(self):
+        """Rewrite the file without the duplicate entries, keeping the most
+        recent of each. The history can't be used after that."""
+        entries = self.strings
+        if entries.mm is None:
+            return
+        seen, kept = set(), []
+        for index in range(entries.count - 1, -1, -1):
+            start, end = entries._bounds(index)
+            segment = entries.mm[start:end]
+            body = segment[segment.find(b'\n+'):]
+            key = hashlib.sha1(body).digest()
+            if key not in seen:
+                seen.add(key)
+                kept.append((start, end))
+        if len(kept) == entries.count:
+            self.close()
+            return
+
+        temp = self.filename + '.compact'
+        try:
+            with open(temp, 'wb') as f:
+                for start, end in reversed(kept):
+                    f.write(entries.mm[start:end])
+                # Entries other sessions appended in the meantime.
+                with open(self.filename, 'rb') as current:
+                    current.seek(entries.size)
+                    f.write(current.read())
+            self.close()
+            if os.name == 'nt' and os.path.exists(self.filename):
+                os.remove(self.filename)
+            os.rename(temp, self.filename)
+        except (IOError, OSError) as e:
+            _logger.error('Error compacting history file %r: %r',
+                          self.filename, e)
+        else:
+            _logger.debug('Compacted the history from %d to %d entries.',
+                          entries.count, len(kept))
+        finally:
+            self.close()
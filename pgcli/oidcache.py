@@ -0,0 +1,61 @@
+"""Cache of the type OIDs looked up when connecting to a server."""
+
+import os
+import json
+import logging
+import threading
+
+_logger = logging.getLogger(__name__)
+
+
+class OidCache(object):
+    """The OIDs of the types pgcli registers typecasters for, by server.
+
+    Keys identify a database on a server, values are {type_name: [oid,
+    array_oid]} dicts. A type missing from a dict isn't defined in that
+    database. The cache is kept in memory and, if it has a filename, in a
+    JSON file.
+    """
+
+    def __init__(self, filename=None):
+        self.filename = filename
+        self.oids = {}
+        self.lock = threading.Lock()
+
+    def load(self, filename):
+        """Read the cache from a file, which is also where it's saved from
+        then on. A missing or unreadable file is ignored."""
+        self.filename = filename
+        if not os.path.exists(filename):
+            return
+        try:
+            with open(filename) as f:
+                oids = json.load(f)
+        except (IOError, OSError, ValueError) as e:
+            _logger.error('Error reading OID cache %r: %r', filename, e)
+            return
+        with self.lock:
+            self.oids = oids
+
+    def get(self, key):
+        """Return the type OIDs of a server, or None if they're unknown."""
+        return self.oids.get(key)
+
+    def set(self, key, oids):
+        """Store the type OIDs of a server, and save the cache if they
+        changed. Returns True if they did."""
+        oids = dict((name, list(values)) for name, values in oids.items())
+        with self.lock:
+            if self.oids.get(key) == oids:
+                return False
+            self.oids[key] = oids
+            if self.filename:
+                self._save()
+        return True
+
+    def _save(self):
+        try:
+            with open(self.filename, 'w') as f:
+                json.dump(self.oids, f, sort_keys=True)
+        except (IOError, OSError) as e:
+            _logger.error('Error writing OID cache %r: %r', self.filename, e)
@@ -0,0 +1,68 @@
+"""Column oriented storage of query results for the table renderer."""
+
+import sys
+from array import array
+
+PY2 = sys.version_info[0] == 2
+
+if PY2:
+    from itertools import izip as zip
+    _int_types = (int, long)
+else:
+    _int_types = (int,)
+
+
+def pack_column(values):
+    """Store a column of values as compactly as possible.
+
+    Columns that hold nothing but ints (or nothing but floats) are stored in
+    an array, which takes 8 bytes per value instead of a python object plus
+    a pointer. Anything else, including columns with NULLs, is left as a
+    tuple.
+    """
+    if not values:
+        return values
+
+    first = type(values[0])
+    if first in _int_types:
+        if all(type(v) in _int_types for v in values):
+            try:
+                return array('l', values)
+            except OverflowError:
+                pass
+    elif first is float:
+        if all(type(v) is float for v in values):
+            return array('d', values)
+
+    return values
+
+
+def column_type(column):
+    """The python type of the values of a packed column, or None if the
+    column is not packed and its values have to be inspected."""
+    if isinstance(column, array):
+        return int if column.typecode == 'l' else float
+    return None
+
+
+class ColumnarData(object):
+    """Tabular data stored column by column.
+
+    Iterating over it yields the rows as tuples, one at a time.
+    """
+
+    __slots__ = ('columns', 'rowcount')
+
+    def __init__(self, columns, rowcount):
+        self.columns = columns
+        self.rowcount = rowcount
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build from a list of row tuples, transposing them once."""
+        return cls([pack_column(c) for c in zip(*rows)], len(rows))
+
+    def __iter__(self):
+        if not self.columns:
+            return iter([()] * self.rowcount)
+        return zip(*self.columns)
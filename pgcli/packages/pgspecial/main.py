@@ -29,9 +29,14 @@ class PGSpecial(object):
         self.timing_enabled = True
 
         self.commands = self.default_commands.copy()
+        self._completion_table = None
 
         self.timing_enabled = False
+        self.timing_verbose = False
         self.expanded_output = False
+        self.unaligned_output = False
+        self.field_separator = u'|'
+        self.record_separator = u'\n'
         self.pager = os.environ.get('PAGER', '')
 
         self.register(self.show_help, '\\?', '\\?', 'Show Help.',
@@ -40,8 +45,17 @@ class PGSpecial(object):
         self.register(self.toggle_expanded_output, '\\x', '\\x',
                       'Toggle expanded output.', arg_type=NO_QUERY)
 
-        self.register(self.toggle_timing, '\\timing', '\\timing',
-                      'Toggle timing of commands.', arg_type=NO_QUERY)
+        self.register(self.toggle_unaligned_output, '\\a', '\\a',
+                      'Toggle between unaligned and aligned output mode.',
+                      arg_type=NO_QUERY)
+
+        self.register(self.set_field_separator, '\\f', '\\f [string]',
+                      'Show or set field separator for unaligned output.',
+                      arg_type=PARSED_QUERY)
+
+        self.register(self.toggle_timing, '\\timing',
+                      '\\timing [on|off|verbose]',
+                      'Toggle timing of commands.', arg_type=PARSED_QUERY)
 
         self.register(self.set_pager, '\\pager', '\\pager [command]',
                       'Set PAGER. Pring the query results via PAGER.',
@@ -49,6 +63,18 @@ class PGSpecial(object):
 
     def register(self, *args, **kwargs):
         register_special_command(*args, command_dict=self.commands, **kwargs)
+        self._completion_table = None
+
+    def completion_table(self):
+        """Returns a (names, descriptions) pair of tuples of the commands,
+        for completion. It's only rebuilt after a command is registered."""
+        table = self._completion_table
+        if table is None:
+            names = tuple(sorted(self.commands))
+            descriptions = tuple(self.commands[name].description
+                                 for name in names)
+            table = self._completion_table = (names, descriptions)
+        return table
 
     def execute(self, cur, sql):
         commands = self.commands
@@ -86,10 +112,36 @@ class PGSpecial(object):
         message += u"on." if self.expanded_output else u"off."
         return [(None, None, None, message)]
 
-    def toggle_timing(self):
-        self.timing_enabled = not self.timing_enabled
+    def toggle_unaligned_output(self):
+        self.unaligned_output = not self.unaligned_output
+        message = u"Output format is "
+        message += u"unaligned." if self.unaligned_output else u"aligned."
+        return [(None, None, None, message)]
+
+    def set_field_separator(self, pattern, **_):
+        if pattern:
+            self.field_separator = unescape_separator(pattern)
+        return [(None, None, None,
+                 u'Field separator is "%s".' % self.field_separator)]
+
+    def toggle_timing(self, pattern='', **_):
+        pattern = pattern.lower()
+        if not pattern:
+            self.timing_enabled = not self.timing_enabled
+            self.timing_verbose = False
+        elif pattern in ('on', 'off', 'verbose'):
+            self.timing_enabled = pattern != 'off'
+            self.timing_verbose = pattern == 'verbose'
+        else:
+            message = '\\timing: unrecognized value "%s". ' \
+                      'Expected on, off or verbose.' % pattern
+            return [(None, None, None, message)]
+
         message = "Timing is "
-        message += "on." if self.timing_enabled else "off."
+        if self.timing_verbose:
+            message += "on, with a breakdown of every statement."
+        else:
+            message += "on." if self.timing_enabled else "off."
         return [(None, None, None, message)]
 
     def set_pager(self, pattern, **_):
@@ -115,6 +167,15 @@ def parse_special_command(sql):
     return (command, verbose, arg.strip())
 
 
+def unescape_separator(sep):
+    """Turns a separator typed by the user (or read from the config file)
+    into the actual string. Surrounding quotes are removed, and \\t and \\n
+    stand for a tab and a newline."""
+    if len(sep) > 1 and sep[0] == sep[-1] and sep[0] in '\'"':
+        sep = sep[1:-1]
+    return sep.replace('\\t', '\t').replace('\\n', '\n')
+
+
 def special_command(command, syntax, description, arg_type=PARSED_QUERY,
         hidden=False, case_sensitive=True, aliases=()):
     """A decorator used internally for static special commands"""
@@ -31,11 +31,30 @@ Examples:
     simple: Deleted
 '''
 
-    def __init__(self, config):
-        self.config = config
+    def __init__(self, config=None):
+        self._config = config
+        self._names = None
+
+    @property
+    def config(self):
+        """The config the queries are stored in. Unless one was set, the
+        default ~/.pgclirc is read the first time it's needed."""
+        if self._config is None:
+            from ...config import load_config
+            self._config = load_config('~/.pgclirc')
+        return self._config
+
+    @config.setter
+    def config(self, config):
+        self._config = config
+        self._names = None
 
     def list(self):
-        return self.config.get(self.section_name, [])
+        """Returns the names of the queries, as a tuple that's only rebuilt
+        when queries are saved or deleted."""
+        if self._names is None:
+            self._names = tuple(self.config.get(self.section_name, ()))
+        return self._names
 
     def get(self, name):
         return self.config.get(self.section_name, {}).get(name, None)
@@ -44,6 +63,7 @@ Examples:
         if self.section_name not in self.config:
             self.config[self.section_name] = {}
         self.config[self.section_name][name] = query
+        self._names = None
         self.config.write()
 
     def delete(self, name):
@@ -51,8 +71,8 @@ Examples:
             del self.config[self.section_name][name]
         except KeyError:
             return '%s: Not Found.' % name
+        self._names = None
         self.config.write()
         return '%s: Deleted' % name
 
-from ...config import load_config
-namedqueries = NamedQueries(load_config('~/.pgclirc'))
+namedqueries = NamedQueries()
@@ -0,0 +1,120 @@
+"""Report of where the time of a query goes, on the server and in pgcli.
+
+Combines the plan of EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) with the
+PhaseTimer of a normal execution of the same statement.
+"""
+
+BUFFERS = ('Shared Hit Blocks', 'Shared Read Blocks', 'Shared Dirtied Blocks',
+           'Shared Written Blocks', 'Temp Read Blocks', 'Temp Written Blocks')
+
+# Number of plan nodes shown, the slowest first.
+HOT_NODES = 5
+
+
+def describe(node):
+    """A short description of a plan node, e.g. "Index Scan using
+    users_pkey on users"."""
+    text = node['Node Type']
+    if 'Index Name' in node:
+        text += ' using %s' % node['Index Name']
+    if 'Relation Name' in node:
+        text += ' on %s' % node['Relation Name']
+        alias = node.get('Alias')
+        if alias and alias != node['Relation Name']:
+            text += ' %s' % alias
+    return text
+
+
+def plan_nodes(plan):
+    """Flatten a plan into a list of (node, time, buffers) tuples.
+
+    The time (in seconds) and the buffers of a node are its own, without the
+    ones of its children. The times of the nodes add up to the execution
+    time, give or take the parallel workers.
+    """
+    nodes = []
+
+    def total_time(node):
+        return (node.get('Actual Total Time', 0) *
+                node.get('Actual Loops', 1) / 1000.0)
+
+    def visit(node):
+        children = node.get('Plans', [])
+        time = total_time(node) - sum(total_time(c) for c in children)
+        buffers = dict((name, node.get(name, 0) -
+                        sum(c.get(name, 0) for c in children))
+                       for name in BUFFERS)
+        nodes.append((node, max(time, 0), buffers))
+        for child in children:
+            visit(child)
+
+    visit(plan['Plan'])
+    return nodes
+
+
+def server_times(plan):
+    """The (planning, execution) times of a plan, in seconds."""
+    execution = plan.get('Execution Time', plan.get('Total Runtime', 0))
+    return plan.get('Planning Time', 0) / 1000.0, execution / 1000.0
+
+
+def hot_nodes(plan, limit=HOT_NODES):
+    """The rows of a table of the plan nodes that took the most time."""
+    execution = server_times(plan)[1]
+    nodes = sorted(plan_nodes(plan), key=lambda n: n[1], reverse=True)
+    return [(describe(node), '%0.03fms' % (time * 1000),
+             '%0.1f%%' % (time / execution * 100) if execution else '',
+             node.get('Actual Rows', 0) * node.get('Actual Loops', 1),
+             node.get('Actual Loops', 1),
+             buffers['Shared Hit Blocks'], buffers['Shared Read Blocks'])
+            for node, time, buffers in nodes[:limit] if time > 0]
+
+
+def profile_report(plan, timer, rows, rendered_bytes):
+    """The results of \\profile, as (title, rows, headers, status) tuples.
+
+    :param plan: the output of EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON).
+    :param timer: PhaseTimer of the normal execution, with an 'execute'
+        phase for the round trip and a 'typecast' one.
+    :param rows: number of rows the normal execution returned.
+    :param rendered_bytes: size of the rendered output.
+    """
+    planning, execution = server_times(plan)
+    server = planning + execution
+    round_trip = timer.get('execute')
+    typecast = timer.get('typecast')
+    render = timer.total() - round_trip - typecast
+    # The EXPLAIN ran on its own, so the server times are an approximation
+    # of the ones of the normal execution, and may be longer than its round
+    # trip.
+    network = max(round_trip - server, 0)
+    client = server + network + typecast + render
+
+    ms = lambda seconds: '%0.03fms' % (seconds * 1000)
+    percent = lambda seconds: ('%0.1f%%' % (seconds / client * 100)
+                               if client else '')
+    times = [
+        ('server: planning', ms(planning), percent(planning)),
+        ('server: execution', ms(execution), percent(execution)),
+        ('network and waiting', ms(network), percent(network)),
+        ('client: typecast', ms(typecast), percent(typecast)),
+        ('client: render', ms(render), percent(render)),
+        ('total', ms(client), percent(client)),
+    ]
+
+    top = plan['Plan']
+    width = top.get('Plan Width', 0)
+    buffers = ', '.join('%s=%d' % (name.lower().replace(' blocks', ''),
+                                   top.get(name, 0))
+                        for name in BUFFERS if top.get(name))
+    status = ('Buffers: %s\n'
+              'Received %d rows, about %d bytes (rows x average row width '
+              '%d), rendered into %d bytes.'
+              % (buffers or 'none', rows, rows * width, width,
+                 rendered_bytes))
+
+    return [
+        ('Plan hot nodes', hot_nodes(plan),
+         ['Node', 'Time', 'Share', 'Rows', 'Loops', 'Hit', 'Read'], None),
+        ('Where the time went', times, ['Phase', 'Time', 'Share'], status),
+    ]
@@ -0,0 +1,105 @@
+import sys
+import logging
+
+from .columnar import ColumnarData
+
+_logger = logging.getLogger(__name__)
+
+# Number of rows looked at to estimate the memory used by a result.
+SAMPLE_SIZE = 1000
+
+
+class CachedResult(ColumnarData):
+    """A query result stored column by column.
+
+    Iterating over it yields the rows again, so it can be rendered like a
+    cursor.
+    """
+
+    __slots__ = ('title', 'headers', 'status', 'size')
+
+    def __init__(self, title, headers, status, columns, rowcount, size):
+        super(CachedResult, self).__init__(columns, rowcount)
+        self.title = title
+        self.headers = headers
+        self.status = status
+        self.size = size
+
+
+def estimate_size(columns, rowcount):
+    """Estimate the memory used by the values of a result, in bytes.
+
+    Only the first SAMPLE_SIZE rows are measured, the rest is extrapolated.
+    """
+    if not rowcount:
+        return 0
+    sample = min(rowcount, SAMPLE_SIZE)
+    size = 0
+    for column in columns:
+        size += sys.getsizeof(column)
+        size += sum(sys.getsizeof(v) for v in column[:sample]) * rowcount // sample
+    return size
+
+
+class ResultCache(object):
+    """Keeps the most recent query results in memory so they can be rendered
+    again without going back to the server.
+
+    Results are evicted least recently used first, when there are more than
+    `max_results` of them or when they use more than `max_bytes` together.
+    """
+
+    def __init__(self, max_results=5, max_bytes=64 * 1024 * 1024):
+        self.max_results = max_results
+        self.max_bytes = max_bytes
+        # Least recently used first.
+        self.results = []
+
+    @property
+    def size(self):
+        return sum(r.size for r in self.results)
+
+    def add(self, title, rows, headers, status):
+        """Store the rows of a result.
+
+        :param rows: list of row tuples, or a ColumnarData whose columns are
+            shared instead of copied.
+        :return: the CachedResult, or None if the result is not cached.
+        """
+        if self.max_results <= 0:
+            return None
+
+        if not isinstance(rows, ColumnarData):
+            rows = ColumnarData.from_rows(rows)
+        columns, rowcount = rows.columns, rows.rowcount
+        result = CachedResult(title, headers, status, columns, rowcount,
+                              estimate_size(columns, rowcount))
+        if result.size > self.max_bytes:
+            _logger.debug('Result of %d bytes is too large to cache.',
+                          result.size)
+            return None
+
+        self.results.append(result)
+        self._evict()
+        return result
+
+    def touch(self, result):
+        """Mark a result as the most recently used one."""
+        if result in self.results:
+            self.results.remove(result)
+            self.results.append(result)
+
+    def get(self, n=1):
+        """Return the n-th most recently used result, or None."""
+        if 0 < n <= len(self.results):
+            return self.results[-n]
+        return None
+
+    def clear(self):
+        self.results = []
+
+    def _evict(self):
+        while (len(self.results) > self.max_results or
+               (self.results and self.size > self.max_bytes)):
+            evicted = self.results.pop(0)
+            _logger.debug('Evicted cached result: %r', evicted.status)
@@ -0,0 +1,138 @@
+"""Latency statistics of the statements run in a session."""
+
+import re
+import math
+
+# The command tag of a status, e.g. "INSERT" in "INSERT 0 1" or "CREATE
+# TABLE".
+_command_tag = re.compile(r'([A-Z]+(?: [A-Z]+)*)(?: \d+)*$')
+
+# Phases of a statement's PhaseTimer that aren't formatting: the execution,
+# and writing the output to the terminal or the pager.
+NOT_FORMATTING = ('execute', 'output')
+
+
+def formatting_time(timer):
+    """The time a statement's PhaseTimer spent formatting its output."""
+    return sum(duration for name, duration in timer.items()
+               if name not in NOT_FORMATTING)
+
+
+def statement_type(status):
+    """The type of a statement from its status, e.g. "SELECT", or "other"
+    for the special commands."""
+    match = _command_tag.match(status or '')
+    return match.group(1) if match else 'other'
+
+
+class LogHistogram(object):
+    """Counts of values in buckets whose bounds grow geometrically.
+
+    It uses the same memory whatever the number of values, and the
+    percentiles are within a relative error of about (base - 1) / 2. Values
+    below `low` and above `high` share the first and last buckets.
+    """
+
+    def __init__(self, base=1.05, low=1e-6, high=86400):
+        self.base = base
+        self.low = low
+        self.log_base = math.log(base)
+        self.counts = [0] * (self.bucket(high) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def bucket(self, value):
+        if value <= self.low:
+            return 0
+        return int(math.log(value / self.low) / self.log_base) + 1
+
+    def add(self, value):
+        self.counts[min(self.bucket(value), len(self.counts) - 1)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, percent):
+        """The value below which `percent` % of the values are, or None if
+        there are none."""
+        if not self.count:
+            return None
+        rank = max(int(math.ceil(percent / 100.0 * self.count)), 1)
+        if rank >= self.count:
+            return self.max
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                break
+        # The geometric middle of the bucket.
+        value = self.low * self.base ** (i - 0.5) if i else self.low
+        return min(max(value, self.min), self.max)
+
+
+class SessionStats(object):
+    """Latency histograms by statement type, and the formatting time, rows
+    and output bytes of a session."""
+
+    PERCENTILES = (50, 90, 99)
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.latency = {}
+        self.formatting = LogHistogram()
+        self.output = LogHistogram()
+        self.failed = 0
+        self.rows = 0
+        self.bytes = 0
+
+    def add(self, status, timer):
+        """Record a statement that ran, with the PhaseTimer of its execution
+        and formatting."""
+        kind = statement_type(status)
+        if kind not in self.latency:
+            self.latency[kind] = LogHistogram()
+        self.latency[kind].add(timer.get('execute'))
+        self.formatting.add(formatting_time(timer))
+        count = status.rsplit(None, 1)[-1] if status else ''
+        if count.isdigit():
+            self.rows += int(count)
+
+    def add_output(self, duration):
+        """Record the time spent writing the output of an input."""
+        self.output.add(duration)
+
+    def add_failure(self):
+        self.failed += 1
+
+    def add_bytes(self, nbytes):
+        self.bytes += nbytes
+
+    def statements(self):
+        return sum(h.count for h in self.latency.values())
+
+    def report(self):
+        """The statistics as a (rows, headers, status) table."""
+        ms = lambda seconds: ('%0.03fms' % (seconds * 1000)
+                              if seconds is not None else None)
+
+        def row(name, histogram):
+            return ((name, histogram.count) +
+                    tuple(ms(histogram.percentile(p))
+                          for p in self.PERCENTILES) +
+                    (ms(histogram.max), ms(histogram.total)))
+
+        rows = [row(kind, histogram)
+                for kind, histogram in sorted(self.latency.items())]
+        if self.formatting.count:
+            rows.append(row('(formatting)', self.formatting))
+            rows.append(row('(output)', self.output))
+        headers = (['Statement', 'Count'] +
+                   ['p%d' % p for p in self.PERCENTILES] + ['Max', 'Total'])
+        status = ('%d statements, %d failed. %d rows, %d bytes of output.'
+                  % (self.statements(), self.failed, self.rows, self.bytes))
+        return rows, headers, status
@@ -8,11 +8,14 @@ from collections import namedtuple
 from decimal import Decimal
 from platform import python_version_tuple
 from wcwidth import wcswidth
+from array import array
+from .timing import null_timer, perf_counter
+from .columnar import ColumnarData, column_type
 import re
 
 
 if python_version_tuple()[0] < "3":
-    from itertools import izip_longest
+    from itertools import izip_longest, izip
     from functools import partial
     _none_type = type(None)
     _int_type = int
@@ -26,6 +29,7 @@ if python_version_tuple()[0] < "3":
 
 else:
     from itertools import zip_longest as izip_longest
+    izip = zip
     from functools import reduce, partial
     _none_type = type(None)
     _int_type = int
@@ -39,7 +43,8 @@ else:
         return isinstance(f, io.IOBase)
 
 
-__all__ = ["tabulate", "tabulate_formats", "simple_separated_format"]
+__all__ = ["tabulate", "tabulate_lines", "tabulate_formats",
+           "simple_separated_format"]
 __version__ = "0.7.4"
 
 
@@ -651,7 +656,7 @@ def _normalize_tabular_data(tabular_data, headers):
 
 def tabulate(tabular_data, headers=[], tablefmt="simple",
              floatfmt="g", numalign="decimal", stralign="left",
-             missingval=""):
+             missingval="", timer=None):
     """Format a fixed width table for pretty printing.
 
     >>> print(tabulate([[1, 2.34], [-56, "8.999"], ["2", "10001"]]))
@@ -719,6 +724,9 @@ def tabulate(tabular_data, headers=[], tablefmt="simple",
     other   ?  2.7
     -----  --  ----
 
+    If a `timer` (a `PhaseTimer`) is given, the time spent in each phase
+    of building the table is recorded in it.
+
     Various plain-text table formats (`tablefmt`) are supported:
     'plain', 'simple', 'grid', 'pipe', 'orgtbl', 'rst', 'mediawiki',
      'latex', and 'latex_booktabs'. Variable `tabulate_formats` contains the list of
@@ -879,49 +887,109 @@ def tabulate(tabular_data, headers=[], tablefmt="simple",
      eggs & 451      \\\\
     \\bottomrule
     \end{tabular}
+    """
+    return "\n".join(tabulate_lines(tabular_data, headers, tablefmt, floatfmt,
+                                    numalign, stralign, missingval, timer))
+
+
+def tabulate_lines(tabular_data, headers=[], tablefmt="simple",
+                   floatfmt="g", numalign="decimal", stralign="left",
+                   missingval="", timer=None):
+    """Same as `tabulate`, but yields the lines of the table one at a time.
+
+    Column widths need all the values, so the columns are formatted and
+    aligned before the first line is produced. The rows are only padded and
+    joined as the lines are consumed.
+
+    `tabular_data` can also be a `ColumnarData`, which is used as is instead
+    of transposing rows into columns. Its packed numeric columns don't need
+    a type inference pass.
+
+    >>> list(tabulate_lines([["spam", 1]], tablefmt="plain"))
+    ['spam  1']
+
     """
     if tabular_data is None:
         tabular_data = []
-    list_of_lists, headers = _normalize_tabular_data(tabular_data, headers)
+    if timer is None:
+        timer = null_timer
+
+    with timer.phase("normalize"):
+        if isinstance(tabular_data, ColumnarData):
+            cols = tabular_data.columns
+            headers = list(map(_text_type, headers))
+            if headers and len(headers) < len(cols):
+                headers = [""]*(len(cols) - len(headers)) + headers
+        else:
+            list_of_lists, headers = _normalize_tabular_data(tabular_data, headers)
+            cols = None
+
+    if cols is None:
+        with timer.phase("transpose"):
+            cols = list(zip(*list_of_lists))
+            del list_of_lists
+
+    # format rows and columns, convert numeric values to strings
+    with timer.phase("types"):
+        coltypes = [column_type(c) or _column_type(c) for c in cols]
+    with timer.phase("format"):
+        cols = [_format_column(c, ct, floatfmt, missingval)
+                for c, ct in zip(cols, coltypes)]
 
     # optimization: look for ANSI control codes once,
     # enable smart width functions only if a control code is found
-    plain_text = '\n'.join(['\t'.join(map(_text_type, headers))] + \
-                            ['\t'.join(map(_text_type, row)) for row in list_of_lists])
-    has_invisible = re.search(_invisible_codes, plain_text)
-    if has_invisible:
-        width_fn = _visible_width
-    else:
-        width_fn = wcswidth
+    with timer.phase("align"):
+        has_invisible = (any(re.search(_invisible_codes, h) for h in headers) or
+                         any(re.search(_invisible_codes, "\t".join(c)) for c in cols))
+        if has_invisible:
+            width_fn = _visible_width
+        else:
+            width_fn = wcswidth
+
+        # align columns
+        aligns = [numalign if ct in [int,float] else stralign for ct in coltypes]
+        minwidths = [width_fn(h) + MIN_PADDING for h in headers] if headers else [0]*len(cols)
+        cols = [_align_column(c, a, minw, has_invisible)
+                for c, a, minw in zip(cols, aligns, minwidths)]
+
+        if headers:
+            # align headers and add headers
+            t_cols = cols or [['']] * len(headers)
+            t_aligns = aligns or [stralign] * len(headers)
+            minwidths = [max(minw, width_fn(c[0])) for minw, c in zip(minwidths, t_cols)]
+            headers = [_align_header(h, a, minw)
+                       for h, a, minw in zip(headers, t_aligns, minwidths)]
+        else:
+            minwidths = [width_fn(c[0]) for c in cols]
 
-    # format rows and columns, convert numeric values to strings
-    cols = list(zip(*list_of_lists))
-    coltypes = list(map(_column_type, cols))
-    cols = [[_format(v, ct, floatfmt, missingval) for v in c]
-             for c,ct in zip(cols, coltypes)]
-
-    # align columns
-    aligns = [numalign if ct in [int,float] else stralign for ct in coltypes]
-    minwidths = [width_fn(h) + MIN_PADDING for h in headers] if headers else [0]*len(cols)
-    cols = [_align_column(c, a, minw, has_invisible)
-            for c, a, minw in zip(cols, aligns, minwidths)]
-
-    if headers:
-        # align headers and add headers
-        t_cols = cols or [['']] * len(headers)
-        t_aligns = aligns or [stralign] * len(headers)
-        minwidths = [max(minw, width_fn(c[0])) for minw, c in zip(minwidths, t_cols)]
-        headers = [_align_header(h, a, minw)
-                   for h, a, minw in zip(headers, t_aligns, minwidths)]
-        rows = list(zip(*cols))
-    else:
-        minwidths = [width_fn(c[0]) for c in cols]
-        rows = list(zip(*cols))
+    # The rows are put back together lazily, while the lines are produced.
+    rows = izip(*cols) if cols else iter([])
 
     if not isinstance(tablefmt, TableFormat):
         tablefmt = _table_formats.get(tablefmt, _table_formats["simple"])
 
-    return _format_table(tablefmt, headers, rows, minwidths, aligns)
+    lines = _iter_table_lines(tablefmt, headers, rows, minwidths, aligns)
+    if not timer.per_line:
+        for line in lines:
+            yield line
+    else:
+        while True:
+            start = perf_counter()
+            line = next(lines, None)
+            timer.add("build", perf_counter() - start)
+            if line is None:
+                break
+            yield line
+
+
+def _format_column(column, coltype, floatfmt, missingval):
+    "Convert the values of a column to strings."
+    if isinstance(column, array):
+        # Packed numeric columns have no NULLs.
+        if coltype is float:
+            return [format(v, floatfmt) for v in column]
+        return list(map(_text_type, column))
+    return [_format(v, coltype, floatfmt, missingval) for v in column]
 
 
 def _build_simple_row(padded_cells, rowfmt):
@@ -963,38 +1031,42 @@ def _pad_row(cells, padding):
 
 def _format_table(fmt, headers, rows, colwidths, colaligns):
     """Produce a plain-text representation of the table."""
-    lines = []
+    return "\n".join(_iter_table_lines(fmt, headers, rows, colwidths, colaligns))
+
+
+def _iter_table_lines(fmt, headers, rows, colwidths, colaligns):
+    """Yield the lines of the plain-text representation of the table.
+
+    The rows are padded one at a time, so `rows` can be an iterator.
+    """
     hidden = fmt.with_header_hide if (headers and fmt.with_header_hide) else []
     pad = fmt.padding
     headerrow = fmt.headerrow
 
     padded_widths = [(w + 2*pad) for w in colwidths]
     padded_headers = _pad_row(headers, pad)
-    padded_rows = [_pad_row(row, pad) for row in rows]
 
     if fmt.lineabove and "lineabove" not in hidden:
-        lines.append(_build_line(padded_widths, colaligns, fmt.lineabove))
+        yield _build_line(padded_widths, colaligns, fmt.lineabove)
 
     if padded_headers:
-        lines.append(_build_row(padded_headers, padded_widths, colaligns, headerrow))
+        yield _build_row(padded_headers, padded_widths, colaligns, headerrow)
         if fmt.linebelowheader and "linebelowheader" not in hidden:
-            lines.append(_build_line(padded_widths, colaligns, fmt.linebelowheader))
-
-    if padded_rows and fmt.linebetweenrows and "linebetweenrows" not in hidden:
-        # initial rows with a line below
-        for row in padded_rows[:-1]:
-            lines.append(_build_row(row, padded_widths, colaligns, fmt.datarow))
-            lines.append(_build_line(padded_widths, colaligns, fmt.linebetweenrows))
-        # the last row without a line below
-        lines.append(_build_row(padded_rows[-1], padded_widths, colaligns, fmt.datarow))
+            yield _build_line(padded_widths, colaligns, fmt.linebelowheader)
+
+    if fmt.linebetweenrows and "linebetweenrows" not in hidden:
+        # every row but the last one with a line below
+        between = _build_line(padded_widths, colaligns, fmt.linebetweenrows)
+        for i, row in enumerate(rows):
+            if i:
+                yield between
+            yield _build_row(_pad_row(row, pad), padded_widths, colaligns, fmt.datarow)
     else:
-        for row in padded_rows:
-            lines.append(_build_row(row, padded_widths, colaligns, fmt.datarow))
+        for row in rows:
+            yield _build_row(_pad_row(row, pad), padded_widths, colaligns, fmt.datarow)
 
     if fmt.linebelow and "linebelow" not in hidden:
-        lines.append(_build_line(padded_widths, colaligns, fmt.linebelow))
-
-    return "\n".join(lines)
+        yield _build_line(padded_widths, colaligns, fmt.linebelow)
 
 
 def _main():
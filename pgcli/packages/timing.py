@@ -0,0 +1,76 @@
+"""Fine grained timing of the phases of running and rendering a query."""
+
+from contextlib import contextmanager
+
+try:
+    from time import perf_counter
+except ImportError:
+    # python 2
+    from time import time as perf_counter
+
+
+class PhaseTimer(object):
+    """Accumulates the time spent in named phases.
+
+    Phases are reported in the order they were first seen. Timing the same
+    phase more than once adds up the durations.
+
+    :param per_line: whether the phases that happen for each line of the
+        output, like building the table lines, are timed too.
+    """
+
+    def __init__(self, per_line=True):
+        self.per_line = per_line
+        self.names = []
+        self.durations = {}
+
+    def add(self, name, duration):
+        if name not in self.durations:
+            self.names.append(name)
+            self.durations[name] = 0
+        self.durations[name] += duration
+
+    @contextmanager
+    def phase(self, name):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, perf_counter() - start)
+
+    def get(self, name):
+        return self.durations.get(name, 0)
+
+    def items(self):
+        return [(name, self.durations[name]) for name in self.names]
+
+    def total(self):
+        return sum(self.durations.values())
+
+    def __str__(self):
+        return ', '.join('%s %0.03fms' % (name, duration * 1000)
+                         for name, duration in self.items())
+
+
+class _NullPhase(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class NullTimer(object):
+    """A PhaseTimer lookalike that measures nothing."""
+
+    _null_phase = _NullPhase()
+    per_line = False
+
+    def add(self, name, duration):
+        pass
+
+    def phase(self, name):
+        return self._null_phase
+
+
+null_timer = NullTimer()
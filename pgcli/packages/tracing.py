@@ -0,0 +1,133 @@
+"""Structured tracing of where pgcli spends its time.
+
+Spans are named durations with a few attributes. They're written as JSON
+lines to a rotating file, e.g.:
+
+    {"ts": 1445000000.123, "span": "execute", "ms": 12.5, "trace": 3, ...}
+
+Spans with the same "trace" belong to the same input. Summarize a trace
+file with `python -m pgcli.tracesummary`.
+"""
+
+import json
+import time
+import logging
+import threading
+import itertools
+from logging.handlers import RotatingFileHandler
+
+from .timing import perf_counter
+
+# The spans the phases of a statement's PhaseTimer are reported as. The
+# other phases are all formatting.
+PHASE_SPANS = {'execute': 'execute', 'typecast': 'fetch', 'output': 'page'}
+
+
+class _NullSpan(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+class Span(object):
+    """Times a block, and writes it to the trace when the block exits."""
+
+    __slots__ = ('tracer', 'name', 'attrs', 'start')
+
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.attrs['error'] = exc_type.__name__
+        self.tracer.emit(self.name, perf_counter() - self.start, **self.attrs)
+        return False
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+
+class Tracer(object):
+    """Writes spans to a trace file.
+
+    Tracing is off until start() is called. `enabled` is a plain attribute,
+    the one check made when it's off: span() returns a span that does
+    nothing, and callers that would do more work than that test it first.
+    """
+
+    _null_span = _NullSpan()
+
+    def __init__(self):
+        self.enabled = False
+        self.handler = None
+        self.logger = logging.getLogger('pgcli.trace')
+        # Not in the log file.
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        self.trace_ids = itertools.count(1)
+        self.local = threading.local()
+
+    def start(self, filename, max_bytes=10 * 1024 * 1024, backup_count=3):
+        self.stop()
+        self.handler = RotatingFileHandler(filename, maxBytes=max_bytes,
+                                           backupCount=backup_count)
+        self.handler.setFormatter(logging.Formatter('%(message)s'))
+        self.logger.addHandler(self.handler)
+        self.enabled = True
+
+    def stop(self):
+        self.enabled = False
+        if self.handler is not None:
+            self.logger.removeHandler(self.handler)
+            self.handler.close()
+            self.handler = None
+
+    def new_trace(self):
+        """Start a new trace in this thread. The spans emitted after that
+        belong to it."""
+        self.local.trace = next(self.trace_ids)
+        return self.local.trace
+
+    def span(self, name, **attrs):
+        if not self.enabled:
+            return self._null_span
+        return Span(self, name, attrs)
+
+    def emit(self, name, duration, **attrs):
+        """Write a span that took `duration` seconds."""
+        if not self.enabled:
+            return
+        record = {
+            'ts': round(time.time(), 6),
+            'span': name,
+            'ms': round(duration * 1000, 3),
+            'thread': threading.current_thread().name,
+            'trace': getattr(self.local, 'trace', None),
+        }
+        record.update((key, value) for key, value in attrs.items()
+                      if value is not None)
+        self.logger.info(json.dumps(record, default=str))
+
+    def emit_timer(self, timer, **attrs):
+        """Write the phases of a statement's PhaseTimer as spans."""
+        durations = {}
+        for phase, duration in timer.items():
+            name = PHASE_SPANS.get(phase, 'format')
+            durations[name] = durations.get(name, 0) + duration
+        for name in ('execute', 'fetch', 'format', 'page'):
+            if name in durations:
+                self.emit(name, durations[name], **attrs)
+
+
+tracer = Tracer()
@@ -0,0 +1,16 @@
+from .tabulate import _text_type
+
+def unaligned_table(rows, headers, field_separator=u"|",
+                    record_separator=u"\n"):
+    """Yields the headers and then each row as a single record.
+
+    Fields are separated by `field_separator` and every record is terminated
+    by `record_separator`. Nothing is padded, so no pass over the column
+    widths is needed and the rows are rendered as they are read.
+    """
+    text = _text_type
+
+    yield field_separator.join(headers) + record_separator
+    for row in rows:
+        yield field_separator.join([u"" if v is None else text(v)
+                                    for v in row]) + record_separator
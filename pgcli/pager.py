@@ -0,0 +1,124 @@
+from __future__ import unicode_literals
+
+import errno
+import itertools
+import logging
+import os
+import subprocess
+import sys
+import click
+try:
+    from shutil import get_terminal_size
+except ImportError:
+    # python 2. click.get_terminal_size() is gone as of click 8.1, which
+    # needs python 3.
+    from click import get_terminal_size
+
+_logger = logging.getLogger(__name__)
+
+WIN = sys.platform.startswith('win')
+
+
+def pager_command():
+    """Returns the command used for paging, honouring $PAGER."""
+    return os.environ.get('PAGER', '').strip() or 'less'
+
+
+def take_screenful(chunks, width, height):
+    """Read chunks of output until they no longer fit on a single screen.
+
+    :param chunks: iterator of text fragments.
+    :param width: terminal width in columns.
+    :param height: terminal height in lines.
+    :return: (buffered_chunks, fits) tuple. `fits` is True when the
+             iterator was exhausted before filling the screen.
+    """
+    buffered = []
+    lines = 0
+    # Leave one line for the prompt that follows the output.
+    max_lines = max(height - 1, 1)
+    for chunk in chunks:
+        buffered.append(chunk)
+        lines += chunk.count('\n')
+        if lines >= max_lines:
+            return buffered, False
+        if any(len(line) > width for line in chunk.split('\n')):
+            return buffered, False
+    return buffered, True
+
+
+def pipe_to_pager(chunks, cmd, encoding='utf-8'):
+    """Feed the chunks to `cmd` through a pipe, one chunk at a time.
+
+    The pipe provides the backpressure: a pager that is waiting for the user
+    stops reading, which blocks the writes and thereby stops the production
+    of more chunks.
+
+    :return: True if all chunks were written, False if the pager exited
+             before reading all of them.
+    """
+    _logger.debug('Paging output through %r.', cmd)
+    proc = subprocess.Popen(cmd, shell=True, stdin=subprocess.PIPE)
+    completed = False
+    try:
+        for chunk in chunks:
+            proc.stdin.write(chunk.encode(encoding, 'replace'))
+        completed = True
+    except (IOError, OSError) as e:
+        # The pager went away (e.g. the user pressed 'q').
+        if e.errno != errno.EPIPE:
+            raise
+    finally:
+        try:
+            proc.stdin.close()
+        except (IOError, OSError) as e:
+            if e.errno != errno.EPIPE:
+                raise
+            completed = False
+        # Ctrl-C reaches the pager too. Wait for it to give the terminal back.
+        while True:
+            try:
+                proc.wait()
+                break
+            except KeyboardInterrupt:
+                pass
+    return completed
+
+
+def write_output(chunks):
+    """Write the output to stdout, through the pager if it does not fit on
+    the screen.
+
+    The chunks are produced lazily, so rendering stops as soon as the pager
+    exits. Output that fits on the screen skips the pager entirely.
+
+    :param chunks: iterable of text fragments, each ending in a newline.
+    :return: True if all chunks were written, False if the pager exited
+             before reading all of them.
+    """
+    chunks = iter(chunks)
+
+    if not (sys.stdin.isatty() and sys.stdout.isatty()):
+        # Bulk output into a pipe or file. Write straight through.
+        stdout = click.get_text_stream('stdout')
+        for chunk in chunks:
+            stdout.write(chunk)
+        stdout.flush()
+        return True
+
+    if WIN:
+        # No pipes to the pager on Windows. Let click deal with it.
+        output = ''.join(chunks)
+        if output:
+            click.echo_via_pager(output[:-1])
+        return True
+
+    width, height = get_terminal_size()
+    buffered, fits = take_screenful(chunks, width, height)
+    if fits:
+        click.echo(''.join(buffered), nl=False)
+        return True
+
+    encoding = getattr(sys.stdout, 'encoding', None) or 'utf-8'
+    return pipe_to_pager(itertools.chain(buffered, chunks), pager_command(),
+                         encoding)
@@ -1,6 +1,10 @@
 from prompt_toolkit.buffer import Buffer
+from prompt_toolkit.document import Document
+from prompt_toolkit.enums import IncrementalSearchDirection
 from prompt_toolkit.filters import Condition
 
+from .mmaphistory import WorkingLines
+
 class PGBuffer(Buffer):
     def __init__(self, always_multiline, *args, **kwargs):
         self.always_multiline = always_multiline
@@ -13,6 +17,37 @@ class PGBuffer(Buffer):
         super(self.__class__, self).__init__(*args, is_multiline=is_multiline,
                                              tempfile_suffix='.sql', **kwargs)
 
+    def _search(self, search_state, include_current_position=False, count=1):
+        """Reverse search through the history file without decoding every
+        entry, when the history is an MmapHistory."""
+        lines = self._working_lines
+        if (not isinstance(lines, WorkingLines) or
+                search_state.direction != IncrementalSearchDirection.BACKWARD):
+            return super(PGBuffer, self)._search(
+                search_state, include_current_position, count)
+
+        text = search_state.text
+        ignore_case = search_state.ignore_case()
+        working_index = self.working_index
+        document = self.document
+        for _ in range(count):
+            new_index = document.find_backwards(text, ignore_case=ignore_case)
+            if new_index is not None:
+                document = Document(document.text,
+                                    document.cursor_position + new_index)
+                continue
+            # Go back in the history, and wrap around to the last line.
+            i = lines.find_backwards(text, working_index, ignore_case)
+            if i is None:
+                i = len(lines) - 1
+            line = Document(lines[i], len(lines[i]))
+            new_index = line.find_backwards(text, ignore_case=ignore_case)
+            if new_index is None:
+                return None
+            working_index = i
+            document = Document(line.text, len(line.text) + new_index)
+        return (working_index, document.cursor_position)
+
 def _multiline_exception(text):
     text = text.strip()
     return (text.startswith('\\') or   # Special Command
@@ -1,11 +1,16 @@
 from __future__ import print_function, unicode_literals
 import logging
 import re
+import time
 import itertools
 from prompt_toolkit.completion import Completer, Completion
 from .packages.sqlcompletion import suggest_type
 from .packages.parseutils import last_word
 from .packages.pgspecial.namedqueries import namedqueries
+from .catalog import Catalog
+from .usage import UsageStats, identifiers
+from .packages.timing import perf_counter
+from .packages.tracing import tracer
 
 try:
     from collections import Counter
@@ -15,6 +20,15 @@ except ImportError:
 
 _logger = logging.getLogger(__name__)
 
+# Number of candidates matched between two checks of the cancellation and of
+# the latency budget.
+CHECK_INTERVAL = 1024
+
+
+class CompletionCancelled(Exception):
+    """Raised when the completions being computed are no longer needed."""
+
+
 class PGCompleter(Completer):
     keywords = ['ACCESS', 'ADD', 'ALL', 'ALTER TABLE', 'AND', 'ANY', 'AS',
             'ASC', 'AUDIT', 'BETWEEN', 'BY', 'CASE', 'CHAR', 'CHECK',
@@ -55,13 +69,39 @@ class PGCompleter(Completer):
         self.name_pattern = re.compile("^[_a-z][_a-z0-9\$]*$")
 
         self.databases = []
-        self.dbmetadata = {'tables': {}, 'views': {}, 'functions': {},
-                           'datatypes': {}}
+        self.catalog = Catalog(self._escape_name)
         self.search_path = []
+        # When set, the columns are not loaded with extend_columns() but on
+        # demand, by a ColumnLoader.
+        self.column_loader = None
+        # Ranks the tables and columns that are used the most first.
+        self.usage = UsageStats()
+
+        # Incremented by cancel(), to abort the completions being computed.
+        self.generation = 0
+        # Seconds to wait for the next keystroke before computing the
+        # completions while typing.
+        self.debounce = 0
+        # Set by the Tab and C-Space bindings: the next completion was asked
+        # for and doesn't wait. prompt_toolkit sends the same CompleteEvent
+        # for those as for typing.
+        self.requested = False
+        # Seconds after which only the cheaper prefix matching is used.
+        self.latency_budget = None
+        # (generation, deadline) of the completions being computed.
+        self._computation = None
 
         self.all_completions = set(self.keywords + self.functions)
 
     def escape_name(self, name):
+        """Quote a name if it needs quoting. The names of the catalog are
+        looked up, instead of being escaped again."""
+        try:
+            return self.catalog.escaped[name]
+        except KeyError:
+            return self._escape_name(name)
+
+    def _escape_name(self, name):
         if name and ((not self.name_pattern.match(name))
                 or (name.upper() in self.reserved_words)
                 or (name.upper() in self.functions)):
@@ -90,78 +130,82 @@ class PGCompleter(Completer):
     def extend_schemata(self, schemata):
 
         # schemata is a list of schema names
-        schemata = self.escaped_names(schemata)
-        metadata = self.dbmetadata['tables']
         for schema in schemata:
-            metadata[schema] = {}
-
-        # dbmetadata.values() are the 'tables' and 'functions' dicts
-        for metadata in self.dbmetadata.values():
-            for schema in schemata:
-                metadata[schema] = {}
-
-        self.all_completions.update(schemata)
+            self.all_completions.add(self.catalog.add_schema(schema))
 
     def extend_relations(self, data, kind):
         """ extend metadata for tables or views
 
-        :param data: list of (schema_name, rel_name) tuples
+        :param data: iterable of (schema_name, rel_name) tuples
         :param kind: either 'tables' or 'views'
         :return:
         """
 
-        data = [self.escaped_names(d) for d in data]
-
-        # dbmetadata['tables']['schema_name']['table_name'] should be a list of
-        # column names. Default to an asterisk
-        metadata = self.dbmetadata[kind]
-        for schema, relname in data:
-            try:
-                metadata[schema][relname] = ['*']
-            except AttributeError:
-                _logger.error('%r %r listed in unrecognized schema %r',
-                              kind, relname, schema)
-            self.all_completions.add(relname)
+        self._extend_objects(data, kind)
 
     def extend_columns(self, column_data, kind):
         """ extend column metadata
 
-        :param column_data: list of (schema_name, rel_name, column_name) tuples
+        :param column_data: iterable of (schema_name, rel_name, column_name)
+            tuples
         :param kind: either 'tables' or 'views'
         :return:
         """
 
-        column_data = [self.escaped_names(d) for d in column_data]
-        metadata = self.dbmetadata[kind]
+        # The rows are consumed as they're read, and the catalog only
+        # escapes the names it hasn't seen yet.
+        add_column = self.catalog.add_column
+        add_completion = self.all_completions.add
         for schema, relname, column in column_data:
-            metadata[schema][relname].append(column)
-            self.all_completions.add(column)
+            add_completion(add_column(kind, schema, relname, column))
 
     def extend_functions(self, func_data):
 
         # func_data is an iterator of (schema_name, function_name)
-
-        # dbmetadata['functions']['schema_name']['function_name'] should return
-        # function metadata -- right now we're not storing any further metadata
-        # so just default to None as a placeholder
-        metadata = self.dbmetadata['functions']
-
-        for f in func_data:
-            schema, func = self.escaped_names(f)
-            metadata[schema][func] = None
-            self.all_completions.add(func)
+        self._extend_objects(func_data, 'functions')
 
     def extend_datatypes(self, type_data):
 
-        # dbmetadata['datatypes'][schema_name][type_name] should store type
-        # metadata, such as composite type field names. Currently, we're not
-        # storing any metadata beyond typename, so just store None
-        meta = self.dbmetadata['datatypes']
+        # type_data is an iterator of (schema_name, type_name)
+        self._extend_objects(type_data, 'datatypes')
+
+    def _extend_objects(self, data, kind):
+        catalog = self.catalog
+        for schema, name in data:
+            catalog.add_object(kind, schema, name)
+            self.all_completions.add(catalog.escape(name))
+
+    def empty_copy(self):
+        """Return a completer with the same settings and usage counters, but
+        none of the database metadata."""
+        completer = self.__class__(self.smart_completion, self.pgspecial)
+        completer.usage = self.usage
+        completer.debounce = self.debounce
+        completer.latency_budget = self.latency_budget
+        return completer
+
+    def record_usage(self, sql):
+        """Count a use of the tables and columns of the catalog that appear
+        in an executed statement."""
+        escaped = self.catalog.escaped
+        self.usage.record(escaped[name] for name in identifiers(sql)
+                          if name in escaped)
+
+    def seed_usage(self, scan_data):
+        """Seed the usage counters of the tables.
+
+        :param scan_data: iterable of (schema_name, table_name, scans) tuples
+        """
+        counts = {}
+        for schema, relname, scans in scan_data:
+            name = self.catalog.escape(relname)
+            counts[name] = counts.get(name, 0) + scans
+        self.usage.seed(counts)
 
-        for t in type_data:
-            schema, type_name = self.escaped_names(t)
-            meta[schema][type_name] = None
-            self.all_completions.add(type_name)
+    def set_column_loader(self, column_loader):
+        if self.column_loader:
+            self.column_loader.close()
+        self.column_loader = column_loader
 
     def set_search_path(self, search_path):
         self.search_path = self.escaped_names(search_path)
@@ -170,10 +214,24 @@ class PGCompleter(Completer):
         self.databases = []
         self.special_commands = []
         self.search_path = []
-        self.dbmetadata = {'tables': {}, 'views': {}, 'functions': {},
-                           'datatypes': {}}
+        self.catalog = Catalog(self._escape_name)
         self.all_completions = set(self.keywords + self.functions)
 
+    def cancel(self):
+        """Abort the completions being computed, e.g. because the text they
+        were computed for changed."""
+        self.generation += 1
+
+    def _check_computation(self):
+        """Raise CompletionCancelled if the computation was cancelled, and
+        return whether its latency budget is exceeded."""
+        if not self._computation:
+            return False
+        generation, deadline = self._computation
+        if generation != self.generation:
+            raise CompletionCancelled()
+        return deadline is not None and perf_counter() > deadline
+
     def find_matches(self, text, collection, start_only=False, fuzzy=True,
                      meta=None, meta_collection=None):
         """Find completion matches for the given text.
@@ -189,8 +247,16 @@ class PGCompleter(Completer):
         yields prompt_toolkit Completion instances for any matches found
         in the collection of available completions.
 
+        When the latency budget of the completions being computed is
+        exceeded, fuzzy matching falls back to prefix matching.
+
         """
 
+        if fuzzy and self._check_computation():
+            return self._find_prefix_matches(text, collection, meta,
+                                             meta_collection)
+
+        original_text = text
         text = last_word(text, include='most_punctuations').lower()
 
         # Construct a `_match` function for either fuzzy or non-fuzzy matching
@@ -215,26 +281,70 @@ class PGCompleter(Completer):
         if meta_collection:
             # Each possible completion in the collection has a corresponding
             # meta-display string
-            collection = zip(collection, meta_collection)
+            candidates = zip(collection, meta_collection)
         else:
             # All completions have an identical meta
-            collection = zip(collection, itertools.repeat(meta))
+            candidates = zip(collection, itertools.repeat(meta))
+
+        # Equally good matches are ranked by how much they've been used.
+        score = self.usage.score
 
         completions = []
-        for item, meta in collection:
+        for i, (item, item_meta) in enumerate(candidates):
+            if i and not i % CHECK_INTERVAL and self._check_computation() \
+                    and fuzzy:
+                return self._find_prefix_matches(original_text, collection,
+                                                 meta, meta_collection)
+
             sort_key = _match(item)
             if sort_key:
-                if meta and len(meta) > 50:
+                if item_meta and len(item_meta) > 50:
                     # Truncate meta-text to 50 characters, if necessary
-                    meta = meta[:47] + u'...'
+                    item_meta = item_meta[:47] + u'...'
 
-                completions.append((sort_key, item, meta))
+                completions.append((sort_key, -score(item), item, item_meta))
 
         return [Completion(item, -len(text), display_meta=meta)
-                for sort_key, item, meta in sorted(completions)]
+                for sort_key, _, item, meta in sorted(completions)]
 
 
+    def _find_prefix_matches(self, text, collection, meta, meta_collection):
+        _logger.debug('Completion latency budget exceeded, using prefix '
+                      'matching.')
+        return self.find_matches(text, collection, start_only=True,
+                                 fuzzy=False, meta=meta,
+                                 meta_collection=meta_collection)
+
     def get_completions(self, document, complete_event, smart_completion=None):
+        generation = self.generation
+
+        requested, self.requested = self.requested, False
+
+        # While typing, give the next keystroke a chance to come in before
+        # doing any work. An explicit Tab doesn't wait.
+        if self.debounce and complete_event is not None and not requested:
+            time.sleep(self.debounce)
+            if generation != self.generation:
+                return []
+
+        deadline = None
+        if self.latency_budget is not None:
+            deadline = perf_counter() + self.latency_budget
+
+        self._computation = (generation, deadline)
+        with tracer.span('complete') as span:
+            try:
+                completions = self._get_completions(document, smart_completion)
+                span.set(completions=len(completions))
+                return completions
+            except CompletionCancelled:
+                _logger.debug('Completion cancelled.')
+                span.set(cancelled=True)
+                return []
+            finally:
+                self._computation = None
+
+    def _get_completions(self, document, smart_completion=None):
         word_before_cursor = document.get_word_before_cursor(WORD=True)
         if smart_completion is None:
             smart_completion = self.smart_completion
@@ -288,7 +398,7 @@ class PGCompleter(Completer):
                     completions.extend(predefined_funcs)
 
             elif suggestion['type'] == 'schema':
-                schema_names = self.dbmetadata['tables'].keys()
+                schema_names = self.catalog.schemata
 
                 # Unless we're sure the user really wants them, hide schema
                 # names starting with pg_, which are mostly temporary schemas
@@ -349,9 +459,7 @@ class PGCompleter(Completer):
                 if not self.pgspecial:
                     continue
 
-                commands = self.pgspecial.commands
-                cmd_names = commands.keys()
-                desc = [commands[cmd].description for cmd in cmd_names]
+                cmd_names, desc = self.pgspecial.completion_table()
 
                 special = self.find_matches(word_before_cursor, cmd_names,
                                             start_only=True,
@@ -386,70 +494,48 @@ class PGCompleter(Completer):
     def populate_scoped_cols(self, scoped_tbls):
         """ Find all columns in a set of scoped_tables
         :param scoped_tbls: list of (schema, table, alias) tuples
-        :return: list of column names
+        :return: list of column names, starting with '*' for each table
         """
 
         columns = []
-        meta = self.dbmetadata
+        catalog = self.catalog
 
         for tbl in scoped_tbls:
+            relname = self.escape_name(tbl[1])
             if tbl[0]:
                 # A fully qualified schema.relname reference
-                schema = self.escape_name(tbl[0])
-                relname = self.escape_name(tbl[1])
+                relation = catalog.relation(self.escape_name(tbl[0]), relname)
+            else:
+                # Schema not specified, so look for the table or view that
+                # matches first in the search path.
+                relation = catalog.visible(self.search_path).relations.get(
+                    relname)
 
-                # We don't know if schema.relname is a table or view. Since
-                # tables and views cannot share the same name, we can check one
-                # at a time
-                try:
-                    columns.extend(meta['tables'][schema][relname])
+            if relation:
+                columns.append('*')
+                columns.extend(self.relation_columns(relation))
 
-                    # Table exists, so don't bother checking for a view
-                    continue
-                except KeyError:
-                    pass
+        return columns
 
-                try:
-                    columns.extend(meta['views'][schema][relname])
-                except KeyError:
-                    pass
+    def relation_columns(self, relation):
+        """The column names of a relation of the catalog.
 
-            else:
-                # Schema not specified, so traverse the search path looking for
-                # a table or view that matches. Note that in order to get proper
-                # shadowing behavior, we need to check both views and tables for
-                # each schema before checking the next schema
-                for schema in self.search_path:
-                    relname = self.escape_name(tbl[1])
-
-                    try:
-                        columns.extend(meta['tables'][schema][relname])
-                        break
-                    except KeyError:
-                        pass
-
-                    try:
-                        columns.extend(meta['views'][schema][relname])
-                        break
-                    except KeyError:
-                        pass
+        With a column loader, the columns are only known once they've been
+        loaded in the background. Until then, there are none.
+        """
+        if not self.column_loader:
+            return relation.columns
 
-        return columns
+        catalog = self.catalog
+        columns = self.column_loader.get(catalog.unescape(relation.schema),
+                                         relation.raw_name)
+        return [catalog.escape(c) for c in columns] if columns else []
 
     def populate_schema_objects(self, schema, obj_type):
-        """Returns list of tables or functions for a (optional) schema"""
-
-        metadata = self.dbmetadata[obj_type]
+        """Returns the names of the tables, views, functions or datatypes of
+        a schema, or the ones visible through the search path"""
 
         if schema:
-            try:
-                objects = metadata[schema].keys()
-            except KeyError:
-                # schema doesn't exist
-                objects = []
-        else:
-            schemas = self.search_path
-            objects = [obj for schema in schemas
-                           for obj in metadata[schema].keys()]
+            return self.catalog.names(obj_type, schema)
 
-        return objects
+        return self.catalog.visible(self.search_path).names[obj_type]
@@ -1,10 +1,20 @@
+import re
+import json
+import time
 import logging
+try:
+    from collections import OrderedDict
+except ImportError:
+    # python 2.6
+    from ordereddict import OrderedDict
 import psycopg2
 import psycopg2.extras
 import psycopg2.extensions as ext
 import sqlparse
 from .packages import pgspecial as special
 from .encodingutils import unicode2utf8, PY2
+from .oidcache import OidCache
+from .packages.tracing import tracer
 
 _logger = logging.getLogger(__name__)
 
@@ -23,7 +33,23 @@ ext.register_type(ext.new_type((17,), 'BYTEA_TEXT', psycopg2.STRING))
 ext.set_wait_callback(psycopg2.extras.wait_select)
 
 
-def register_json_typecasters(conn, loads_fn):
+def type_oids(conn):
+    """Look up the OIDs of the json, jsonb and hstore types, in a single
+    query.
+
+    Returns a {type_name: (oid, array_oid)} dict of the types that are
+    defined (and visible in the search path, for hstore).
+    """
+    with conn.cursor() as cur:
+        cur.execute('''
+            SELECT  typname, oid, typarray
+            FROM    pg_catalog.pg_type
+            WHERE   typname IN ('json', 'jsonb', 'hstore')
+                    AND pg_catalog.pg_type_is_visible(oid)''')
+        return dict((name, (oid, array_oid))
+                    for name, oid, array_oid in cur.fetchall())
+
+def register_json_typecasters(conn, loads_fn, oids=None):
     """Set the function for converting JSON data for a connection.
 
     Use the supplied function to decode JSON data returned from the database
@@ -33,7 +59,8 @@ def register_json_typecasters(conn, loads_fn):
     http://initd.org/psycopg/docs/extras.html#json-adaptation
 
     This function attempts to register the typecaster for both JSON and JSONB
-    types.
+    types. If `oids`, as returned by type_oids(), is given, the database
+    isn't queried for them.
 
     Returns a set that is a subset of {'json', 'jsonb'} indicating which types
     (if any) were successfully registered.
@@ -41,6 +68,13 @@ def register_json_typecasters(conn, loads_fn):
     available = set()
 
     for name in ['json', 'jsonb']:
+        if oids is not None:
+            if name in oids:
+                oid, array_oid = oids[name]
+                psycopg2.extras.register_json(conn, loads=loads_fn, oid=oid,
+                                              array_oid=array_oid, name=name)
+                available.add(name)
+            continue
         try:
             psycopg2.extras.register_json(conn, loads=loads_fn, name=name)
             available.add(name)
@@ -49,13 +83,22 @@ def register_json_typecasters(conn, loads_fn):
 
     return available
 
-def register_hstore_typecaster(conn):
+def register_hstore_typecaster(conn, oids=None):
     """
     Instead of using register_hstore() which converts hstore into a python
     dict, we query the 'oid' of hstore which will be different for each
     database and register a type caster that converts it to unicode.
     http://initd.org/psycopg/docs/extras.html#psycopg2.extras.register_hstore
+
+    If `oids`, as returned by type_oids(), is given, the database isn't
+    queried for it.
     """
+    if oids is not None:
+        if 'hstore' in oids:
+            oid = oids['hstore'][0]
+            ext.register_type(ext.new_type((oid,), "HSTORE", ext.UNICODE))
+        return
+
     with conn.cursor() as cur:
         try:
             cur.execute("SELECT 'hstore'::regtype::oid")
@@ -64,8 +107,48 @@ def register_hstore_typecaster(conn):
         except Exception:
             pass
 
+_set_statement = re.compile(
+    r'^\s*set\s+(?:session\s+)?(?!local\b|transaction\b)([\w.]+|"[^"]+")',
+    re.IGNORECASE)
+_reset_statement = re.compile(
+    r'^\s*(?:reset\s+(?:session\s+)?([\w.]+|"[^"]+")|discard\s+all\b)',
+    re.IGNORECASE)
+_read_only_statement = re.compile(r'^\s*(select|show|table|values)\b',
+                                  re.IGNORECASE)
+_side_effects = re.compile(
+    r'\b(into|for\s+(no\s+key\s+)?update|for\s+(key\s+)?share|nextval|'
+    r'setval|pg_advisory\w*|insert|update|delete)\b', re.IGNORECASE)
+
+def session_parameter(sql):
+    """The name of the parameter a SET statement changes for the session,
+    e.g. "search_path" or "role", or None for any other statement. SET LOCAL
+    and SET TRANSACTION only last until the end of the transaction."""
+    match = _set_statement.match(sql)
+    return match.group(1).lower() if match else None
+
+def is_read_only(sql):
+    """Returns True if a statement can safely be run again: a SELECT, SHOW,
+    TABLE or VALUES that doesn't write or lock anything, as far as we can
+    tell from its text."""
+    return bool(_read_only_statement.match(sql) and
+                not _side_effects.search(sql))
+
 class PGExecute(object):
 
+    # The type OIDs of the servers connected to, shared by all the instances.
+    oid_cache = OidCache()
+
+    # When the connection is lost, reconnect() tries this many times, waiting
+    # reconnect_delay seconds after the first attempt and twice as long after
+    # each of the next ones, up to reconnect_max_delay.
+    reconnect_attempts = 5
+    reconnect_delay = 0.5
+    reconnect_max_delay = 8
+
+    # Run a read-only statement again, once, if the connection was lost while
+    # it was running.
+    retry_read_only = False
+
     # The boolean argument to the current_schemas function indicates whether
     # implicit schemas, e.g. pg_catalog
     search_path_query = '''
@@ -99,6 +182,25 @@ class PGExecute(object):
                 AND att.attnum  > 0
         ORDER BY 1, 2, 3'''
 
+    relation_columns_query = '''
+        SELECT 	att.attname column_name
+        FROM 	pg_catalog.pg_attribute att
+                INNER JOIN pg_catalog.pg_class cls
+                    ON att.attrelid = cls.oid
+                INNER JOIN pg_catalog.pg_namespace nsp
+                    ON cls.relnamespace = nsp.oid
+        WHERE 	nsp.nspname = %s
+                AND cls.relname = %s
+                AND NOT att.attisdropped
+                AND att.attnum  > 0
+        ORDER BY 1'''
+
+    table_scans_query = '''
+        SELECT 	schemaname,
+                relname,
+                coalesce(seq_scan, 0) + coalesce(idx_scan, 0)
+        FROM 	pg_catalog.pg_stat_user_tables'''
+
     functions_query = '''
         SELECT 	DISTINCT  --multiple dispatch means possible duplicates
                 n.nspname schema_name,
@@ -148,6 +250,12 @@ class PGExecute(object):
         self.port = port
         self.connect()
 
+    def copy(self):
+        """Open another connection to the same database, e.g. to run
+        metadata queries in the background."""
+        return self.__class__(self.dbname, self.user, self.password,
+                              self.host, self.port)
+
     def connect(self, database=None, user=None, password=None, host=None,
             port=None):
 
@@ -172,8 +280,86 @@ class PGExecute(object):
         self.password = password
         self.host = host
         self.port = port
-        register_json_typecasters(self.conn, self._json_typecaster)
-        register_hstore_typecaster(self.conn)
+        # The SET statements that changed the session, by parameter name, in
+        # the order they're replayed after reconnecting.
+        self.session_state = OrderedDict()
+        self.register_typecasters()
+
+    def connection_lost(self):
+        return bool(self.conn.closed)
+
+    def reconnect(self, retry=True):
+        """Connect again, e.g. after the connection was lost, and restore the
+        parameters that were SET in the session.
+
+        Failed attempts are retried with an exponential backoff, unless
+        `retry` is False.
+        """
+        state = self.session_state
+        delay = self.reconnect_delay
+        attempts = self.reconnect_attempts if retry else 1
+        for attempt in range(1, attempts + 1):
+            try:
+                self.connect()
+                break
+            except psycopg2.OperationalError as e:
+                if attempt == attempts:
+                    raise
+                _logger.debug('Reconnecting failed, attempt %d: %r',
+                              attempt, e)
+                time.sleep(delay)
+                delay = min(delay * 2, self.reconnect_max_delay)
+
+        with self.conn.cursor() as cur:
+            for sql in state.values():
+                try:
+                    cur.execute(sql)
+                except psycopg2.Error as e:
+                    _logger.error('Restoring %r failed: %r', sql, e)
+        self.session_state = state
+
+    def track_session_state(self, sql):
+        """Remember the statements that changed the session, to replay them
+        after reconnecting."""
+        parameter = session_parameter(sql)
+        if parameter:
+            # Moved to the end, so they're replayed in the same order.
+            self.session_state.pop(parameter, None)
+            self.session_state[parameter] = sql
+            return
+        match = _reset_statement.match(sql)
+        if match:
+            parameter = match.group(1)
+            if parameter is None or parameter.lower() == 'all':
+                self.session_state.clear()
+            else:
+                self.session_state.pop(parameter.lower(), None)
+
+    def server_key(self):
+        """Identifies the database and the server version, for the OID
+        cache."""
+        return '%s:%s/%s/%s' % (self.host, self.port, self.dbname,
+                                self.conn.server_version)
+
+    def register_typecasters(self):
+        """Register the json and hstore typecasters of the connection.
+
+        The type OIDs are only looked up the first time pgcli connects to a
+        database, they're cached after that. check_type_oids() validates the
+        cached ones.
+        """
+        oids = self.oid_cache.get(self.server_key())
+        if oids is None:
+            oids = type_oids(self.conn)
+            self.oid_cache.set(self.server_key(), oids)
+        register_json_typecasters(self.conn, self._json_typecaster, oids)
+        register_hstore_typecaster(self.conn, oids)
+
+    def check_type_oids(self):
+        """Look up the type OIDs again and update the cache if they changed,
+        e.g. because the hstore extension was created since. Returns True if
+        they did."""
+        return self.oid_cache.set(self.server_key(), type_oids(self.conn))
 
     def _json_typecaster(self, json_data):
         """Interpret incoming JSON data as a string.
@@ -203,14 +389,15 @@ class PGExecute(object):
             yield (None, None, None, None)
 
         # Split the sql into separate queries and run each one.
-        for sql in sqlparse.split(statement):
+        with tracer.span('parse'):
+            statements = sqlparse.split(statement)
+        for sql in statements:
             # Remove spaces, eol and semi-colons.
             sql = sql.rstrip(';')
 
             if pgspecial:
                 # First try to run each query as special
                 try:
-                    _logger.debug('Trying a pgspecial command. sql: %r', sql)
                     cur = self.conn.cursor()
                     for result in pgspecial.execute(cur, sql):
                         yield result
@@ -218,10 +405,35 @@ class PGExecute(object):
                 except special.CommandNotFound:
                     pass
 
-            yield self.execute_normal_sql(sql)
+            yield self.execute_and_track(sql)
+
+    def execute_and_track(self, sql):
+        """Run a statement with execute_normal_sql() and keep track of the
+        session state.
+
+        If the connection is lost while a read-only statement is running
+        outside of a transaction, and retry_read_only is set, it reconnects
+        and runs the statement again, once.
+        """
+        in_transaction = (self.conn.get_transaction_status() !=
+                          ext.TRANSACTION_STATUS_IDLE)
+        try:
+            result = self.execute_normal_sql(sql)
+        except psycopg2.OperationalError as e:
+            if not (self.retry_read_only and self.connection_lost() and
+                    not in_transaction and is_read_only(sql)):
+                raise
+            _logger.info('Connection lost, running %r again: %r', sql, e)
+            self.reconnect()
+            title, cur, headers, status = self.execute_normal_sql(sql)
+            note = ('The connection was lost, reconnected and ran the '
+                    'statement again.')
+            result = (note + '\n' + title if title else note,
+                      cur, headers, status)
+        self.track_session_state(sql)
+        return result
 
     def execute_normal_sql(self, split_sql):
-        _logger.debug('Regular sql statement. sql: %r', split_sql)
         cur = self.conn.cursor()
         cur.execute(split_sql)
         try:
@@ -234,23 +446,78 @@ class PGExecute(object):
             headers = [x[0] for x in cur.description]
             return (title, cur, headers, cur.statusmessage)
         else:
-            _logger.debug('No rows in result.')
             return (title, None, None, cur.statusmessage)
 
+    def explain(self, sql, options=None, session_state=None):
+        """Run EXPLAIN on a statement on a new connection and return the
+        lines of its output.
+
+        The new connection gets the parameters SET in this session, or the
+        SET statements in session_state. The statement runs in a transaction
+        that is rolled back, so with ANALYZE the changes it makes aren't
+        kept.
+        """
+        if session_state is None:
+            session_state = list(self.session_state.values())
+        executor = self.copy()
+        conn = executor.conn
+        try:
+            with conn.cursor() as cur:
+                for state in session_state:
+                    cur.execute(state)
+                conn.autocommit = False
+                cur.execute('EXPLAIN %s%s' % (
+                    '(%s) ' % options if options else '', sql))
+                lines = [row[0] for row in cur]
+            conn.rollback()
+        finally:
+            conn.close()
+        return lines
+
+    def explain_analyze(self, sql):
+        """Run a statement with EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) and
+        return the plan as a dict.
+
+        It runs on this connection, so it sees the temporary tables and the
+        uncommitted changes of the session, and doesn't wait on the locks of
+        its transaction. The changes it makes are rolled back: the
+        transaction it runs in, or to a savepoint if one was already open.
+        """
+        in_transaction = (self.conn.get_transaction_status() !=
+                          ext.TRANSACTION_STATUS_IDLE)
+        with self.conn.cursor() as cur:
+            if in_transaction:
+                cur.execute('SAVEPOINT pgcli_explain')
+            else:
+                cur.execute('BEGIN')
+            try:
+                cur.execute('EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ' + sql)
+                plan = cur.fetchone()[0]
+            finally:
+                if in_transaction:
+                    cur.execute('ROLLBACK TO SAVEPOINT pgcli_explain')
+                    cur.execute('RELEASE SAVEPOINT pgcli_explain')
+                else:
+                    cur.execute('ROLLBACK')
+        if not isinstance(plan, list):
+            # The json typecaster returns the text.
+            plan = json.loads(plan)
+        return plan[0]
+
     def search_path(self):
         """Returns the current search path as a list of schema names"""
 
         with self.conn.cursor() as cur:
-            _logger.debug('Search path query. sql: %r', self.search_path_query)
-            cur.execute(self.search_path_query)
+            with tracer.span('catalog', query='search_path'):
+                cur.execute(self.search_path_query)
             return [x[0] for x in cur.fetchall()]
 
     def schemata(self):
         """Returns a list of schema names in the database"""
 
         with self.conn.cursor() as cur:
-            _logger.debug('Schemata Query. sql: %r', self.schemata_query)
-            cur.execute(self.schemata_query)
+            with tracer.span('catalog', query='schemata'):
+                cur.execute(self.schemata_query)
             return [x[0] for x in cur.fetchall()]
 
     def _relations(self, kinds=('r', 'v', 'm')):
@@ -264,9 +531,8 @@ class PGExecute(object):
         """
 
         with self.conn.cursor() as cur:
-            sql = cur.mogrify(self.tables_query, [kinds])
-            _logger.debug('Tables Query. sql: %r', sql)
-            cur.execute(sql)
+            with tracer.span('catalog', query='relations'):
+                cur.execute(self.tables_query, [kinds])
             for row in cur:
                 yield row
 
@@ -294,9 +560,8 @@ class PGExecute(object):
         """
 
         with self.conn.cursor() as cur:
-            sql = cur.mogrify(self.columns_query, [kinds])
-            _logger.debug('Columns Query. sql: %r', sql)
-            cur.execute(sql)
+            with tracer.span('catalog', query='columns'):
+                cur.execute(self.columns_query, [kinds])
             for row in cur:
                 yield row
 
@@ -308,18 +573,37 @@ class PGExecute(object):
         for row in self._columns(kinds=['v', 'm']):
             yield row
 
+    def relation_columns(self, schema, relname):
+        """Returns the column names of a single table or view"""
+
+        with self.conn.cursor() as cur:
+            with tracer.span('catalog', query='relation_columns'):
+                cur.execute(self.relation_columns_query, (schema, relname))
+            return [x[0] for x in cur.fetchall()]
+
+    def table_scans(self):
+        """Yields (schema_name, table_name, scans) tuples, with the number of
+        sequential and index scans of each table since the stats were
+        reset"""
+
+        with self.conn.cursor() as cur:
+            with tracer.span('catalog', query='table_scans'):
+                cur.execute(self.table_scans_query)
+            for row in cur:
+                yield row
+
     def databases(self):
         with self.conn.cursor() as cur:
-            _logger.debug('Databases Query. sql: %r', self.databases_query)
-            cur.execute(self.databases_query)
+            with tracer.span('catalog', query='databases'):
+                cur.execute(self.databases_query)
             return [x[0] for x in cur.fetchall()]
 
     def functions(self):
         """Yields tuples of (schema_name, function_name)"""
 
         with self.conn.cursor() as cur:
-            _logger.debug('Functions Query. sql: %r', self.functions_query)
-            cur.execute(self.functions_query)
+            with tracer.span('catalog', query='functions'):
+                cur.execute(self.functions_query)
             for row in cur:
                 yield row
 
@@ -327,7 +611,7 @@ class PGExecute(object):
         """Yields tuples of (schema_name, type_name)"""
 
         with self.conn.cursor() as cur:
-            _logger.debug('Datatypes Query. sql: %r', self.datatypes_query)
-            cur.execute(self.datatypes_query)
+            with tracer.span('catalog', query='datatypes'):
+                cur.execute(self.datatypes_query)
             for row in cur:
                 yield row
@@ -1,8 +1,12 @@
 from pygments.token import Token
 
-def create_toolbar_tokens_func(get_vi_mode_enabled, token=None):
+def create_toolbar_tokens_func(get_vi_mode_enabled, token=None,
+                               get_refresh_progress=None):
     """
     Return a function that generates the toolbar tokens.
+
+    `get_refresh_progress` returns a description of the completion refresh
+    in progress, or None.
     """
     assert callable(get_vi_mode_enabled)
 
@@ -31,5 +35,9 @@ def create_toolbar_tokens_func(get_vi_mode_enabled, token=None):
         else:
             result.append((token.On, '[F4] Emacs-mode'))
 
+        progress = get_refresh_progress and get_refresh_progress()
+        if progress:
+            result.append((token, '  Loading completions: %s' % progress))
+
         return result
     return get_toolbar_tokens
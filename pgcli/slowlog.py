@@ -0,0 +1,113 @@
+"""Log of the statements that took longer than a threshold."""
+
+import re
+import json
+import time
+import logging
+import threading
+try:
+    from collections import OrderedDict
+except ImportError:
+    # python 2.6
+    from ordereddict import OrderedDict
+import sqlparse
+
+_logger = logging.getLogger(__name__)
+
+# The statements EXPLAIN accepts.
+_explainable = re.compile(
+    r'\s*(select|insert|update|delete|with|values|table|execute)\b',
+    re.IGNORECASE)
+
+
+def is_explainable(sql):
+    """Whether sql is a single statement that EXPLAIN accepts. EXPLAIN
+    would run the statements after the first one."""
+    statements = [s for s in sqlparse.split(sql) if s.strip()]
+    return len(statements) == 1 and bool(_explainable.match(statements[0]))
+
+
+class SlowQueryLog(object):
+    """Appends the statements that ran for longer than a threshold to a
+    file, one JSON object per line, with the query, its duration, the number
+    of rows, the database and, optionally, its plan.
+
+    The plan is looked up with EXPLAIN (without ANALYZE) on another
+    connection, in a background thread, so the prompt doesn't wait for it.
+    The record is written once it's there.
+
+    :param threshold: in seconds. 0 disables the log.
+    """
+
+    def __init__(self, filename, threshold, explain=False):
+        self.filename = filename
+        self.threshold = threshold
+        self.explain = explain
+        self.lock = threading.Lock()
+        self.threads = []
+
+    def is_slow(self, duration):
+        return bool(self.threshold) and duration >= self.threshold
+
+    def record(self, query, duration, rows, successful, executor,
+               executed_at=None):
+        """Log the query if it was slow. Returns True if it was.
+
+        :param executor: the PGExecute it ran with.
+        """
+        if not self.is_slow(duration):
+            return False
+        if executed_at is None:
+            executed_at = time.time()
+        record = OrderedDict([
+            ('executed_at', time.strftime('%Y-%m-%dT%H:%M:%S',
+                                          time.localtime(executed_at))),
+            ('database', executor.dbname),
+            ('user', executor.user),
+            ('host', executor.host),
+            ('duration', round(duration, 6)),
+            ('rows', rows),
+            ('successful', successful),
+            ('query', query),
+        ])
+        if not (self.explain and is_explainable(query)):
+            self._write(record)
+            return True
+
+        # The parameters SET in the session, as of now.
+        session_state = list(executor.session_state.values())
+        thread = threading.Thread(
+            target=self._explain_and_write,
+            args=(record, executor, query, session_state),
+            name='slow-query-plan')
+        thread.daemon = True
+        self.threads = [t for t in self.threads if t.is_alive()]
+        self.threads.append(thread)
+        thread.start()
+        return True
+
+    def _explain_and_write(self, record, executor, query, session_state):
+        try:
+            record['plan'] = '\n'.join(
+                executor.explain(query, session_state=session_state))
+        except Exception as e:
+            _logger.error('Error explaining slow query %r: %r', query, e)
+            record['plan_error'] = str(e).strip()
+        self._write(record)
+
+    def _write(self, record):
+        line = json.dumps(record)
+        with self.lock:
+            try:
+                with open(self.filename, 'a') as f:
+                    f.write(line + '\n')
+            except (IOError, OSError) as e:
+                _logger.error('Error writing slow query log %r: %r',
+                              self.filename, e)
+
+    def close(self, timeout=5):
+        """Wait for the plans that are being looked up."""
+        deadline = time.time() + timeout
+        for thread in self.threads:
+            thread.join(max(deadline - time.time(), 0))
+        self.threads = []
@@ -0,0 +1,102 @@
+"""Summarize the trace files written with the trace_file option.
+
+    $ python -m pgcli.tracesummary ~/.pgcli-trace ~/.pgcli-trace.1
+"""
+
+from __future__ import print_function, unicode_literals
+
+import json
+from collections import defaultdict
+
+import click
+
+from .packages.sessionstats import LogHistogram
+from .packages.tabulate import tabulate
+
+# The attribute that splits a span into groups, e.g. the catalog spans by
+# query: "catalog:tables".
+GROUP_BY = {'execute': 'type', 'catalog': 'query', 'refresh': 'step'}
+
+PERCENTILES = (50, 90, 99)
+
+
+def read_spans(lines):
+    """Yield the spans of the lines of a trace file. Lines that aren't
+    spans, e.g. cut short by a crash, are skipped."""
+    for line in lines:
+        try:
+            span = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(span, dict) and 'span' in span and 'ms' in span:
+            yield span
+
+
+def group_name(span):
+    name = span['span']
+    attr = GROUP_BY.get(name)
+    if attr and attr in span:
+        name += ':%s' % span[attr]
+    return name
+
+
+def summarize(spans, slowest=10):
+    """Returns the (rows, headers) of the summary table of the spans by
+    group, and the ones of the slowest inputs."""
+    histograms = defaultdict(LogHistogram)
+    # Time spent in spans that are part of an input.
+    in_inputs = defaultdict(float)
+    inputs = []
+    for span in spans:
+        name = group_name(span)
+        histograms[name].add(span['ms'] / 1000.0)
+        if span['span'] == 'input':
+            inputs.append(span)
+        elif span.get('trace') is not None:
+            in_inputs[name] += span['ms']
+    input_total = sum(span['ms'] for span in inputs)
+
+    ms = lambda seconds: '%0.03f' % (seconds * 1000)
+    rows = []
+    for name, histogram in sorted(histograms.items(),
+                                  key=lambda item: -item[1].total):
+        share = ''
+        if name in in_inputs and input_total:
+            share = '%0.1f%%' % (in_inputs[name] / input_total * 100)
+        rows.append((name, histogram.count, ms(histogram.total), share) +
+                    tuple(ms(histogram.percentile(p)) for p in PERCENTILES) +
+                    (ms(histogram.max),))
+    headers = (['Span', 'Count', 'Total ms', 'Of inputs'] +
+               ['p%d ms' % p for p in PERCENTILES] + ['Max ms'])
+
+    inputs.sort(key=lambda span: span['ms'], reverse=True)
+    slow_rows = [(span['ms'], span.get('statements'), span.get('rows'),
+                  ' '.join(span.get('query', '').split()))
+                 for span in inputs[:slowest]]
+    slow_headers = ['ms', 'Statements', 'Rows', 'Query']
+    return (rows, headers), (slow_rows, slow_headers)
+
+
+@click.command()
+@click.argument('files', nargs=-1, required=True, type=click.File('r'))
+@click.option('--slowest', default=10,
+              help='Number of slowest inputs to show.')
+def cli(files, slowest):
+    def lines():
+        for f in files:
+            for line in f:
+                yield line
+
+    (rows, headers), (slow_rows, slow_headers) = summarize(
+        read_spans(lines()), slowest)
+    if not rows:
+        click.echo('No spans in the trace files.')
+        return
+    click.echo(tabulate(rows, headers, tablefmt='simple'))
+    if slow_rows:
+        click.echo('\nSlowest inputs:')
+        click.echo(tabulate(slow_rows, slow_headers, tablefmt='simple'))
+
+
+if __name__ == '__main__':
+    cli()
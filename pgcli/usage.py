@@ -0,0 +1,111 @@
+"""Decayed usage counters, used to rank the completions of tables and columns
+by how often they're used."""
+
+import io
+import os
+import re
+import math
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# A use counts half as much after that many more queries.
+HALF_LIFE = 200
+
+# Only the names with the highest scores are written to the usage file.
+MAX_SAVED_NAMES = 10000
+
+_string_literal = re.compile(r"'(?:[^']|'')*'")
+_identifier = re.compile(r'"((?:[^"]|"")+)"|([^\W\d][\w$]*)', re.UNICODE)
+
+
+def identifiers(sql):
+    """Yields the identifiers of a sql statement, as they're stored in the
+    database: unquoted identifiers are folded to lowercase."""
+    for quoted, name in _identifier.findall(_string_literal.sub(' ', sql)):
+        if quoted:
+            yield quoted.replace('""', '"')
+        else:
+            yield name.lower()
+
+
+class UsageStats(object):
+    """How often names are used, with older uses counting less.
+
+    Instead of decaying every counter after each query, the increment grows
+    by 1/decay and the counters are divided by the current increment when
+    they're read.
+
+    Scores can also be seeded, e.g. from the scan counts of the server. Seeds
+    are between 0 and 1, so a single use outweighs them.
+    """
+
+    def __init__(self, half_life=HALF_LIFE):
+        self.decay = 0.5 ** (1.0 / half_life)
+        self.scale = 1.0
+        self.counts = {}
+        self.seeds = {}
+
+    def record(self, names):
+        """Record a use of each of the names, e.g. in a query."""
+        self.scale /= self.decay
+        counts = self.counts
+        for name in set(names):
+            counts[name] = counts.get(name, 0) + self.scale
+        if self.scale > 1e100:
+            self._rescale()
+
+    def _rescale(self):
+        scale = self.scale
+        self.counts = dict((name, count / scale)
+                           for name, count in self.counts.items())
+        self.scale = 1.0
+
+    def score(self, name):
+        count = self.counts.get(name)
+        score = count / self.scale if count else 0
+        return score + self.seeds.get(name, 0) if self.seeds else score
+
+    def seed(self, counts):
+        """Replace the seeds with counts of {name: number_of_uses}, scaled
+        logarithmically between 0 and 1."""
+        counts = dict((name, n) for name, n in counts.items() if n > 0)
+        if not counts:
+            self.seeds = {}
+            return
+        top = math.log1p(max(counts.values()))
+        self.seeds = dict((name, math.log1p(n) / top)
+                          for name, n in counts.items())
+
+    def load(self, filename):
+        """Read the counters saved by save(). A missing or unreadable file is
+        ignored."""
+        if not os.path.exists(filename):
+            return
+        counts = {}
+        try:
+            with io.open(filename, encoding='utf-8') as f:
+                for line in f:
+                    score, name = line.rstrip('\n').split('\t', 1)
+                    counts[name] = float(score) * self.scale
+        except (IOError, OSError, ValueError) as e:
+            _logger.error('Error reading usage file %r: %r', filename, e)
+            return
+        self.counts = counts
+
+    def save(self, filename):
+        """Write the highest scores to a file, one "score<TAB>name" per
+        line."""
+        scores = sorted(((count / self.scale, name)
+                         for name, count in self.counts.items()),
+                        reverse=True)[:MAX_SAVED_NAMES]
+        try:
+            with io.open(filename, 'w', encoding='utf-8') as f:
+                for score, name in scores:
+                    if score < 0.01:
+                        break
+                    if '\n' in name:
+                        continue
+                    f.write(u'%.4g\t%s\n' % (score, name))
+        except (IOError, OSError) as e:
+            _logger.error('Error writing usage file %r: %r', filename, e)
@@ -1,5 +1,6 @@
 import re
 import ast
+import sys
 from setuptools import setup, find_packages
 
 _version_re = re.compile(r'__version__\s+=\s+(.*)')
@@ -10,6 +11,19 @@ with open('pgcli/__init__.py', 'rb') as f:
 
 description = 'CLI for Postgres Database. With auto-completion and syntax highlighting.'
 
+install_requirements = [
+    'click >= 4.1',
+    'Pygments >= 2.0',  # Pygments has to be Capitalcased. WTF?
+    'prompt_toolkit==0.46',
+    'psycopg2 >= 2.5.4',
+    'sqlparse == 0.1.16',
+    'configobj >= 5.0.6'
+]
+
+if sys.version_info < (2, 7):
+    # collections.OrderedDict is new in python 2.7.
+    install_requirements.append('ordereddict')
+
 
 setup(
         name='pgcli',
@@ -22,14 +36,7 @@ setup(
         package_data={'pgcli': ['pgclirc']},
         description=description,
         long_description=open('README.rst').read(),
-        install_requires=[
-            'click >= 4.1',
-            'Pygments >= 2.0',  # Pygments has to be Capitalcased. WTF?
-            'prompt_toolkit==0.46',
-            'psycopg2 >= 2.5.4',
-            'sqlparse == 0.1.16',
-            'configobj >= 5.0.6'
-            ],
+        install_requires=install_requirements,
         entry_points='''
             [console_scripts]
             pgcli=pgcli.main:cli
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+"""Completion latency benchmark.
+
+Generates synthetic catalogs, loads them through the PGCompleter extend_*
+methods and replays a corpus of partial queries through
+PGCli.get_completions. Reports the time and memory used to load each
+catalog, and the p50/p99 latency of suggest_type and of the completions.
+
+No database is needed:
+
+    $ python tests/benchmarks/completion.py --sizes 1000,10000
+"""
+
+from __future__ import print_function, unicode_literals
+
+import os
+import sys
+import random
+import tempfile
+
+import click
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from pgcli.main import PGCli
+from pgcli.packages.sqlcompletion import suggest_type
+from pgcli.packages.timing import perf_counter
+from pgcli.usage import UsageStats
+
+try:
+    import tracemalloc
+except ImportError:
+    # python 2
+    tracemalloc = None
+
+WORDS = ['user', 'account', 'order', 'item', 'invoice', 'payment', 'event',
+         'session', 'product', 'price', 'address', 'tenant', 'log', 'audit',
+         'shipment', 'customer', 'status', 'note', 'tag', 'group']
+
+# Partial queries, completed at the end of the text. {table}, {table2},
+# {schema} and {column} are replaced with names of the catalog, {partial}
+# with the first letters of a table name.
+QUERIES = [
+    'SELECT * FROM ',
+    'SELECT * FROM {partial}',
+    'SELECT * FROM {schema}.',
+    'SELECT * FROM {schema}.{partial}',
+    'SELECT  FROM {table}',
+    'SELECT * FROM {table} WHERE ',
+    'SELECT * FROM {table} WHERE {column} = 1 AND ',
+    'SELECT {column}, FROM {table}',
+    'SELECT t. FROM {table} t',
+    'SELECT * FROM {table} t JOIN {table2} u ON t.',
+    'SELECT * FROM {table} t JOIN {table2} u USING (',
+    'SELECT * FROM {table} JOIN ',
+    'INSERT INTO ',
+    'INSERT INTO {table} (',
+    'UPDATE {table} SET ',
+    'DELETE FROM {partial}',
+    'SELECT cou',
+    'SELECT {partial}',
+    '\\d {partial}',
+    'SEL',
+]
+
+
+def make_catalog(tables, columns, schemas, seed=0):
+    """Return (schemata, tables, columns) metadata rows, like the ones
+    returned by PGExecute, for `tables` tables with a random number of
+    columns in the `columns` range, spread over `schemas` schemas."""
+    rand = random.Random(seed)
+    schemata = ['public'] + ['tenant_%d' % i for i in range(schemas - 1)]
+    table_rows, column_rows = [], []
+    for i in range(tables):
+        schema = schemata[i % len(schemata)]
+        table = '%s_%s_%d' % (rand.choice(WORDS), rand.choice(WORDS), i)
+        table_rows.append((schema, table))
+        for j in range(rand.randint(*columns)):
+            column_rows.append((schema, table,
+                                '%s_%d' % (rand.choice(WORDS), j)))
+    return schemata, table_rows, column_rows
+
+
+def make_queries(table_rows, column_rows, count, seed=0):
+    rand = random.Random(seed)
+    queries = []
+    for i in range(count):
+        schema, table = rand.choice(table_rows)
+        _, table2 = rand.choice(table_rows)
+        column = rand.choice(column_rows)[2]
+        template = QUERIES[i % len(QUERIES)]
+        queries.append(template.format(table=table, table2=table2,
+                                       schema=schema, column=column,
+                                       partial=table[:3]))
+    return queries
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[int(round(q * (len(values) - 1)))]
+
+
+def load(pgcli, schemata, table_rows, column_rows):
+    completer = pgcli.completer.empty_copy()
+    completer.extend_schemata(schemata)
+    completer.extend_relations(table_rows, kind='tables')
+    completer.extend_columns(column_rows, kind='tables')
+    completer.set_search_path(['pg_catalog', 'public'])
+    pgcli.set_completer(completer)
+
+
+def run(pgcli, size, columns, schemas, count, memory):
+    schemata, table_rows, column_rows = make_catalog(size, columns, schemas)
+    queries = make_queries(table_rows, column_rows, count)
+
+    if memory:
+        tracemalloc.start()
+    start = perf_counter()
+    load(pgcli, schemata, table_rows, column_rows)
+    load_time = perf_counter() - start
+    if memory:
+        used = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+    del table_rows, column_rows
+
+    suggest, complete = [], []
+    for text in queries:
+        start = perf_counter()
+        suggest_type(text, text)
+        suggest.append(perf_counter() - start)
+
+        start = perf_counter()
+        pgcli.get_completions(text, len(text))
+        complete.append(perf_counter() - start)
+
+    result = {
+        'tables': size,
+        'load': load_time,
+        'suggest_p50': percentile(suggest, 0.5),
+        'suggest_p99': percentile(suggest, 0.99),
+        'complete_p50': percentile(complete, 0.5),
+        'complete_p99': percentile(complete, 0.99),
+    }
+    if memory:
+        result['memory'] = used
+    return result
+
+
+def report(result):
+    ms = lambda seconds: '%8.2fms' % (seconds * 1000)
+    line = '%8d %8.2fs' % (result['tables'], result['load'])
+    if 'memory' in result:
+        line += ' %8.1fMB' % (result['memory'] / 1024.0 / 1024.0)
+    else:
+        line += ' %10s' % '-'
+    line += ''.join(ms(result[key]) for key in (
+        'suggest_p50', 'suggest_p99', 'complete_p50', 'complete_p99'))
+    print(line)
+
+
+@click.command()
+@click.option('--sizes', default='1000,10000,100000',
+              help='Comma separated numbers of tables.')
+@click.option('--columns', default='10-200',
+              help='Range of the number of columns per table.')
+@click.option('--schemas', default=20, help='Number of schemas.')
+@click.option('--queries', default=500,
+              help='Number of partial queries replayed per catalog.')
+@click.option('--no-memory', is_flag=True,
+              help='Don\'t measure memory, which slows down loading.')
+@click.option('--no-budget', is_flag=True,
+              help='Disable the completion latency budget.')
+def cli(sizes, columns, schemas, queries, no_memory, no_budget):
+    low, high = [int(n) for n in columns.split('-')]
+    memory = tracemalloc is not None and not no_memory
+
+    # Default settings, without touching the user's config file.
+    pgcli = PGCli(pgclirc_file=os.path.join(tempfile.mkdtemp(), 'pgclirc'))
+    pgcli.completer.usage = UsageStats()
+    if no_budget:
+        pgcli.completer.latency_budget = None
+
+    print('%8s %9s %10s %10s %10s %10s %10s' % (
+        'tables', 'load', 'memory', 'suggest50', 'suggest99', 'complete50',
+        'complete99'))
+    for size in sizes.split(','):
+        report(run(pgcli, int(size), (low, high), schemas, queries, memory))
+
+
+if __name__ == '__main__':
+    cli()
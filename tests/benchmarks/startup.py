@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+"""Startup time benchmark.
+
+Starts the pgcli entry point in fresh processes and measures the wall time
+from process start to the first prompt, split into interpreter startup,
+imports, config, connect, typecaster registration and the construction of
+the interface. The time it takes to load the completions in the background
+is reported separately.
+
+It runs against a local PostgreSQL, or against a stubbed PGExecute with a
+synthetic catalog:
+
+    $ python tests/benchmarks/startup.py --stub --output startup.json
+    $ python tests/benchmarks/startup.py -d postgres --baseline startup.json
+"""
+
+from __future__ import print_function, unicode_literals
+
+import time
+
+# As early as possible, to measure the interpreter startup.
+_script_start = time.time()
+
+import os
+import sys
+import json
+import tempfile
+import threading
+import subprocess
+
+import click
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS, '..', '..'))
+
+# The phases up to the first prompt, in order.
+PHASES = ('interpreter', 'imports', 'config', 'connect', 'typecasters',
+          'interface')
+# Reported in the results, but not included in the time to the first prompt.
+OTHER = ('first_prompt', 'completions')
+
+TYPECASTERS = ('type_oids', 'register_json_typecasters',
+               'register_hstore_typecaster')
+
+
+def stub_executor(tables):
+    """A PGExecute that doesn't connect, and returns a synthetic catalog of
+    `tables` tables."""
+    from completion import make_catalog
+    from pgcli.pgexecute import PGExecute
+
+    schemata, table_rows, column_rows = make_catalog(tables, (5, 30), 10)
+
+    class Connection(object):
+        def close(self):
+            pass
+
+    class StubPGExecute(PGExecute):
+        def connect(self, database=None, user=None, password=None,
+                    host=None, port=None):
+            self.conn = Connection()
+
+        def search_path(self):
+            return ['pg_catalog', 'public']
+
+        def schemata(self):
+            return schemata
+
+        def tables(self):
+            return table_rows
+
+        def views(self):
+            return []
+
+        def table_columns(self):
+            return column_rows
+
+        def view_columns(self):
+            return []
+
+        def functions(self):
+            return []
+
+        def datatypes(self):
+            return []
+
+        def databases(self):
+            return ['postgres']
+
+        def table_scans(self):
+            return []
+
+        def check_type_oids(self):
+            return False
+
+    return StubPGExecute
+
+
+def time_typecasters(module, timings):
+    """Wrap the typecaster registration functions of pgcli.pgexecute to add
+    up the time spent in them."""
+    def timed(function):
+        def wrapper(*args, **kwargs):
+            start = time.time()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                timings['typecasters'] += time.time() - start
+        return wrapper
+
+    for name in TYPECASTERS:
+        if hasattr(module, name):
+            setattr(module, name, timed(getattr(module, name)))
+
+
+def measure_once(started_at, connection, stub_tables):
+    """Go through the startup of the entry point in this process, and return
+    the duration of each phase."""
+    timings = dict.fromkeys(PHASES + OTHER, 0.0)
+    timings['interpreter'] = _script_start - started_at
+
+    start = time.time()
+    import pgcli.main
+    import pgcli.pgexecute
+    timings['imports'] = time.time() - start
+
+    if stub_tables:
+        executor_class = stub_executor(stub_tables)
+    else:
+        executor_class = pgcli.pgexecute.PGExecute
+        time_typecasters(pgcli.pgexecute, timings)
+
+    pgcli.main.preload_interface()
+
+    start = time.time()
+    # Default settings, without touching the user's config file.
+    pgcli_ = pgcli.main.PGCli(
+        pgclirc_file=os.path.join(tempfile.mkdtemp(), 'pgclirc'))
+    timings['config'] = time.time() - start
+
+    start = time.time()
+    pgcli_.pgexecute = executor_class(*connection)
+    timings['connect'] = time.time() - start - timings['typecasters']
+
+    start = time.time()
+    # Not assigned to pgcli_.cli: without a running event loop, the loaded
+    # completer has to be swapped in right away.
+    pgcli_.create_interface()
+    timings['interface'] = time.time() - start
+
+    loaded = threading.Event()
+    completions_loaded = pgcli_.completions_loaded
+
+    def on_loaded(completer):
+        completions_loaded(completer)
+        loaded.set()
+
+    pgcli_.completions_loaded = on_loaded
+    start = time.time()
+    pgcli_.refresh_completions()
+    timings['first_prompt'] = time.time() - started_at
+    while pgcli_.completion_refresher.is_refreshing():
+        loaded.wait(0.001)
+    if not loaded.is_set():
+        raise RuntimeError('Loading the completions failed, see the log.')
+    timings['completions'] = time.time() - start
+
+    return timings
+
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+def summarize(samples):
+    return dict((phase, {'median': median([s[phase] for s in samples]),
+                         'min': min(s[phase] for s in samples)})
+                for phase in PHASES + OTHER)
+
+
+def report(phases, baseline=None):
+    ms = lambda seconds: '%9.1fms' % (seconds * 1000)
+    print('%-13s %11s %11s %11s' % ('phase', 'median', 'min',
+                                    'baseline' if baseline else ''))
+    for phase in PHASES + OTHER:
+        line = '%-13s %s %s' % (phase, ms(phases[phase]['median']),
+                                ms(phases[phase]['min']))
+        if baseline and phase in baseline:
+            before = baseline[phase]['median']
+            line += ' %s' % ms(before)
+            if before:
+                line += ' %+6.1f%%' % (
+                    (phases[phase]['median'] - before) / before * 100)
+        print(line)
+
+
+@click.command()
+@click.option('-h', '--host', default='', help='Host of the database.')
+@click.option('-p', '--port', default=5432, help='Port of the database.')
+@click.option('-U', '--user', default='', help='User name.')
+@click.option('-d', '--dbname', default='', help='Database name.')
+@click.option('--stub', is_flag=True,
+              help='Use a stubbed PGExecute instead of a database.')
+@click.option('--tables', default=1000,
+              help='Number of tables of the stubbed catalog.')
+@click.option('--runs', default=10, help='Number of startups measured.')
+@click.option('--output', type=click.Path(),
+              help='Write the results to this JSON file.')
+@click.option('--baseline', type=click.Path(exists=True),
+              help='Compare with the results saved in this JSON file.')
+@click.option('--tolerance', default=0.1,
+              help='Fail if the time to the first prompt is more than this '
+                   'fraction slower than the baseline.')
+@click.option('--once', type=float, default=None,
+              help='Measure a single startup in this process, started at '
+                   'this time.time(), and print it as JSON. Used by the '
+                   'runs.')
+def cli(host, port, user, dbname, stub, tables, runs, output, baseline,
+        tolerance, once):
+    connection = (dbname, user, '', host, port)
+
+    if once is not None:
+        timings = measure_once(once, connection, tables if stub else None)
+        print(json.dumps(timings))
+        return
+
+    samples = []
+    for i in range(runs):
+        args = ['-h', host, '-p', str(port), '-U', user, '-d', dbname,
+                '--tables', str(tables)]
+        if stub:
+            args.append('--stub')
+        # Measured from just before the process is started.
+        args = [sys.executable, os.path.abspath(__file__),
+                '--once', repr(time.time())] + args
+        out = subprocess.check_output(args, stdin=open(os.devnull))
+        samples.append(json.loads(out.decode('utf-8').splitlines()[-1]))
+
+    results = {
+        'python': sys.version.split()[0],
+        'mode': 'stub' if stub else 'postgres',
+        'tables': tables if stub else None,
+        'runs': runs,
+        'phases': summarize(samples),
+        'samples': samples,
+    }
+
+    before = None
+    if baseline:
+        with open(baseline) as f:
+            before = json.load(f)['phases']
+    report(results['phases'], before)
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if before:
+        now = results['phases']['first_prompt']['median']
+        then = before['first_prompt']['median']
+        if now > then * (1 + tolerance):
+            click.secho('The first prompt is %.1f%% slower than the baseline.'
+                        % ((now - then) / then * 100), fg='red')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    cli()
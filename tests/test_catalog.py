@@ -0,0 +1,104 @@
+from pgcli.catalog import Catalog
+
+
+def make_catalog():
+    catalog = Catalog()
+    catalog.add_schema('public')
+    catalog.add_schema('custom')
+    catalog.add_object('tables', 'public', 'users')
+    catalog.add_object('tables', 'custom', 'users')
+    catalog.add_object('views', 'public', 'user_emails')
+    catalog.add_object('functions', 'public', 'Func1')
+    catalog.add_column('tables', 'public', 'users', 'id')
+    catalog.add_column('tables', 'public', 'users', 'email')
+    catalog.add_column('tables', 'custom', 'users', 'id')
+    catalog.add_column('views', 'public', 'user_emails', 'email')
+    return catalog
+
+
+def test_lookup():
+    catalog = make_catalog()
+    assert catalog.schemata == ['public', 'custom']
+    assert catalog.get('tables', 'public', 'users').columns == ['id', 'email']
+    assert catalog.relation('public', 'user_emails').kind == 'views'
+    assert catalog.relation('public', 'missing') is None
+    assert catalog.get('tables', 'missing', 'users') is None
+    assert catalog.names('tables', 'custom') == ['users']
+    assert catalog.names('tables', 'missing') == []
+
+
+def test_unknown_schema_is_ignored():
+    catalog = make_catalog()
+    assert catalog.add_object('tables', 'missing', 'foo') is None
+    assert catalog.names('tables', 'missing') == []
+
+
+def test_names_are_interned():
+    catalog = make_catalog()
+    public_id = catalog.get('tables', 'public', 'users').columns[0]
+    custom_id = catalog.get('tables', 'custom', 'users').columns[0]
+    assert public_id is custom_id
+
+
+def test_reverse_indexes():
+    catalog = make_catalog()
+    relations = catalog.relations_with_column('email')
+    assert [(r.schema, r.name) for r in relations] == [
+        ('public', 'users'), ('public', 'user_emails')]
+    assert catalog.relations_with_column('missing') == []
+
+    assert [(o.kind, o.schema) for o in catalog.find('USERS')] == [
+        ('tables', 'public'), ('tables', 'custom')]
+    assert [o.name for o in catalog.find('func1')] == ['Func1']
+
+
+def test_names_are_escaped_once():
+    escaped = []
+
+    def escape(name):
+        escaped.append(name)
+        return '"%s"' % name if name != name.lower() else name
+
+    catalog = Catalog(escape)
+    catalog.add_schema('public')
+    catalog.add_object('tables', 'public', 'Users')
+    catalog.add_column('tables', 'public', 'Users', 'id')
+    catalog.add_column('tables', 'public', 'Users', 'Email')
+    assert sorted(escaped) == ['Email', 'Users', 'id', 'public']
+
+    relation = catalog.relation('public', '"Users"')
+    assert relation.raw_name == 'Users'
+    assert relation.columns == ['id', '"Email"']
+    assert catalog.unescape('"Email"') == 'Email'
+    assert [o.name for o in catalog.find('users')] == ['"Users"']
+
+
+def test_visible_objects():
+    catalog = make_catalog()
+    catalog.add_object('tables', 'custom', 'products')
+    catalog.add_object('views', 'custom', 'user_emails')
+
+    visible = catalog.visible(['custom', 'public'])
+    assert visible.names['tables'] == ('users', 'products')
+    assert visible.names['views'] == ('user_emails',)
+    assert visible.names['functions'] == ('Func1',)
+    assert visible.relations['users'].schema == 'custom'
+    assert visible.relations['user_emails'].schema == 'custom'
+
+    visible = catalog.visible(['public', 'custom'])
+    assert visible.relations['users'].schema == 'public'
+    assert visible.relations['products'].schema == 'custom'
+
+
+def test_visible_objects_are_cached():
+    catalog = make_catalog()
+    search_path = ['public']
+    visible = catalog.visible(search_path)
+    assert catalog.visible(search_path) is visible
+
+    # A new search path, even an equal one, is looked up again.
+    assert catalog.visible(['public']) is not visible
+
+    catalog.add_object('tables', 'public', 'orders')
+    visible = catalog.visible(search_path)
+    assert 'orders' in visible.names['tables']
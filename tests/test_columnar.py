@@ -0,0 +1,51 @@
+# coding=UTF-8
+from array import array
+from decimal import Decimal
+from pgcli.packages.columnar import ColumnarData, pack_column, column_type
+from pgcli.packages.tabulate import tabulate, tabulate_lines
+
+
+def test_pack_int_and_float_columns():
+    assert pack_column((1, 2, 3)) == array('l', [1, 2, 3])
+    assert pack_column((1.5, 2.0)) == array('d', [1.5, 2.0])
+
+
+def test_mixed_columns_are_not_packed():
+    for values in [(1, None), (1, 2.5), (True, False), ('a', 'b'),
+                   (Decimal('1'),), (2 ** 70, 1)]:
+        assert pack_column(values) is values
+
+
+def test_column_type():
+    assert column_type(array('l', [1])) is int
+    assert column_type(array('d', [1.0])) is float
+    assert column_type(('a',)) is None
+
+
+def test_rows_round_trip():
+    rows = [(1, 'a', 1.5), (2, None, 2.5)]
+    data = ColumnarData.from_rows(rows)
+    assert data.rowcount == 2
+    assert list(data) == rows
+
+
+def test_rows_without_columns():
+    data = ColumnarData([], 2)
+    assert list(data) == [(), ()]
+
+
+def test_tabulate_columnar_matches_rows():
+    rows = [(1, u'日本', 1.5, None), (22, u'x', 2.25, Decimal('3.10'))]
+    headers = ['id', 'name', 'f', 'd']
+    for fmt in ['psql', 'grid', 'plain', 'pipe']:
+        assert (tabulate(ColumnarData.from_rows(rows), headers, tablefmt=fmt,
+                         missingval='<null>') ==
+                tabulate(rows, headers, tablefmt=fmt, missingval='<null>'))
+
+
+def test_tabulate_lines_is_lazy():
+    lines = tabulate_lines(ColumnarData.from_rows([(1,), (2,)]), ['x'],
+                           tablefmt='psql')
+    assert next(lines) == '+-----+'
+    assert list(lines) == ['|   x |', '|-----|', '|   1 |', '|   2 |',
+                           '+-----+']
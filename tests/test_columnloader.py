@@ -0,0 +1,93 @@
+from __future__ import unicode_literals
+import threading
+from prompt_toolkit.completion import Completion
+from prompt_toolkit.document import Document
+from pgcli.columnloader import ColumnLoader
+from pgcli.pgcompleter import PGCompleter
+
+
+class FakeConnection(object):
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeExecutor(object):
+    def __init__(self, columns):
+        self.columns = columns
+        self.queries = []
+        self.conn = FakeConnection()
+
+    def relation_columns(self, schema, relname):
+        self.queries.append((schema, relname))
+        return self.columns[schema, relname]
+
+
+def make_loader(columns, max_relations=10):
+    executor = FakeExecutor(columns)
+    loaded = threading.Event()
+    loader = ColumnLoader(lambda: executor, max_relations,
+                          on_loaded=loaded.set)
+    return loader, executor, loaded
+
+
+def close(loader, executor):
+    """Close the loader and check its thread ended cleanly."""
+    thread = loader.thread
+    loader.close()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert executor.conn.closed
+
+
+def load(loader, loaded, schema, relname):
+    loaded.clear()
+    assert loader.get(schema, relname) is None
+    assert loaded.wait(5)
+    return loader.get(schema, relname)
+
+
+def test_columns_are_loaded_in_the_background():
+    loader, executor, loaded = make_loader({('public', 'users'): ['id']})
+    assert load(loader, loaded, 'public', 'users') == ['id']
+    assert loader.get('public', 'users') == ['id']
+    assert executor.queries == [('public', 'users')]
+    close(loader, executor)
+
+
+def test_least_recently_used_relations_are_evicted():
+    columns = {('public', 'a'): ['x'], ('public', 'b'): ['y'],
+               ('public', 'c'): ['z']}
+    loader, executor, loaded = make_loader(columns, max_relations=2)
+    load(loader, loaded, 'public', 'a')
+    load(loader, loaded, 'public', 'b')
+    loader.get('public', 'a')
+    load(loader, loaded, 'public', 'c')
+    assert list(loader.cache) == [('public', 'a'), ('public', 'c')]
+    close(loader, executor)
+
+
+def test_completer_with_column_loader():
+    comp = PGCompleter(smart_completion=True)
+    comp.extend_schemata(['public'])
+    comp.extend_relations([('public', 'users')], kind='tables')
+    comp.set_search_path(['public'])
+    loader, executor, loaded = make_loader(
+        {('public', 'users'): ['id', 'Email']})
+    comp.set_column_loader(loader)
+
+    text = 'SELECT  FROM users'
+    position = len('SELECT ')
+    document = Document(text=text, cursor_position=position)
+
+    loaded.clear()
+    result = comp.get_completions(document, None)
+    assert Completion(text='*', display_meta='column') in result
+    assert Completion(text='id', display_meta='column') not in result
+
+    assert loaded.wait(5)
+    result = comp.get_completions(document, None)
+    assert Completion(text='id', display_meta='column') in result
+    assert Completion(text='"Email"', display_meta='column') in result
+    close(loader, executor)
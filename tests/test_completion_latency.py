@@ -0,0 +1,98 @@
+from __future__ import unicode_literals
+import threading
+import pytest
+from prompt_toolkit.buffer import Buffer
+from prompt_toolkit.completion import CompleteEvent
+from prompt_toolkit.document import Document
+from prompt_toolkit.keys import Keys
+from pgcli.key_bindings import pgcli_bindings
+from pgcli.pgcompleter import PGCompleter
+
+
+def make_completer(n=5000):
+    comp = PGCompleter(smart_completion=True)
+    comp.extend_schemata(['public'])
+    comp.extend_relations([('public', 'table%d' % i) for i in range(n)] +
+                          [('public', 'xtabley')], kind='tables')
+    comp.set_search_path(['public'])
+    return comp
+
+
+def table_names(comp, text):
+    return [c.text for c in comp.get_completions(Document(text=text), None)]
+
+
+def test_latency_budget_falls_back_to_prefix_matching():
+    comp = make_completer()
+    assert 'xtabley' in table_names(comp, 'SELECT * FROM tabl')
+
+    comp.latency_budget = 0
+    names = table_names(comp, 'SELECT * FROM tabl')
+    assert 'xtabley' not in names
+    assert 'table0' in names
+
+
+def test_cancelled_completion_returns_nothing():
+    comp = make_completer()
+
+    def cancel_while_matching(item):
+        comp.cancel()
+        return 0
+
+    comp.usage.score = cancel_while_matching
+    assert table_names(comp, 'SELECT * FROM tabl') == []
+    # The cancellation doesn't stick to the next computation.
+    comp.usage.score = lambda item: 0
+    assert table_names(comp, 'SELECT * FROM tabl')
+
+
+def test_debounce_skips_outdated_text():
+    comp = make_completer(10)
+    comp.debounce = 0.1
+    timer = threading.Timer(0.01, comp.cancel)
+    timer.start()
+    document = Document(text='SELECT * FROM tabl')
+    typing = CompleteEvent(text_inserted=True)
+    assert comp.get_completions(document, complete_event=typing) == []
+    timer.join()
+    assert comp.get_completions(document, complete_event=typing)
+
+
+@pytest.mark.parametrize('key', [Keys.Tab, Keys.ControlSpace])
+def test_tab_is_not_debounced(monkeypatch, key):
+    comp = make_completer(10)
+    comp.debounce = 0.1
+    sleeps = []
+    monkeypatch.setattr('pgcli.pgcompleter.time.sleep', sleeps.append)
+    completions = []
+
+    class CLI(object):
+        current_buffer = Buffer(completer=comp)
+
+        def start_completion(self, select_first):
+            # What prompt_toolkit sends for Tab as well as for typing.
+            event = CompleteEvent(text_inserted=True)
+            document = Document(text='SELECT * FROM tabl')
+            completions.extend(comp.get_completions(document, event))
+
+    class KeyPress(object):
+        cli = CLI()
+
+    registry = pgcli_bindings(lambda: False, lambda enabled: None).registry
+    # pgcli's binding is added last, and wins.
+    binding = registry.get_bindings_for_keys((key,))[-1]
+    binding.call(KeyPress())
+    assert completions
+    assert sleeps == []
+
+    # Typing still waits.
+    CLI().start_completion(select_first=False)
+    assert sleeps == [0.1]
+
+
+def test_cancel_outside_of_a_computation():
+    comp = make_completer(10)
+    comp.cancel()
+    assert table_names(comp, 'SELECT * FROM tabl')
+    assert not comp._check_computation()
+
@@ -0,0 +1,82 @@
+from __future__ import unicode_literals
+import threading
+from pgcli.completionrefresher import CompletionRefresher
+from pgcli.pgcompleter import PGCompleter
+
+
+class FakeConnection(object):
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeExecutor(object):
+    def __init__(self):
+        self.conn = FakeConnection()
+
+
+def test_metadata_is_loaded_in_the_background():
+    executor = FakeExecutor()
+    done = threading.Event()
+    loaded = []
+
+    def on_done(completer):
+        loaded.append(completer)
+        done.set()
+
+    steps = [
+        ('schemata', lambda c, e: c.extend_schemata(['public'])),
+        ('tables', lambda c, e: c.extend_relations([('public', 'users')],
+                                                   kind='tables')),
+    ]
+    refresher = CompletionRefresher(steps)
+    completer = PGCompleter(smart_completion=True)
+    refresher.refresh(lambda: executor, completer, on_done)
+
+    assert done.wait(5)
+    assert loaded == [completer]
+    assert completer.catalog.names('tables', 'public') == ['users']
+    assert executor.conn.closed
+    assert refresher.progress() is None
+
+
+def test_refresh_in_progress_is_restarted():
+    started, proceed = threading.Event(), threading.Event()
+    done = threading.Event()
+    loaded = []
+
+    def block(completer, executor):
+        started.set()
+        proceed.wait(5)
+
+    def on_done(completer):
+        loaded.append(completer)
+        done.set()
+
+    refresher = CompletionRefresher([('schemata', block),
+                                     ('tables', lambda c, e: None)])
+    first, second = object(), object()
+    refresher.refresh(FakeExecutor, first, on_done)
+    assert started.wait(5)
+    assert refresher.is_refreshing()
+    assert refresher.progress() == 'schemata (1/2)'
+
+    refresher.refresh(FakeExecutor, second, on_done)
+    proceed.set()
+    assert done.wait(5)
+    assert loaded == [second]
+
+
+def test_failed_refresh_keeps_the_current_completer():
+    def fail(completer, executor):
+        raise Exception('connection lost')
+
+    refresher = CompletionRefresher([('schemata', fail)])
+    finished = threading.Event()
+    refresher.on_progress = lambda: (not refresher.is_refreshing() and
+                                     finished.set())
+    loaded = []
+    refresher.refresh(FakeExecutor, object(), loaded.append)
+    assert finished.wait(5)
+    assert loaded == []
@@ -0,0 +1,87 @@
+# coding=UTF-8
+from __future__ import unicode_literals
+from pgcli.historystore import HistoryStore
+from pgcli.main import count_rows
+
+
+def make_store(tmpdir):
+    store = HistoryStore(str(tmpdir.join('history.db')))
+    store.add('SELECT * FROM users', 'db', 0.5, 10, 200, True, False,
+              executed_at=1000)
+    store.add('select name from users where id = 1', 'db', 2.0, 1, 20, True,
+              False, executed_at=2000)
+    store.add('UPDATE orders SET paid = true', 'shop', 0.1, 3, 9, True, True,
+              executed_at=3000)
+    store.add('SELECT * FROM missing', 'db', 0.01, None, 0, False, False,
+              executed_at=4000)
+    return store
+
+
+def queries(rows):
+    return [row[2] for row in rows]
+
+
+def test_most_recent_first(tmpdir):
+    store = make_store(tmpdir)
+    assert queries(store.search(limit=2)) == [
+        'SELECT * FROM missing', 'UPDATE orders SET paid = true']
+    assert store.search(limit=1)[0] == (
+        4000, 'db', 'SELECT * FROM missing', 0.01, None, 0, 0, 0)
+
+
+def test_full_text_search(tmpdir):
+    store = make_store(tmpdir)
+    assert queries(store.search(text='users')) == [
+        'select name from users where id = 1', 'SELECT * FROM users']
+    assert queries(store.search(text='ord*')) == [
+        'UPDATE orders SET paid = true']
+    assert store.search(text='"unbalanced') == []
+
+
+def test_prefix_search_ignores_case(tmpdir):
+    store = make_store(tmpdir)
+    assert queries(store.search(prefix='select * ')) == [
+        'SELECT * FROM missing', 'SELECT * FROM users']
+
+
+def test_slowest_since(tmpdir):
+    store = make_store(tmpdir)
+    assert queries(store.search(since=1500, slowest=True)) == [
+        'select name from users where id = 1',
+        'UPDATE orders SET paid = true', 'SELECT * FROM missing']
+
+
+def test_history_is_kept_across_sessions(tmpdir):
+    make_store(tmpdir).close()
+    store = HistoryStore(str(tmpdir.join('history.db')))
+    assert len(store.search()) == 4
+    store.add('SELECT \'日本語\'', 'db', 0.1, 1, 10, True, False)
+    assert queries(store.search(text='日本語')) == ["SELECT '日本語'"]
+
+
+def test_unwritable_history_is_ignored(tmpdir):
+    store = HistoryStore(str(tmpdir.join('missing', 'history.db')))
+    store.add('SELECT 1', 'db', 0.1, 1, 10, True, False)
+    assert store.search() == []
+
+
+def test_count_rows():
+    results = [(None, None, None, 'SELECT 3'), (None, None, None, 'INSERT 0 2'),
+               (None, None, None, 'CREATE TABLE'), (None, None, None, None)]
+    assert count_rows(results) == 5
+
+
+def test_opened_when_used(tmpdir):
+    filename = tmpdir.join('history.db')
+    store = HistoryStore(str(filename))
+    assert not filename.exists()
+    assert store.search() == []
+    assert filename.exists()
+    store.close()
+
+
+def test_opened_again_after_close(tmpdir):
+    store = make_store(tmpdir)
+    store.close()
+    assert len(store.search()) == 4
+    store.close()
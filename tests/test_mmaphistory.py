@@ -0,0 +1,125 @@
+# coding=UTF-8
+from __future__ import unicode_literals
+from prompt_toolkit.history import FileHistory
+from prompt_toolkit.enums import IncrementalSearchDirection
+from prompt_toolkit.filters import Always
+from prompt_toolkit.search_state import SearchState
+import pgcli.mmaphistory
+from pgcli.mmaphistory import MmapHistory, WorkingLines
+from pgcli.pgbuffer import PGBuffer
+
+ENTRIES = ['SELECT * FROM users;', 'select 2015;',
+           'SELECT name\nFROM orders\nWHERE paid;', 'ünïcode',
+           'SELECT * FROM users;', '\\dt']
+
+
+def make_history(tmpdir, entries=ENTRIES):
+    filename = str(tmpdir.join('history'))
+    writer = FileHistory(filename)
+    for entry in entries:
+        writer.append(entry)
+    return filename
+
+
+def test_reads_file_history(tmpdir):
+    filename = make_history(tmpdir)
+    history = MmapHistory(filename)
+    assert len(history) == len(ENTRIES)
+    assert list(history.strings) == FileHistory(filename).strings
+    assert history[-1] == '\\dt'
+    assert history[2] == 'SELECT name\nFROM orders\nWHERE paid;'
+
+
+def test_missing_file(tmpdir):
+    history = MmapHistory(str(tmpdir.join('missing')))
+    assert len(history) == 0
+    assert history.strings.search_backwards('x', 10) is None
+    history.append('select 1')
+    assert list(history.strings) == ['select 1']
+    assert FileHistory(history.filename).strings == ['select 1']
+
+
+def test_append(tmpdir):
+    filename = make_history(tmpdir)
+    history = MmapHistory(filename)
+    history.append('select 3')
+    assert history[-1] == 'select 3'
+    assert len(history) == len(ENTRIES) + 1
+    assert FileHistory(filename).strings == ENTRIES + ['select 3']
+
+
+def test_search_backwards(tmpdir):
+    entries = MmapHistory(make_history(tmpdir)).strings
+    assert entries.search_backwards('users', 6) == 4
+    assert entries.search_backwards('users', 4) == 0
+    assert entries.search_backwards('USERS', 4) is None
+    assert entries.search_backwards('USERS', 4, ignore_case=True) == 0
+    assert entries.search_backwards('orders\nwhere', 6, True) == 2
+    assert entries.search_backwards('ünï', 6) == 3
+    assert entries.search_backwards('ÜNÏ', 6) is None
+    assert entries.search_backwards('ÜNÏ', 6, ignore_case=True) == 3
+    assert entries.search_backwards('Ü', 6, True, skip=set([3])) is None
+    # Matches in the timestamps of the headers are skipped.
+    assert entries.search_backwards('2015', 6) == 1
+    assert entries.search_backwards('2015', 1) is None
+    assert entries.search_backwards('users', 6, skip=set([4])) == 0
+
+
+def test_search_across_windows(tmpdir, monkeypatch):
+    monkeypatch.setattr(pgcli.mmaphistory, 'SEARCH_WINDOW', 16)
+    entries = ['select %d from some_table' % i for i in range(100)]
+    history = MmapHistory(make_history(tmpdir, entries))
+    assert history.strings.search_backwards('7 from some', 100) == 97
+    assert history.strings.search_backwards('select 3 ', 100) == 3
+    assert history.strings.search_backwards('other_table', 100) is None
+
+
+def test_working_lines(tmpdir):
+    history = MmapHistory(make_history(tmpdir))
+    lines = history.strings[:]
+    assert isinstance(lines, WorkingLines)
+    lines.append('')
+    lines[1] = 'select users'
+    lines[-1] = 'users'
+    assert len(lines) == 7
+    assert list(lines)[:2] == ['SELECT * FROM users;', 'select users']
+    assert history[1] == 'select 2015;'
+    assert lines.find_backwards('users', 7) == 6
+    assert lines.find_backwards('users', 6) == 4
+    assert lines.find_backwards('users', 4) == 1
+    assert lines.find_backwards('2015', 6) is None
+
+
+def test_reverse_search(tmpdir):
+    filename = make_history(tmpdir)
+    buf = PGBuffer(always_multiline=False, history=MmapHistory(filename))
+    # The same results as prompt_toolkit's search of a FileHistory.
+    expected = PGBuffer(always_multiline=False, history=FileHistory(filename))
+    for text in ('users', 'USERS', 'orders\nwhere', '2015', 'Ü',
+                 'nothing'):
+        state = SearchState(text, IncrementalSearchDirection.BACKWARD,
+                            ignore_case=Always())
+        for count in (1, 2, 3):
+            assert (buf._search(state, count=count) ==
+                    expected._search(state, count=count))
+    state = SearchState('users', IncrementalSearchDirection.BACKWARD)
+    assert buf._search(state) == (4, 14)
+    assert buf._search(state, count=2) == (0, 14)
+
+
+def test_compact(tmpdir):
+    filename = make_history(tmpdir)
+    history = MmapHistory(filename)
+    history.compact()
+    assert FileHistory(filename).strings == [
+        'select 2015;', 'SELECT name\nFROM orders\nWHERE paid;', 'ünïcode',
+        'SELECT * FROM users;', '\\dt']
+
+
+def test_compact_keeps_entries_with_the_same_hash(tmpdir, monkeypatch):
+    # As if the hashes of all the entries collided.
+    monkeypatch.setattr(pgcli.mmaphistory, 'hash', lambda value: 0,
+                        raising=False)
+    filename = make_history(tmpdir, ['select 1', 'select 2', 'select 1'])
+    MmapHistory(filename).compact()
+    assert FileHistory(filename).strings == ['select 2', 'select 1']
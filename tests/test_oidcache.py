@@ -0,0 +1,28 @@
+from pgcli.oidcache import OidCache
+
+
+def test_oids_are_saved_when_they_change(tmpdir):
+    filename = str(tmpdir.join('oids'))
+    cache = OidCache(filename)
+    assert cache.get('localhost:5432/db/90500') is None
+
+    oids = {'json': (114, 199), 'hstore': (16385, 16390)}
+    assert cache.set('localhost:5432/db/90500', oids)
+    assert not cache.set('localhost:5432/db/90500', oids)
+
+    loaded = OidCache()
+    loaded.load(filename)
+    assert loaded.get('localhost:5432/db/90500') == {
+        'json': [114, 199], 'hstore': [16385, 16390]}
+
+    del oids['hstore']
+    assert loaded.set('localhost:5432/db/90500', oids)
+    assert loaded.get('localhost:5432/db/90500') == {'json': [114, 199]}
+
+
+def test_unreadable_file_is_ignored(tmpdir):
+    filename = tmpdir.join('oids')
+    filename.write('not json')
+    cache = OidCache()
+    cache.load(str(filename))
+    assert cache.get('localhost:5432/db/90500') is None
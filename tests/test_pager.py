@@ -0,0 +1,54 @@
+import sys
+import pytest
+from pgcli.pager import take_screenful, pipe_to_pager, write_output
+
+posix_only = pytest.mark.skipif(sys.platform.startswith('win'),
+                                reason='Needs a posix shell for the pager.')
+
+
+def test_take_screenful_fits():
+    chunks = iter(['a\n', 'b\n'])
+    assert take_screenful(chunks, width=80, height=24) == (['a\n', 'b\n'], True)
+
+
+def test_take_screenful_stops_at_screen_height():
+    chunks = iter(['row\n'] * 100)
+    buffered, fits = take_screenful(chunks, width=80, height=24)
+    assert not fits
+    assert len(buffered) == 23
+    # The rest of the output has not been produced yet.
+    assert len(list(chunks)) == 77
+
+
+def test_take_screenful_stops_at_wide_line():
+    chunks = iter(['x' * 81 + '\n', 'row\n'])
+    buffered, fits = take_screenful(chunks, width=80, height=24)
+    assert not fits
+    assert buffered == ['x' * 81 + '\n']
+
+
+@posix_only
+def test_pipe_to_pager_writes_everything(tmpdir):
+    out = tmpdir.join('out.txt')
+    assert pipe_to_pager(['a\n', 'b\n'], 'cat > %s' % out)
+    assert out.read() == 'a\nb\n'
+
+
+@posix_only
+def test_pipe_to_pager_stops_when_pager_exits():
+    produced = []
+
+    def endless():
+        while True:
+            produced.append(1)
+            yield 'row\n' * 1000
+
+    assert not pipe_to_pager(endless(), 'true')
+    # Backpressure from the closed pipe stopped the producer.
+    assert len(produced) < 1000
+
+
+def test_write_output_without_terminal(capsys):
+    assert write_output(['a\n', 'b\n'])
+    out, err = capsys.readouterr()
+    assert out == 'a\nb\n'
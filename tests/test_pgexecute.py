@@ -199,4 +199,126 @@ def test_describe_special(executor, command, verbose, pattern):
     # We don't have any tests for the output of any of the special commands,
     # but we can at least make sure they run without error
     sql = r'\{command}{verbose} {pattern}'.format(**locals())
-    executor.run(sql)
\ No newline at end of file
+    executor.run(sql)
+
+
+@dbtest
+def test_type_oids_are_cached(executor):
+    assert not executor.check_type_oids()
+    oids = executor.oid_cache.get(executor.server_key())
+    if executor.conn.server_version >= 90200:
+        assert oids['json'] == [114, 199]
+
+
+@pytest.mark.parametrize('sql, parameter', [
+    ('SET search_path TO a, b', 'search_path'),
+    ('set application_name = pgcli', 'application_name'),
+    ('SET SESSION ROLE admin', 'role'),
+    ('SET SESSION AUTHORIZATION admin', 'authorization'),
+    ('SET myapp.tenant = 3', 'myapp.tenant'),
+    ('SET LOCAL search_path TO a', None),
+    ('SET TRANSACTION READ ONLY', None),
+    ('SELECT 1', None),
+])
+def test_session_parameter(sql, parameter):
+    from pgcli.pgexecute import session_parameter
+    assert session_parameter(sql) == parameter
+
+
+@pytest.mark.parametrize('sql, read_only', [
+    ('SELECT * FROM users', True),
+    ('  show search_path', True),
+    ('TABLE users', True),
+    ('SELECT * INTO copy FROM users', False),
+    ('SELECT * FROM users FOR UPDATE', False),
+    ("SELECT nextval('seq')", False),
+    ('WITH d AS (DELETE FROM users RETURNING *) SELECT * FROM d', False),
+    ('UPDATE users SET a = 1', False),
+    ('EXPLAIN ANALYZE DELETE FROM users', False),
+])
+def test_is_read_only(sql, read_only):
+    from pgcli.pgexecute import is_read_only
+    assert is_read_only(sql) == read_only
+
+
+@pytest.mark.parametrize('retry, attempts', [(True, 5), (False, 1)])
+def test_reconnect_attempts(monkeypatch, retry, attempts):
+    from pgcli.pgexecute import PGExecute
+
+    class Unreachable(PGExecute):
+        tries = 0
+
+        def __init__(self):
+            self.session_state = {}
+
+        def connect(self):
+            self.tries += 1
+            raise psycopg2.OperationalError('could not connect')
+
+    sleeps = []
+    monkeypatch.setattr('pgcli.pgexecute.time.sleep', sleeps.append)
+    executor = Unreachable()
+    with pytest.raises(psycopg2.OperationalError):
+        executor.reconnect(retry=retry)
+    assert executor.tries == attempts
+    assert len(sleeps) == attempts - 1
+
+
+@dbtest
+def test_session_state_is_restored_after_reconnecting(executor):
+    run(executor, "SET application_name = 'before'")
+    run(executor, "SET application_name = 'pgcli_test'")
+    run(executor, "SET search_path TO pg_catalog")
+    run(executor, "RESET search_path")
+    assert list(executor.session_state) == ['application_name']
+
+    executor.conn.close()
+    assert executor.connection_lost()
+    executor.reconnect()
+    assert 'pgcli_test' in run(executor, 'SHOW application_name', join=True)
+
+
+@dbtest
+def test_read_only_statement_is_run_again_after_reconnecting(executor):
+    executor.retry_read_only = True
+    with executor.conn.cursor() as cur:
+        cur.execute('SELECT pg_backend_pid()')
+        pid = cur.fetchone()[0]
+    with psycopg2.connect(user='postgres', host='localhost') as other:
+        other.cursor().execute('SELECT pg_terminate_backend(%s)', (pid,))
+    result = list(executor.run('SELECT 1'))
+    assert 'reconnected' in result[0][0]
+    assert list(result[0][1]) == [(1,)]
+
+
+@dbtest
+def test_explain_analyze_rolls_back(executor):
+    run(executor, 'create table test(a int)')
+    plan = executor.explain_analyze('insert into test values (1)')
+    assert plan['Plan']['Node Type'] == 'ModifyTable'
+    assert 'Execution Time' in plan or 'Total Runtime' in plan
+    result = list(executor.run('select count(*) from test'))
+    assert list(result[0][1]) == [(0,)]
+
+
+@dbtest
+def test_explain_analyze_in_a_transaction(executor):
+    run(executor, 'create temporary table test(a int)')
+    run(executor, 'begin')
+    run(executor, 'insert into test values (1)')
+    # Sees the uncommitted row of the temporary table, and only rolls back
+    # its own changes.
+    plan = executor.explain_analyze('delete from test')
+    assert plan['Plan']['Plans'][0]['Actual Rows'] == 1
+    result = list(executor.run('select count(*) from test'))
+    assert list(result[0][1]) == [(1,)]
+    run(executor, 'rollback')
+
+
+@dbtest
+def test_explain_uses_the_session_parameters(executor):
+    run(executor, 'create schema app')
+    run(executor, 'create table app.users(id int)')
+    run(executor, 'SET search_path TO app')
+    assert any('users' in line
+               for line in executor.explain('select * from users'))
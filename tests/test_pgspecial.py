@@ -74,4 +74,43 @@ def test_schema_qualified_dT_suggests_datatypes():
 @pytest.mark.parametrize('command', ['\\c ', '\\connect '])
 def test_c_suggests_databases(command):
     suggestions = suggest_type(command, command)
-    assert suggestions == [{'type': 'database'}]
\ No newline at end of file
+    assert suggestions == [{'type': 'database'}]
+
+def test_completion_table_is_rebuilt_after_register():
+    from pgcli.packages.pgspecial import PGSpecial
+    pgspecial = PGSpecial()
+    names, descriptions = pgspecial.completion_table()
+    assert '\\x' in names
+    assert (descriptions[names.index('\\x')] ==
+            pgspecial.commands['\\x'].description)
+    assert pgspecial.completion_table()[0] is names
+
+    pgspecial.register(lambda: None, '\\zz', '\\zz', 'Test command.')
+    names, descriptions = pgspecial.completion_table()
+    assert descriptions[names.index('\\zz')] == 'Test command.'
+
+
+def test_named_query_names_are_rebuilt_after_save_and_delete(tmpdir):
+    from pgcli.config import load_config
+    from pgcli.packages.pgspecial.namedqueries import NamedQueries
+    queries = NamedQueries(load_config(str(tmpdir.join('pgclirc'))))
+    assert queries.list() == ()
+
+    queries.save('simple', 'select 1')
+    names = queries.list()
+    assert names == ('simple',)
+    assert queries.list() is names
+
+    queries.delete('simple')
+    assert queries.list() == ()
+
+
+def test_named_query_names_follow_a_new_config(tmpdir):
+    from pgcli.config import load_config
+    from pgcli.packages.pgspecial.namedqueries import NamedQueries
+    queries = NamedQueries(load_config(str(tmpdir.join('first'))))
+    queries.save('simple', 'select 1')
+    assert queries.list() == ('simple',)
+
+    queries.config = load_config(str(tmpdir.join('second')))
+    assert queries.list() == ()
@@ -0,0 +1,57 @@
+from pgcli.packages.profile import plan_nodes, hot_nodes, profile_report
+from pgcli.packages.timing import PhaseTimer
+
+PLAN = {
+    'Plan': {
+        'Node Type': 'Hash Join', 'Actual Total Time': 9.0,
+        'Actual Loops': 1, 'Actual Rows': 100, 'Plan Width': 40,
+        'Shared Hit Blocks': 30, 'Shared Read Blocks': 12,
+        'Plans': [
+            {'Node Type': 'Seq Scan', 'Relation Name': 'orders',
+             'Alias': 'o', 'Actual Total Time': 6.0, 'Actual Loops': 1,
+             'Actual Rows': 1000, 'Shared Hit Blocks': 20,
+             'Shared Read Blocks': 12},
+            {'Node Type': 'Index Scan', 'Relation Name': 'users',
+             'Alias': 'users', 'Index Name': 'users_pkey',
+             'Actual Total Time': 0.5, 'Actual Loops': 2,
+             'Actual Rows': 5, 'Shared Hit Blocks': 10},
+        ],
+    },
+    'Planning Time': 1.0,
+    'Execution Time': 10.0,
+}
+
+
+def test_plan_nodes_exclusive_time_and_buffers():
+    nodes = plan_nodes(PLAN)
+    assert [round(time * 1000, 3) for _, time, _ in nodes] == [2.0, 6.0, 1.0]
+    assert [b['Shared Hit Blocks'] for _, _, b in nodes] == [0, 20, 10]
+    assert [b['Shared Read Blocks'] for _, _, b in nodes] == [0, 12, 0]
+
+
+def test_hot_nodes():
+    assert hot_nodes(PLAN, limit=2) == [
+        ('Seq Scan on orders o', '6.000ms', '60.0%', 1000, 1, 20, 12),
+        ('Hash Join', '2.000ms', '20.0%', 100, 1, 0, 0)]
+    assert hot_nodes(PLAN)[2][0] == 'Index Scan using users_pkey on users'
+
+
+def test_profile_report():
+    timer = PhaseTimer()
+    timer.add('execute', 0.015)
+    timer.add('typecast', 0.003)
+    timer.add('format', 0.002)
+    nodes, times = profile_report(PLAN, timer, 100, 2500)
+    assert nodes[0] == 'Plan hot nodes'
+    title, rows, headers, status = times
+    assert headers == ['Phase', 'Time', 'Share']
+    assert rows == [
+        ('server: planning', '1.000ms', '5.0%'),
+        ('server: execution', '10.000ms', '50.0%'),
+        ('network and waiting', '4.000ms', '20.0%'),
+        ('client: typecast', '3.000ms', '15.0%'),
+        ('client: render', '2.000ms', '10.0%'),
+        ('total', '20.000ms', '100.0%')]
+    assert status == ('Buffers: shared hit=30, shared read=12\n'
+                      'Received 100 rows, about 4000 bytes (rows x average '
+                      'row width 40), rendered into 2500 bytes.')
@@ -0,0 +1,71 @@
+from array import array
+from pgcli.packages.resultcache import ResultCache, CachedResult
+from pgcli.packages.columnar import ColumnarData
+from pgcli.main import format_output
+
+ROWS = [(1, 'a'), (2, 'b')]
+
+
+def test_cached_result_yields_rows():
+    cache = ResultCache()
+    result = cache.add('title', ROWS, ['id', 'name'], 'SELECT 2')
+    assert isinstance(result, CachedResult)
+    assert result.columns == [array('l', [1, 2]), ('a', 'b')]
+    assert list(result) == ROWS
+    # It can be iterated again.
+    assert list(result) == ROWS
+
+
+def test_cached_result_renders_like_the_original():
+    cache = ResultCache()
+    result = cache.add(None, ROWS, ['id', 'name'], 'SELECT 2')
+    assert (format_output(None, result, ['id', 'name'], 'SELECT 2', 'psql') ==
+            format_output(None, ROWS, ['id', 'name'], 'SELECT 2', 'psql'))
+
+
+def test_columns_are_shared():
+    data = ColumnarData.from_rows(ROWS)
+    result = ResultCache().add(None, data, ['id', 'name'], 'SELECT 2')
+    assert result.columns is data.columns
+    assert list(result) == ROWS
+
+
+def test_empty_result_is_cached():
+    cache = ResultCache()
+    result = cache.add(None, [], ['id'], 'SELECT 0')
+    assert list(result) == []
+    assert cache.get() is result
+
+
+def test_evicts_least_recently_used():
+    cache = ResultCache(max_results=2)
+    first = cache.add(None, ROWS, ['id', 'name'], 'first')
+    second = cache.add(None, ROWS, ['id', 'name'], 'second')
+    cache.touch(first)
+    third = cache.add(None, ROWS, ['id', 'name'], 'third')
+    assert cache.results == [first, third]
+    assert cache.get() is third
+    assert cache.get(2) is first
+    assert cache.get(3) is None
+    assert second not in cache.results
+
+
+def test_evicts_over_memory_budget():
+    rows = [(i, 'x' * 100) for i in range(100)]
+    one_result = ResultCache().add(None, rows, ['id', 'txt'], '').size
+
+    cache = ResultCache(max_bytes=int(one_result * 1.5))
+    cache.add(None, rows, ['id', 'txt'], 'first')
+    second = cache.add(None, rows, ['id', 'txt'], 'second')
+    assert cache.results == [second]
+
+
+def test_result_larger_than_budget_is_not_cached():
+    cache = ResultCache(max_bytes=10)
+    assert cache.add(None, ROWS, ['id', 'name'], 'SELECT 2') is None
+    assert cache.get() is None
+
+
+def test_disabled_cache():
+    cache = ResultCache(max_results=0)
+    assert cache.add(None, ROWS, ['id', 'name'], 'SELECT 2') is None
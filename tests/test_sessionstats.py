@@ -0,0 +1,62 @@
+from pgcli.packages.sessionstats import (LogHistogram, SessionStats,
+                                         statement_type)
+from pgcli.packages.timing import PhaseTimer
+
+
+def test_histogram_percentiles():
+    histogram = LogHistogram()
+    for ms in range(1, 1001):
+        histogram.add(ms / 1000.0)
+    assert histogram.count == 1000
+    assert histogram.min == 0.001 and histogram.max == 1.0
+    for percent, expected in ((50, 0.5), (90, 0.9), (99, 0.99)):
+        assert abs(histogram.percentile(percent) - expected) < expected * 0.03
+    assert histogram.percentile(100) == 1.0
+    assert LogHistogram().percentile(50) is None
+
+
+def test_histogram_constant_memory():
+    histogram = LogHistogram()
+    buckets = len(histogram.counts)
+    for value in (0, 1e-9, 1e6, 0.5):
+        histogram.add(value)
+    assert len(histogram.counts) == buckets
+    assert histogram.percentile(100) == 1e6
+    assert histogram.percentile(1) <= 1e-6
+
+
+def test_statement_type():
+    assert statement_type('SELECT 3') == 'SELECT'
+    assert statement_type('INSERT 0 1') == 'INSERT'
+    assert statement_type('CREATE TABLE') == 'CREATE TABLE'
+    assert statement_type('Expanded display is on.') == 'other'
+    assert statement_type(None) == 'other'
+
+
+def timer(**phases):
+    timer = PhaseTimer()
+    for name, duration in phases.items():
+        timer.add(name, duration)
+    return timer
+
+
+def test_session_stats():
+    stats = SessionStats()
+    stats.add('SELECT 10', timer(execute=0.010, typecast=0.002, format=0.003,
+                                 output=0.001))
+    stats.add('SELECT 5', timer(execute=0.020))
+    stats.add('UPDATE 2', timer(execute=0.005))
+    stats.add_output(0.001)
+    stats.add_bytes(300)
+    stats.add_failure()
+    rows, headers, status = stats.report()
+    assert headers == ['Statement', 'Count', 'p50', 'p90', 'p99', 'Max',
+                       'Total']
+    assert [row[:2] for row in rows] == [
+        ('SELECT', 2), ('UPDATE', 1), ('(formatting)', 3), ('(output)', 1)]
+    assert rows[0][5:] == ('20.000ms', '30.000ms')
+    assert rows[2][5] == '5.000ms'
+    assert status == '3 statements, 1 failed. 17 rows, 300 bytes of output.'
+
+    stats.reset()
+    assert stats.report()[0] == []
@@ -0,0 +1,88 @@
+import json
+from collections import OrderedDict
+from pgcli.slowlog import SlowQueryLog, is_explainable
+
+
+class Executor(object):
+    dbname, user, host = 'db', 'me', 'localhost'
+
+    def __init__(self, plan=None, error=None):
+        self.session_state = OrderedDict(
+            [('search_path', 'SET search_path TO app')])
+        self.plan = plan or []
+        self.error = error
+        self.explained = []
+
+    def explain(self, sql, options=None, session_state=None):
+        self.explained.append((sql, session_state))
+        if self.error:
+            raise self.error
+        return self.plan
+
+
+def records(log):
+    log.close()
+    with open(log.filename) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_only_slow_queries_are_logged(tmpdir):
+    log = SlowQueryLog(str(tmpdir.join('slow.log')), 0.5)
+    assert not log.record('select 1', 0.1, 1, True, Executor())
+    assert log.record('select pg_sleep(1)', 1.0, 1, True, Executor(),
+                      executed_at=0)
+    record, = records(log)
+    assert list(record) == ['executed_at', 'database', 'user', 'host',
+                            'duration', 'rows', 'successful', 'query']
+    assert record['query'] == 'select pg_sleep(1)'
+    assert record['duration'] == 1.0
+    assert record['database'] == 'db'
+    assert 'plan' not in record
+
+
+def test_disabled(tmpdir):
+    log = SlowQueryLog(str(tmpdir.join('slow.log')), 0)
+    assert not log.record('select 1', 100, 1, True, Executor())
+    assert not tmpdir.join('slow.log').exists()
+
+
+def test_plan(tmpdir):
+    log = SlowQueryLog(str(tmpdir.join('slow.log')), 0.5, explain=True)
+    executor = Executor(plan=['Seq Scan on users', '  Filter: (id = 1)'])
+    log.record('select * from users where id = 1', 2, 1, True, executor)
+    log.record('\\dt', 2, 10, True, executor)
+    with_plan, without = sorted(records(log), key=lambda r: 'plan' in r,
+                                reverse=True)
+    assert with_plan['plan'] == 'Seq Scan on users\n  Filter: (id = 1)'
+    assert executor.explained == [('select * from users where id = 1',
+                                   ['SET search_path TO app'])]
+    assert 'plan' not in without
+
+
+def test_plan_error(tmpdir):
+    log = SlowQueryLog(str(tmpdir.join('slow.log')), 0.5, explain=True)
+    log.record('select * from gone', 2, None, False,
+               Executor(error=Exception('relation "gone" does not exist\n')))
+    record, = records(log)
+    assert record['plan_error'] == 'relation "gone" does not exist'
+    assert record['successful'] is False
+
+
+def test_is_explainable():
+    assert is_explainable('  SELECT 1')
+    assert is_explainable('with x as (select 1) delete from y')
+    assert not is_explainable('create table x (a int)')
+    assert not is_explainable('\\d users')
+    assert is_explainable('select 1;')
+    assert not is_explainable('select 1; delete from users')
+
+
+def test_no_plan_of_several_statements(tmpdir):
+    log = SlowQueryLog(str(tmpdir.join('slow.log')), 0.5, explain=True)
+    executor = Executor(plan=['Result'])
+    query = 'select pg_sleep(2); insert into t values (1); commit;'
+    log.record(query, 2, 1, True, executor)
+    record, = records(log)
+    assert record['query'] == query
+    assert 'plan' not in record
+    assert executor.explained == []
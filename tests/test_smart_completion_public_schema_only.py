@@ -396,4 +396,17 @@ def test_suggest_columns_from_escaped_table_alias(completer, complete_event):
         Completion(text='id', start_position=0, display_meta='column'),
         Completion(text='"insert"', start_position=0, display_meta='column'),
         Completion(text='"ABC"', start_position=0, display_meta='column'),
-    ])
\ No newline at end of file
+    ])
+
+def test_empty_copy_leaves_the_completer_untouched(completer, complete_event):
+    completer.smart_completion = False
+    completer.debounce = 0.01
+    copy = completer.empty_copy()
+    assert copy.usage is completer.usage
+    assert not copy.smart_completion
+    assert copy.debounce == 0.01
+
+    copy.extend_schemata(['public'])
+    copy.extend_relations([('public', 'accounts')], kind='tables')
+    assert copy.catalog.names('tables', 'public') == ['accounts']
+    assert 'accounts' not in completer.catalog.names('tables', 'public')
@@ -0,0 +1,57 @@
+from pgcli.packages.timing import PhaseTimer
+from pgcli.packages.pgspecial import PGSpecial
+from pgcli.main import format_output
+
+
+def test_phase_timer_accumulates_in_order():
+    timer = PhaseTimer()
+    timer.add('execute', 1.0)
+    timer.add('format', 0.5)
+    timer.add('execute', 2.0)
+    assert timer.items() == [('execute', 3.0), ('format', 0.5)]
+    assert timer.total() == 3.5
+    assert str(timer) == 'execute 3000.000ms, format 500.000ms'
+
+
+def test_phase_timer_context_manager():
+    timer = PhaseTimer()
+    with timer.phase('build'):
+        pass
+    assert timer.names == ['build']
+    assert timer.get('build') >= 0
+    assert timer.get('missing') == 0
+
+
+def test_format_output_records_phases():
+    timer = PhaseTimer()
+    format_output(None, [(1, 'a'), (2, 'b')], ['id', 'name'], 'SELECT 2',
+                  'psql', timer=timer)
+    assert timer.names == ['typecast', 'transpose', 'normalize', 'types',
+                           'format', 'align', 'build']
+
+
+def test_format_output_skips_per_line_phases():
+    timer = PhaseTimer(per_line=False)
+    format_output(None, [(1, 'a'), (2, 'b')], ['id', 'name'], 'SELECT 2',
+                  'psql', timer=timer)
+    assert 'build' not in timer.names
+    assert 'align' in timer.names
+
+
+def test_timing_special_command():
+    pgspecial = PGSpecial()
+    pgspecial.toggle_timing()
+    assert pgspecial.timing_enabled and not pgspecial.timing_verbose
+
+    pgspecial.toggle_timing(pattern='verbose')
+    assert pgspecial.timing_enabled and pgspecial.timing_verbose
+
+    pgspecial.toggle_timing()
+    assert not pgspecial.timing_enabled and not pgspecial.timing_verbose
+
+    pgspecial.toggle_timing(pattern='on')
+    assert pgspecial.timing_enabled and not pgspecial.timing_verbose
+
+    result = pgspecial.toggle_timing(pattern='bogus')
+    assert 'unrecognized' in result[0][3]
+    assert pgspecial.timing_enabled
@@ -0,0 +1,94 @@
+import json
+from pgcli.packages.timing import PhaseTimer
+from pgcli.packages.tracing import Tracer
+from pgcli.tracesummary import read_spans, summarize
+
+
+def read(filename):
+    with open(filename) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_disabled_tracer_does_nothing():
+    tracer = Tracer()
+    with tracer.span('execute') as span:
+        span.set(rows=1)
+    tracer.emit('execute', 1.0)
+    assert tracer.handler is None
+
+
+def test_spans(tmpdir):
+    filename = str(tmpdir.join('trace'))
+    tracer = Tracer()
+    tracer.start(filename)
+    trace = tracer.new_trace()
+    with tracer.span('catalog', query='tables') as span:
+        span.set(rows=3)
+    try:
+        with tracer.span('parse'):
+            raise ValueError
+    except ValueError:
+        pass
+    tracer.stop()
+    # Not written after stopping.
+    tracer.emit('execute', 1.0)
+
+    catalog, parse = read(filename)
+    assert catalog['span'] == 'catalog'
+    assert catalog['query'] == 'tables' and catalog['rows'] == 3
+    assert catalog['trace'] == trace
+    assert catalog['ms'] >= 0
+    assert parse['error'] == 'ValueError'
+
+
+def test_emit_timer(tmpdir):
+    filename = str(tmpdir.join('trace'))
+    tracer = Tracer()
+    tracer.start(filename)
+    timer = PhaseTimer()
+    for phase, duration in (('execute', 0.010), ('typecast', 0.002),
+                            ('transpose', 0.001), ('format', 0.003),
+                            ('output', 0.004)):
+        timer.add(phase, duration)
+    tracer.emit_timer(timer, statement=0, type='SELECT')
+    tracer.stop()
+    assert [(s['span'], s['ms'], s['type']) for s in read(filename)] == [
+        ('execute', 10.0, 'SELECT'), ('fetch', 2.0, 'SELECT'),
+        ('format', 4.0, 'SELECT'), ('page', 4.0, 'SELECT')]
+
+
+def test_rotation(tmpdir):
+    filename = str(tmpdir.join('trace'))
+    tracer = Tracer()
+    tracer.start(filename, max_bytes=1000, backup_count=2)
+    for i in range(100):
+        tracer.emit('execute', 0.001)
+    tracer.stop()
+    assert sorted(f.basename for f in tmpdir.listdir()) == [
+        'trace', 'trace.1', 'trace.2']
+
+
+def test_summarize():
+    lines = [
+        '{"span": "execute", "ms": 10, "trace": 1, "type": "SELECT"}',
+        '{"span": "format", "ms": 5, "trace": 1}',
+        '{"span": "input", "ms": 20, "trace": 1, "statements": 1, '
+        '"rows": 3, "query": "select *\\n from t"}',
+        '{"span": "execute", "ms": 30, "trace": 2, "type": "UPDATE"}',
+        '{"span": "input", "ms": 30, "trace": 2, "query": "update t"}',
+        '{"span": "complete", "ms": 1}',
+        '{"span": "catalog", "ms": 4, "query": "tables"}',
+        'not json',
+        '{"span": "input", "ms": 1',
+    ]
+    (rows, headers), (slow_rows, _) = summarize(read_spans(lines),
+                                                slowest=1)
+    assert headers[:4] == ['Span', 'Count', 'Total ms', 'Of inputs']
+    assert [row[:4] for row in rows] == [
+        ('input', 2, '50.000', ''),
+        ('execute:UPDATE', 1, '30.000', '60.0%'),
+        ('execute:SELECT', 1, '10.000', '20.0%'),
+        ('format', 1, '5.000', '10.0%'),
+        ('catalog:tables', 1, '4.000', ''),
+        ('complete', 1, '1.000', '')]
+    assert slow_rows == [(30, None, None, 'update t')]
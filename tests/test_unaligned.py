@@ -0,0 +1,29 @@
+from pgcli.packages.unaligned import unaligned_table
+from pgcli.packages.pgspecial.main import unescape_separator
+from pgcli.main import format_unaligned_output
+
+def test_unaligned_table_renders():
+    input = [("hello", 123), ("world", None)]
+
+    expected = ["name|age\n", "hello|123\n", "world|\n"]
+    assert expected == list(unaligned_table(input, ["name", "age"]))
+
+def test_unaligned_table_separators():
+    input = [("hello", 123), ("world", 456)]
+
+    expected = "name\tage;hello\t123;world\t456;"
+    assert expected == ''.join(unaligned_table(input, ["name", "age"],
+                                               field_separator="\t",
+                                               record_separator=";"))
+
+def test_unaligned_output_has_title_and_status():
+    output = format_unaligned_output('title', [(1, 2)], ['a', 'b'], 'SELECT 1',
+                                     field_separator=',')
+    assert ''.join(output) == 'title\na,b\n1,2\nSELECT 1\n'
+
+def test_unescape_separator():
+    assert unescape_separator('\\t') == '\t'
+    assert unescape_separator('\\n') == '\n'
+    assert unescape_separator("' '") == ' '
+    assert unescape_separator('","') == ','
+    assert unescape_separator('|') == '|'
@@ -0,0 +1,85 @@
+# coding=UTF-8
+from __future__ import unicode_literals
+from prompt_toolkit.document import Document
+from pgcli.pgcompleter import PGCompleter
+from pgcli.usage import UsageStats, identifiers
+
+
+def test_identifiers():
+    sql = 'SELECT "Email", Id FROM public.users WHERE name = \'orders\''
+    assert list(identifiers(sql)) == ['select', 'Email', 'id', 'from',
+                                      'public', 'users', 'where', 'name']
+
+
+def test_older_uses_count_less():
+    usage = UsageStats(half_life=1)
+    usage.record(['a'])
+    usage.record(['b'])
+    assert usage.score('b') == 2 * usage.score('a')
+    assert usage.score('c') == 0
+
+
+def test_rescale_keeps_scores():
+    usage = UsageStats(half_life=1)
+    usage.record(['a'])
+    score = usage.score('a')
+    usage._rescale()
+    assert usage.scale == 1.0
+    assert usage.score('a') == score
+
+
+def test_seeds_are_worth_less_than_a_use():
+    usage = UsageStats()
+    usage.seed({'a': 10, 'b': 100000, 'c': 0})
+    assert usage.score('b') == 1.0
+    assert 0 < usage.score('a') < usage.score('b')
+    assert usage.score('c') == 0
+    usage.record(['a'])
+    assert usage.score('a') > usage.score('b')
+
+
+def test_save_and_load(tmpdir):
+    filename = str(tmpdir.join('usage'))
+    usage = UsageStats()
+    usage.record(['users', '"Ünicode"'])
+    usage.record(['users'])
+    usage.save(filename)
+
+    loaded = UsageStats()
+    loaded.load(filename)
+    assert abs(loaded.score('users') - usage.score('users')) < 0.01
+    assert loaded.score('"Ünicode"') > 0
+
+
+def test_load_missing_file(tmpdir):
+    usage = UsageStats()
+    usage.load(str(tmpdir.join('missing')))
+    assert usage.counts == {}
+
+
+def test_completions_ranked_by_usage():
+    comp = PGCompleter(smart_completion=True)
+    comp.extend_schemata(['public'])
+    comp.extend_relations([('public', 'user_emails'), ('public', 'users')],
+                          kind='tables')
+    comp.set_search_path(['public'])
+
+    document = Document(text='SELECT * FROM us')
+    result = comp.get_completions(document, None)
+    assert [c.text for c in result] == ['user_emails', 'users']
+
+    comp.record_usage('select * from USERS')
+    result = comp.get_completions(document, None)
+    assert [c.text for c in result] == ['users', 'user_emails']
+
+
+def test_completions_ranked_by_table_scans():
+    comp = PGCompleter(smart_completion=True)
+    comp.extend_schemata(['public'])
+    comp.extend_relations([('public', 'user_emails'), ('public', 'users')],
+                          kind='tables')
+    comp.set_search_path(['public'])
+    comp.seed_usage([('public', 'users', 50), ('public', 'user_emails', 2)])
+
+    result = comp.get_completions(Document(text='SELECT * FROM us'), None)
+    assert [c.text for c in result] == ['users', 'user_emails']